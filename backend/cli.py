@@ -0,0 +1,233 @@
+"""Maintenance commands for the DevFoolU backend. Run from the backend directory."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+
+from core.logger import setup_logging
+from services.mongodb import mongodb_client
+from services.vector_index import vector_index_service
+
+logger = setup_logging()
+
+APPROXIMATE_INDEXES = ("ivf", "hnsw", "sq8", "pq", "pca")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="DevFoolU backend maintenance commands.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = commands.add_parser(
+        "snapshot",
+        help="Write an mmap-able embedding snapshot under VECTOR_INDEX_SNAPSHOT_DIR.",
+    )
+    snapshot.add_argument(
+        "--source",
+        choices=("mongo", "snapshot"),
+        default="mongo",
+        help="Rebuild from MongoDB (default) or rewrite the current snapshot plus pending deltas.",
+    )
+
+    build = commands.add_parser(
+        "build-index",
+        help="Train an approximate index (or the kNN graph) and store it next to the current snapshot.",
+    )
+    build.add_argument(
+        "--backend",
+        choices=(*APPROXIMATE_INDEXES, "knn"),
+        default="ivf",
+        help="Approximate index to build, or knn for the per-project neighbour lists (default: ivf).",
+    )
+
+    benchmark = commands.add_parser(
+        "benchmark",
+        help="Measure recall@k and latency of each approximate index against exact search.",
+    )
+    benchmark.add_argument(
+        "--backend",
+        action="append",
+        choices=APPROXIMATE_INDEXES,
+        help="Index to evaluate; repeat for several (default: all).",
+    )
+    benchmark.add_argument("--build", action="store_true", help="(Re)build the selected indexes first.")
+    benchmark.add_argument("--k", type=int, default=10, help="Results per query (default: 10).")
+    benchmark.add_argument(
+        "--queries",
+        type=int,
+        default=200,
+        help="Indexed vectors sampled as queries when no --queries-file is given (default: 200).",
+    )
+    benchmark.add_argument("--queries-file", help="Text file with one search query per line.")
+    benchmark.add_argument("--nprobe", type=int, help="IVF lists to scan.")
+    benchmark.add_argument("--ef-search", type=int, help="HNSW beam width.")
+    benchmark.add_argument("--rerank", type=int, help="sq8/pq/pca candidates re-scored exactly.")
+
+    migrate = commands.add_parser(
+        "migrate-embeddings",
+        help="Set embeddingState on legacy documents and rewrite array-of-doubles embeddings as packed float32 vectors; safe to re-run.",
+    )
+    migrate.add_argument("--batch-size", type=int, help="Documents per bulk write (default: EMBEDDING_MIGRATION_BATCH_SIZE).")
+    migrate.add_argument("--limit", type=int, help="Stop after this many documents.")
+
+    duplicates = commands.add_parser(
+        "find-duplicates",
+        help="Cluster near-duplicate projects; only new or re-embedded projects are compared unless --full.",
+    )
+    duplicates.add_argument("--full", action="store_true", help="Compare every pair and rebuild all clusters.")
+    duplicates.add_argument("--threshold", type=float, help="Cosine threshold (default: DUPLICATE_SIMILARITY_THRESHOLD).")
+
+    export = commands.add_parser(
+        "export-onnx",
+        help="Export the embedding model to ONNX (plus an int8-quantized copy) under EMBEDDING_ONNX_DIR.",
+    )
+    export.add_argument("--no-quantize", action="store_true", help="Skip the dynamically int8-quantized graph.")
+    export.add_argument("--check", action="store_true", help="Run the parity check against torch afterwards.")
+
+    parity = commands.add_parser(
+        "embedding-parity",
+        help="Compare an ONNX backend's embeddings with the PyTorch model (cosine per text).",
+    )
+    parity.add_argument("--backend", choices=("onnx", "onnx-int8"), default="onnx-int8")
+    parity.add_argument("--sample", type=int, default=0, help="Also embed this many stored projects' texts.")
+
+    worker = commands.add_parser(
+        "embedding-worker",
+        help="Encode projects from the MongoDB embedding queue; run several for more throughput.",
+    )
+    worker.add_argument("--processes", type=int, default=1, help="Worker processes, each with its own model (default: 1).")
+    worker.add_argument("--threads", type=int, default=0, help="Intra-op threads per process (default: cores / processes).")
+    worker.add_argument("--batch-size", type=int, help="Projects claimed per batch (default: EMBEDDING_WORKER_BATCH_SIZE).")
+    worker.add_argument("--once", action="store_true", help="Exit when the queue is empty instead of polling.")
+    return parser
+
+
+async def _snapshot(args: argparse.Namespace) -> dict:
+    await vector_index_service.load(source=args.source, persist=False)
+    if args.source == "snapshot":
+        from services.index_sync import index_sync_service
+
+        await index_sync_service.sync_once()
+    return await vector_index_service.write_snapshot()
+
+
+async def _build_index(args: argparse.Namespace) -> dict:
+    await vector_index_service.load()
+    from services.index_sync import index_sync_service
+
+    await index_sync_service.sync_once()
+    return await vector_index_service.build_backend(args.backend)
+
+
+async def _benchmark(args: argparse.Namespace) -> dict:
+    await vector_index_service.load()
+    names = args.backend or list(APPROXIMATE_INDEXES)
+    if args.build:
+        for name in names:
+            await vector_index_service.build_backend(name)
+
+    queries = None
+    if args.queries_file:
+        from services.embedding import embedding_service
+
+        with open(args.queries_file, encoding="utf-8") as handle:
+            texts = [line.strip() for line in handle if line.strip()]
+        queries = [await embedding_service.generate_query_embedding(text) for text in texts]
+
+    params = {
+        name: value
+        for name, value in (("nprobe", args.nprobe), ("ef_search", args.ef_search), ("rerank", args.rerank))
+        if value
+    }
+    return await vector_index_service.benchmark(names, queries=queries, sample=args.queries, k=args.k, **params)
+
+
+async def _migrate_embeddings(args: argparse.Namespace) -> dict:
+    from services.embedding_migration import embedding_migration_service
+
+    return await embedding_migration_service.run(batch_size=args.batch_size, limit=args.limit)
+
+
+async def _find_duplicates(args: argparse.Namespace) -> dict:
+    from services.duplicate_clusters import duplicate_cluster_service
+
+    return await duplicate_cluster_service.run(full=args.full, threshold=args.threshold)
+
+
+async def _export_onnx(args: argparse.Namespace) -> dict:
+    from services.inference_backend import export_onnx, parity_check
+
+    result = await asyncio.to_thread(export_onnx, quantize=not args.no_quantize)
+    if args.check:
+        backends = ("onnx",) if args.no_quantize else ("onnx", "onnx-int8")
+        result["parity"] = {name: await asyncio.to_thread(parity_check, name) for name in backends}
+    return result
+
+
+async def _embedding_parity(args: argparse.Namespace) -> dict:
+    from services.embedding import embedding_service
+    from services.inference_backend import PARITY_TEXTS, parity_check
+
+    texts = list(PARITY_TEXTS)
+    if args.sample:
+        await mongodb_client.connect()
+        try:
+            projects = await mongodb_client.collection.find({}, {"embeddingsOfData": 0}).limit(args.sample).to_list(length=None)
+        finally:
+            await mongodb_client.close()
+        texts += [embedding_service._create_combined_text(project) for project in projects]
+    return await asyncio.to_thread(parity_check, args.backend, texts)
+
+
+async def _embedding_worker(args: argparse.Namespace) -> dict:
+    from services.embedding_worker import run_worker, run_worker_pool
+
+    if args.processes > 1:
+        return await asyncio.to_thread(run_worker_pool, args.processes, args.threads, args.batch_size, args.once)
+    return await run_worker(threads=args.threads, batch_size=args.batch_size, once=args.once)
+
+
+COMMANDS = {
+    "snapshot": _snapshot,
+    "build-index": _build_index,
+    "benchmark": _benchmark,
+    "migrate-embeddings": _migrate_embeddings,
+    "find-duplicates": _find_duplicates,
+    "export-onnx": _export_onnx,
+    "embedding-parity": _embedding_parity,
+    "embedding-worker": _embedding_worker,
+}
+
+# Commands that do not need the MongoDB connection opened for them (or open their own)
+OFFLINE_COMMANDS = {"export-onnx", "embedding-parity", "embedding-worker"}
+
+
+async def run(args: argparse.Namespace) -> int:
+    if args.command in OFFLINE_COMMANDS:
+        result = await COMMANDS[args.command](args)
+    else:
+        await mongodb_client.connect()
+        try:
+            result = await COMMANDS[args.command](args)
+        finally:
+            await mongodb_client.close()
+
+    print(json.dumps(result, indent=2, default=str))
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("Interrupted by user.", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
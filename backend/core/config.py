@@ -44,10 +44,41 @@ class Settings(BaseSettings):
     MONGODB_TIMEOUT: int = 30000
     MONGODB_INGEST_JOBS_COLLECTION: str = "scrape_jobs"
     MONGODB_INGEST_URLS_COLLECTION: str = "scrape_job_urls"
+    MONGODB_EMBEDDING_QUEUE_COLLECTION: str = "embedding_queue"
     
     # Embedding Model Settings
     EMBEDDING_MODEL_NAME: str = "sentence-transformers/all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384
+    EMBEDDING_MODEL_VERSION: str = "1"  # bump to re-embed every project on its next refresh, even if its text is unchanged
+    EMBEDDING_STORAGE_FORMAT: str = "binary"  # binary (packed float32 BSON vector) | array (legacy doubles)
+    EMBEDDING_MIGRATION_BATCH_SIZE: int = 500
+    EMBEDDING_BACKEND: str = "torch"  # torch | onnx | onnx-int8 (ONNX Runtime on CPU, exported under EMBEDDING_ONNX_DIR)
+    EMBEDDING_ONNX_AUTO_EXPORT: bool = True  # export on first load when no ONNX graph is cached (needs torch once)
+    EMBEDDING_ONNX_THREADS: int = 0  # ONNX Runtime intra-op threads; 0 = one per physical core
+    EMBEDDING_ONNX_PARITY_MIN_COSINE: float = 0.99  # parity check: every text must agree with torch at least this well
+    EMBEDDING_TOKEN_PACKING_ENABLED: bool = True  # pack project fields to the model's token budget before encoding
+    EMBEDDING_ENCODE_BATCH_SIZE: int = 32  # texts per encode call; batches are length-sorted so each pads little
+    EMBEDDING_INTERACTIVE_WORKERS: int = 2  # threads serving search/scrape embeddings
+    EMBEDDING_INTERACTIVE_THREADS: int = 0  # torch intra-op threads per interactive worker; 0 = split the cores the bulk lane leaves
+    EMBEDDING_BULK_WORKERS: int = 1  # threads serving ingestion and backfill batches
+    EMBEDDING_BULK_THREADS: int = 2  # torch intra-op threads per bulk worker; keep the lanes' total within the cores
+    EMBEDDING_BULK_CHUNK_SIZE: int = 16  # bulk texts per encode call; interactive work can cut in between chunks
+    EMBEDDING_BULK_MAX_DEFER_MS: float = 2000.0  # longest a bulk chunk waits for the interactive lane to go idle
+    EMBEDDING_WORKER_ENABLED: bool = False  # API and ingestor only enqueue; `python cli.py embedding-worker` encodes
+    EMBEDDING_WORKER_BATCH_SIZE: int = 256  # projects claimed and encoded per worker batch
+    EMBEDDING_WORKER_LEASE_SECONDS: int = 600  # a claimed batch returns to the queue if not finished in time
+    EMBEDDING_WORKER_IDLE_SECONDS: float = 5.0  # poll interval of an idle worker
+    EMBEDDING_WORKER_SWEEP_SECONDS: float = 300.0  # how often a worker enqueues pending projects nobody queued
+    EMBEDDING_WORKER_MAX_ATTEMPTS: int = 5
+    EMBEDDING_WORKER_RETRY_SECONDS: float = 60.0  # delay before a failed batch is claimable again
+    EMBEDDING_MICRO_BATCH_ENABLED: bool = True  # coalesce concurrent single-text embeddings into one encode call
+    EMBEDDING_MICRO_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_MICRO_BATCH_MAX_WAIT_MS: float = 2.0  # how long a batch waits for more requests before encoding
+    EMBEDDING_QUERY_CACHE_ENABLED: bool = True
+    EMBEDDING_QUERY_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # about 17k MiniLM query vectors
+    EMBEDDING_QUERY_CACHE_TTL_SECONDS: float = 7 * 24 * 3600  # 0 = entries never expire
+    EMBEDDING_QUERY_CACHE_PERSIST: bool = False  # keep cached query vectors in SQLite across restarts
+    EMBEDDING_QUERY_CACHE_PERSIST_MAX_ENTRIES: int = 100000
     
     # Auth0 Settings
     AUTH0_DOMAIN: str = ""
@@ -71,12 +102,67 @@ class Settings(BaseSettings):
     # Similarity Search Settings
     SIMILARITY_TOP_K: int = 5
     SIMILARITY_THRESHOLD: float = 0.3  # Minimum similarity score
+    SIMILARITY_BATCH_MAX_QUERIES: int = 256  # queries accepted by /api/similarity/search-batch
+
+    # Vector Index Settings
+    VECTOR_INDEX_LOAD_ON_STARTUP: bool = True
+    VECTOR_INDEX_LOAD_BATCH_SIZE: int = 2000
+    VECTOR_INDEX_TAIL_CAPACITY: int = 4096  # rows reserved for incremental appends
+    VECTOR_INDEX_COMPACT_DEAD_RATIO: float = 0.1
+    VECTOR_INDEX_SYNC_ENABLED: bool = True
+    VECTOR_INDEX_SYNC_MODE: str = "poll"  # poll | change_stream
+    VECTOR_INDEX_SYNC_INTERVAL_SECONDS: float = 5.0
+    VECTOR_INDEX_SYNC_BATCH_SIZE: int = 1000
+    VECTOR_INDEX_SYNC_OVERLAP_SECONDS: float = 2.0
+    VECTOR_INDEX_RECONCILE_INTERVAL_SECONDS: float = 600.0
+    VECTOR_INDEX_MAX_LAG_SECONDS: float = 120.0
+    VECTOR_INDEX_SNAPSHOT_ENABLED: bool = True
+    VECTOR_INDEX_SNAPSHOT_WRITE_ON_LOAD: bool = True  # persist after a full Mongo load
+    VECTOR_INDEX_SNAPSHOT_KEEP: int = 2
+    VECTOR_INDEX_BACKEND: str = "exact"  # exact | ivf | hnsw | sq8 | pq | pca
+    VECTOR_INDEX_ANN_MIN_VECTORS: int = 5000  # below this, exact search is already fast
+    VECTOR_INDEX_ANN_BUILD_ON_LOAD: bool = True  # train the configured backend in the background
+    VECTOR_INDEX_IVF_NLIST: int = 0  # 0 = about 4 * sqrt(N) lists
+    VECTOR_INDEX_IVF_NPROBE: int = 8
+    VECTOR_INDEX_IVF_TRAIN_ITERATIONS: int = 100
+    VECTOR_INDEX_IVF_TRAIN_BATCH_SIZE: int = 2048
+    VECTOR_INDEX_HNSW_M: int = 16  # links per node (2 * M on layer 0)
+    VECTOR_INDEX_HNSW_EF_CONSTRUCTION: int = 100
+    VECTOR_INDEX_HNSW_EF_SEARCH: int = 64
+    VECTOR_INDEX_QUANT_RERANK: int = 100  # sq8/pq candidates re-scored exactly
+    VECTOR_INDEX_QUANT_TRAIN_SAMPLE: int = 50000
+    VECTOR_INDEX_PQ_SUBVECTORS: int = 48  # bytes per vector
+    VECTOR_INDEX_PQ_TRAIN_ITERATIONS: int = 20
+    VECTOR_INDEX_PCA_DIMENSIONS: int = 96  # first-pass dimensionality
+    VECTOR_INDEX_PCA_RERANK: int = 300  # candidates re-scored at full dimension
+    VECTOR_INDEX_RECALL_QUERIES: int = 64  # sample size for recall@10 in stats
+    VECTOR_INDEX_KNN_K: int = 50  # neighbours stored per project by the kNN graph
+    VECTOR_INDEX_KNN_BUILD_ON_LOAD: bool = False  # build the graph in the background when none is stored
+    VECTOR_INDEX_FILTER_SCAN_RATIO: float = 0.2  # filters matching more than this share of rows mask a full scan instead of gathering rows
+    HYBRID_SEARCH_CANDIDATES: int = 50  # vector and BM25 hits fused per side in mode=hybrid
+    HYBRID_RRF_K: int = 60  # reciprocal rank fusion constant: 1 / (k + rank)
+    RANGE_SEARCH_MAX_RESULTS: int = 1000  # default and maximum number of matches a range search returns
+    SEARCH_CACHE_ENABLED: bool = True  # cache search responses per request and data version
+    SEARCH_CACHE_MAX_ENTRIES: int = 2048  # local LRU tier, per worker
+    SEARCH_CACHE_TTL_SECONDS: float = 600.0
+    SEARCH_CACHE_SHARED_URL: str = ""  # redis://host:6379/0 shares entries between workers; memory:// is an in-process stand-in
+    SEARCH_CACHE_KEY_PREFIX: str = "devfoolu:search"
+    DUPLICATE_SIMILARITY_THRESHOLD: float = 0.95  # cosine at or above which two projects count as near-duplicates
+    DUPLICATE_SCAN_TILE_ROWS: int = 4096  # rows per side of one score tile (4096^2 float32 = 64 MB)
+    DUPLICATE_SCAN_AFTER_INGEST: bool = False  # run an incremental duplicate scan when a mass ingest job completes
     
     # Gemini AI Settings
     GEMINI_API_KEY: str = ""  # Set via environment variable
     GEMINI_MODEL: str = "gemini-1.5-flash"  # Free tier model
     GEMINI_MAX_OUTPUT_TOKENS: int = 200  # ~150 words
     GEMINI_TEMPERATURE: float = 0.7
+    GEMINI_TIMEOUT_SECONDS: float = 8.0  # per-verdict deadline, including the wait for a concurrency slot
+    GEMINI_MAX_CONCURRENCY: int = 4  # verdict calls in flight per worker
+    AI_VERDICT_BACKEND: str = "gemini"  # gemini | fake (local, deterministic) | none
+    AI_VERDICT_FAKE_LATENCY_SECONDS: float = 0.0
+    AI_VERDICT_CACHE_MAX_ENTRIES: int = 1024
+    AI_VERDICT_CACHE_TTL_SECONDS: float = 3600.0
+    AI_VERDICT_FAILURE_TTL_SECONDS: float = 60.0  # how long a failed deferred verdict stays collectable
     
     # Bulk Processing Settings
     BULK_BATCH_SIZE: int = 50
@@ -110,6 +196,9 @@ class Settings(BaseSettings):
     SCRAPER_DIR: Path = BASE_DIR / "scraper"
     LOGS_DIR: Path = BASE_DIR / "backend" / "logs"
     TEMP_DIR: Path = BASE_DIR / "backend" / "temp"
+    VECTOR_INDEX_SNAPSHOT_DIR: Path = TEMP_DIR / "vector_index"
+    EMBEDDING_QUERY_CACHE_PATH: Path = TEMP_DIR / "query_embeddings.sqlite3"
+    EMBEDDING_ONNX_DIR: Path = TEMP_DIR / "onnx"
     
     def model_post_init(self, __context):
         """Create necessary directories after model initialization"""
@@ -17,6 +17,9 @@ from core.logger import setup_logging
 from services.mongodb import mongodb_client
 from services.embedding import embedding_service
 from services.mass_ingestor import mass_ingestor_service
+from services.vector_index import vector_index_service
+from services.index_sync import index_sync_service
+from services.result_cache import search_result_cache
 
 # Setup logging
 logger = setup_logging()
@@ -44,6 +47,27 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ Failed to load embedding model: {e}")
         raise
 
+    # Load the resident vector index (searches lazily load it otherwise)
+    if settings.VECTOR_INDEX_LOAD_ON_STARTUP:
+        try:
+            index_stats = await vector_index_service.load()
+            logger.info(f"✅ Vector index loaded ({index_stats.get('vectors', 0)} vectors)")
+        except Exception as e:
+            logger.error(f"❌ Failed to load vector index: {e}")
+
+    # Keep the index in step with writes from ingestion and the API
+    try:
+        if await index_sync_service.start():
+            logger.info(f"✅ Vector index sync started ({settings.VECTOR_INDEX_SYNC_MODE})")
+    except Exception as e:
+        logger.error(f"❌ Failed to start vector index sync: {e}")
+
+    # Cached search responses are invalidated by project writes from here on
+    try:
+        await search_result_cache.start()
+    except Exception as e:
+        logger.error(f"❌ Failed to start search result cache: {e}")
+
     # Optionally start mass ingestion in background
     try:
         startup_ingest = await mass_ingestor_service.start_on_startup_if_enabled()
@@ -65,6 +89,14 @@ async def lifespan(app: FastAPI):
         await mass_ingestor_service.stop()
     except Exception as e:
         logger.warning(f"Failed to stop mass ingest cleanly: {e}")
+    try:
+        await index_sync_service.stop()
+    except Exception as e:
+        logger.warning(f"Failed to stop vector index sync cleanly: {e}")
+    try:
+        await search_result_cache.stop()
+    except Exception as e:
+        logger.warning(f"Failed to stop search result cache cleanly: {e}")
     await mongodb_client.close()
     logger.info("✅ MongoDB connection closed")
     logger.info("👋 Server shutdown complete")
@@ -117,7 +149,8 @@ async def health_check():
     health_status = {
         "status": "healthy",
         "mongodb": "unknown",
-        "embedding_model": "unknown"
+        "embedding_model": "unknown",
+        "vector_index": "unknown"
     }
     
     # Check MongoDB connection
@@ -139,6 +172,12 @@ async def health_check():
         health_status["embedding_model"] = f"error: {str(e)}"
         health_status["status"] = "unhealthy"
     
+    # Vector index version and lag (informational; alert on "lagging")
+    try:
+        health_status["vector_index"] = await index_sync_service.get_health()
+    except Exception as e:
+        health_status["vector_index"] = f"error: {str(e)}"
+    
     if health_status["status"] == "unhealthy":
         raise HTTPException(status_code=503, detail=health_status)
     
@@ -11,8 +11,12 @@ from datetime import datetime
 
 from services.scraper import scraper_service
 from services.embedding import embedding_service
+from services.embedding_scheduler import BULK
 from services.mongodb import mongodb_client
 from services.mass_ingestor import mass_ingestor_service
+from services.vector_index import vector_index_service
+from services.embedding_migration import embedding_migration_service
+from services.duplicate_clusters import duplicate_cluster_service
 from core.config import settings
 
 logger = logging.getLogger("DevFoolU.routers.bulk")
@@ -99,13 +103,13 @@ async def bulk_scrape_stream(request: BulkScrapeRequest):
             
             yield f"data: {json.dumps({'status': 'scraped', 'message': f'Scraped {len(projects)} projects', 'progress': 50, 'total': len(projects), 'failed': len(failures)})}\n\n"
             
-            # Generate embeddings
-            if request.generate_embeddings:
+            # Generate embeddings (embedding workers do it after storage when enabled)
+            if request.generate_embeddings and not settings.EMBEDDING_WORKER_ENABLED:
                 yield f"data: {json.dumps({'status': 'generating_embeddings', 'message': 'Generating embeddings...', 'progress': 60})}\n\n"
                 
                 for idx, project in enumerate(projects):
                     try:
-                        embeddings = await embedding_service.generate_project_embedding(project)
+                        embeddings = await embedding_service.generate_project_embedding(project, lane=BULK)
                         project["embeddingsOfData"] = embeddings
                         
                         progress = 60 + (30 * (idx + 1) / len(projects))
@@ -126,6 +130,8 @@ async def bulk_scrape_stream(request: BulkScrapeRequest):
                 result = await mongodb_client.bulk_insert_projects(projects)
                 stored = result["inserted"]
                 duplicates = result["duplicates"]
+                if request.generate_embeddings and settings.EMBEDDING_WORKER_ENABLED:
+                    await mongodb_client.enqueue_embeddings([p["urlOfProject"] for p in projects if p.get("urlOfProject")])
             
             # Complete
             yield f"data: {json.dumps({'status': 'complete', 'message': 'Bulk scrape completed', 'progress': 100, 'total_scraped': len(projects), 'total_failed': len(failures), 'total_stored': stored, 'duplicates': duplicates})}\n\n"
@@ -162,12 +168,12 @@ async def bulk_scrape(request: BulkScrapeRequest):
                 detail="Failed to scrape any projects"
             )
         
-        # Generate embeddings
-        if request.generate_embeddings:
+        # Generate embeddings (embedding workers do it after storage when enabled)
+        if request.generate_embeddings and not settings.EMBEDDING_WORKER_ENABLED:
             logger.info("Generating embeddings...")
             for project in projects:
                 try:
-                    embeddings = await embedding_service.generate_project_embedding(project)
+                    embeddings = await embedding_service.generate_project_embedding(project, lane=BULK)
                     project["embeddingsOfData"] = embeddings
                 except Exception as e:
                     logger.error(f"Error generating embedding: {e}")
@@ -182,6 +188,8 @@ async def bulk_scrape(request: BulkScrapeRequest):
             result = await mongodb_client.bulk_insert_projects(projects)
             stored = result["inserted"]
             duplicates = result["duplicates"]
+            if request.generate_embeddings and settings.EMBEDDING_WORKER_ENABLED:
+                await mongodb_client.enqueue_embeddings([p["urlOfProject"] for p in projects if p.get("urlOfProject")])
         
         return BulkScrapeResponse(
             status="success",
@@ -209,6 +217,11 @@ async def generate_embeddings_stream(request: GenerateEmbeddingsRequest):
     """
     async def event_generator():
         try:
+            if settings.EMBEDDING_WORKER_ENABLED:
+                queued = await mongodb_client.enqueue_pending_embeddings(limit=request.limit)
+                yield f"data: {json.dumps({'status': 'complete', 'message': f'Queued {queued} projects for the embedding workers', 'progress': 100, 'queued': queued})}\n\n"
+                return
+            
             # Get projects without embeddings
             yield f"data: {json.dumps({'status': 'fetching', 'message': 'Fetching projects without embeddings...', 'progress': 0})}\n\n"
             
@@ -227,12 +240,13 @@ async def generate_embeddings_stream(request: GenerateEmbeddingsRequest):
             for idx, project in enumerate(projects):
                 try:
                     # Generate embedding
-                    embeddings = await embedding_service.generate_project_embedding(project)
+                    embeddings = await embedding_service.generate_project_embedding(project, lane=BULK)
                     
                     # Update in database
                     success = await mongodb_client.update_project_embeddings(
                         project["urlOfProject"],
-                        embeddings
+                        embeddings,
+                        text_hash=embedding_service.embedding_text_hash(project)
                     )
                     
                     if success:
@@ -270,6 +284,16 @@ async def generate_embeddings(request: GenerateEmbeddingsRequest):
     try:
         logger.info("Starting embedding generation for projects")
         
+        if settings.EMBEDDING_WORKER_ENABLED:
+            queued = await mongodb_client.enqueue_pending_embeddings(limit=request.limit)
+            return GenerateEmbeddingsResponse(
+                status="queued",
+                message=f"Queued {queued} projects for the embedding workers",
+                processed=queued,
+                updated=0,
+                failed=0
+            )
+        
         # Get projects without embeddings
         projects = await mongodb_client.get_projects_without_embeddings(limit=request.limit)
         
@@ -288,12 +312,13 @@ async def generate_embeddings(request: GenerateEmbeddingsRequest):
         for project in projects:
             try:
                 # Generate embedding
-                embeddings = await embedding_service.generate_project_embedding(project)
+                embeddings = await embedding_service.generate_project_embedding(project, lane=BULK)
                 
                 # Update in database
                 success = await mongodb_client.update_project_embeddings(
                     project["urlOfProject"],
-                    embeddings
+                    embeddings,
+                    text_hash=embedding_service.embedding_text_hash(project)
                 )
                 
                 if success:
@@ -333,7 +358,8 @@ async def get_bulk_status():
             "total_projects": total,
             "projects_with_embeddings": with_embeddings,
             "projects_without_embeddings": total - with_embeddings,
-            "completion_percentage": (with_embeddings / total * 100) if total > 0 else 0
+            "completion_percentage": (with_embeddings / total * 100) if total > 0 else 0,
+            "embedding_queue": await mongodb_client.get_embedding_queue_counts(),
         }
     
     except Exception as e:
@@ -451,3 +477,118 @@ async def list_ingest_jobs(
         "count": len(jobs),
         "jobs": jobs,
     }
+
+
+@router.post("/index/snapshot")
+async def write_index_snapshot(x_admin_token: Optional[str] = Header(default=None)):
+    """Persist the resident vector index as an mmap snapshot shared by all workers."""
+    _validate_admin_token(x_admin_token)
+
+    try:
+        manifest = await vector_index_service.write_snapshot()
+        return {"status": "success", "snapshot": manifest}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error writing index snapshot: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error writing index snapshot: {str(e)}")
+
+
+@router.post("/index/build")
+async def build_ann_index(
+    backend: str = settings.VECTOR_INDEX_BACKEND,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Train an approximate index (e.g. IVF) in the background; progress shows in /api/similarity/stats."""
+    _validate_admin_token(x_admin_token)
+
+    try:
+        await vector_index_service.ensure_loaded()
+        started = vector_index_service.schedule_build(backend)
+        return {
+            "status": "started" if started else "running",
+            "message": f"Build of the {backend} index {'started' if started else 'already in progress'}",
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting index build: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error starting index build: {str(e)}")
+
+
+@router.post("/index/reload")
+async def reload_index(
+    source: str = "auto",
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Reload the vector index from the current snapshot or from MongoDB."""
+    _validate_admin_token(x_admin_token)
+
+    try:
+        stats = await vector_index_service.load(source=source)
+        return {"status": "success", "index": stats}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reloading index: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error reloading index: {str(e)}")
+
+
+@router.post("/embeddings/migrate")
+async def migrate_embeddings(
+    batch_size: Optional[int] = None,
+    limit: Optional[int] = None,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Convert array-of-doubles embeddings to packed float32 vectors in the background (resumable)."""
+    _validate_admin_token(x_admin_token)
+
+    try:
+        started = embedding_migration_service.schedule(batch_size=batch_size, limit=limit)
+        return {
+            "status": "started" if started else "running",
+            "message": f"Embedding migration {'started' if started else 'already in progress'}",
+            "migration": embedding_migration_service.status(),
+        }
+    except Exception as e:
+        logger.error(f"Error starting embedding migration: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error starting embedding migration: {str(e)}")
+
+
+@router.get("/embeddings/migrate")
+async def embedding_migration_status(x_admin_token: Optional[str] = Header(default=None)):
+    """Progress of the current or last embedding migration."""
+    _validate_admin_token(x_admin_token)
+    return {"status": "success", "migration": embedding_migration_service.status()}
+
+
+@router.post("/duplicates/scan")
+async def scan_duplicates(
+    full: bool = False,
+    threshold: Optional[float] = None,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Cluster near-duplicate projects in the background; incremental unless ``full`` is set."""
+    _validate_admin_token(x_admin_token)
+    if threshold is not None and not 0 < threshold <= 1:
+        raise HTTPException(status_code=400, detail="threshold must be in (0, 1]")
+
+    try:
+        started = duplicate_cluster_service.schedule(full=full, threshold=threshold)
+        return {
+            "status": "started" if started else "running",
+            "message": f"Duplicate scan {'started' if started else 'already in progress'}",
+            "scan": duplicate_cluster_service.status(),
+        }
+    except Exception as e:
+        logger.error(f"Error starting duplicate scan: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error starting duplicate scan: {str(e)}")
+
+
+@router.get("/duplicates/scan")
+async def duplicate_scan_status(x_admin_token: Optional[str] = Header(default=None)):
+    """Progress of the current or last duplicate scan."""
+    _validate_admin_token(x_admin_token)
+    return {"status": "success", "scan": duplicate_cluster_service.status()}
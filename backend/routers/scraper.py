@@ -7,7 +7,8 @@ import logging
 
 from services.scraper import scraper_service
 from services.embedding import embedding_service
-from services.mongodb import mongodb_client
+from services.mongodb import mongodb_client, SLIM_PROJECT_PROJECTION
+from services.result_cache import search_result_cache
 
 logger = logging.getLogger("DevFoolU.routers.scraper")
 
@@ -56,21 +57,37 @@ async def find_similar_projects(request: FindSimilarRequest):
         url = str(request.url)
         logger.info(f"Finding similar projects for: {url}")
         
-        # Step 1: Check if project exists in database
-        project = await mongodb_client.get_project_by_url(url)
-        was_scraped = False
-        
-        if project:
+        async def find_stored():
+            # Step 1: Check if project exists in database (display fields only)
+            project = await mongodb_client.get_project_by_url(url, projection=SLIM_PROJECT_PROJECTION)
+            if not project:
+                return None
+            
             # Project exists in database
             logger.info(f"Project found in database: {url}")
             
-            # Check if it has embeddings
-            if not project.get("embeddingsOfData") or len(project.get("embeddingsOfData", [])) == 0:
+            # Neighbours from the precomputed kNN graph, or a live search with the stored embedding
+            similar_projects = await mongodb_client.find_similar_to_project(url, top_k=5)
+            if similar_projects is None:
                 logger.warning(f"Project exists but has no embeddings: {url}")
                 raise HTTPException(
                     status_code=400,
                     detail="Project exists in database but has no embeddings. Please generate embeddings first using /api/bulk/generate-embeddings endpoint."
                 )
+            return {"project": project, "similar_projects": similar_projects}
+        
+        # Stored projects are served from the result cache until the index changes;
+        # unknown URLs are never cached, and storing the scraped project bumps the version
+        stored = await search_result_cache.get_or_compute(
+            "find-similar",
+            {"url": mongodb_client._canonicalize_url(url)},
+            find_stored
+        )
+        was_scraped = False
+        embedding = None
+        
+        if stored:
+            project, similar_projects = stored["project"], stored["similar_projects"]
         else:
             # Project doesn't exist - need to scrape it
             logger.info(f"Project not in database. Scraping: {url}")
@@ -91,6 +108,7 @@ async def find_similar_projects(request: FindSimilarRequest):
             logger.info("Generating embeddings for scraped project...")
             embeddings = await embedding_service.generate_project_embedding(project_data)
             project_data["embeddingsOfData"] = embeddings
+            embedding = embeddings
             
             # Store in database
             logger.info("Storing project in database...")
@@ -103,32 +121,30 @@ async def find_similar_projects(request: FindSimilarRequest):
                 logger.error(f"Error storing project: {e}")
                 # Continue even if storage fails
             
-            project = project_data
-        
-        # Step 2: Perform vector similarity search
-        logger.info("Performing vector similarity search...")
-        similar_projects = await mongodb_client.vector_search(
-            project["embeddingsOfData"],
-            top_k=6  # Get 6, then filter out the current project
-        )
+            project = remove_embeddings(project_data)
         
-        # Remove the current project from results and limit to top 5
-        similar_projects = [
-            p for p in similar_projects 
-            if p.get("urlOfProject") != url
-        ][:5]
+        # Step 2: Perform vector similarity search for newly scraped projects
+        if was_scraped:
+            logger.info("Performing vector similarity search...")
+            similar_projects = await mongodb_client.vector_search(
+                embedding,
+                top_k=6  # Get 6, then filter out the current project
+            )
+            
+            # Remove the current project from results and limit to top 5
+            similar_projects = [
+                p for p in similar_projects 
+                if p.get("urlOfProject") != url
+            ][:5]
         
         logger.info(f"Found {len(similar_projects)} similar projects")
         
-        # Step 3: Remove embeddings from all projects before returning
-        project_without_embeddings = remove_embeddings(project)
-        similar_without_embeddings = [remove_embeddings(p) for p in similar_projects]
-        
+        # Step 3: Results are already slim (no embeddings or raw content)
         return FindSimilarResponse(
             status="success",
-            message=f"Found {len(similar_without_embeddings)} similar projects",
-            project=project_without_embeddings,
-            similar_projects=similar_without_embeddings,
+            message=f"Found {len(similar_projects)} similar projects",
+            project=project,
+            similar_projects=similar_projects,
             was_scraped=was_scraped
         )
     
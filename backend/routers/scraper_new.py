@@ -5,7 +5,8 @@ from pydantic import BaseModel, HttpUrl
 from typing import Dict, List
 import logging
 
-from services.mongodb import mongodb_client
+from services.mongodb import mongodb_client, SLIM_PROJECT_PROJECTION
+from services.result_cache import search_result_cache
 
 logger = logging.getLogger("DevFoolU.routers.scraper")
 
@@ -25,15 +26,6 @@ class FindSimilarResponse(BaseModel):
     similar_projects: List[Dict]
 
 
-def remove_embeddings(project: Dict) -> Dict:
-    """Remove embeddings from project data before returning to client"""
-    if project and "embeddingsOfData" in project:
-        project_copy = project.copy()
-        del project_copy["embeddingsOfData"]
-        return project_copy
-    return project
-
-
 @router.post("/find-similar", response_model=FindSimilarResponse)
 async def find_similar_projects(request: FindSimilarRequest):
     """
@@ -49,46 +41,43 @@ async def find_similar_projects(request: FindSimilarRequest):
         url = str(request.url)
         logger.info(f"Finding similar projects for: {url}")
         
-        # Step 1: Get project from database
-        project = await mongodb_client.get_project_by_url(url)
-        
-        if not project:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Project not found in database: {url}"
-            )
-        
-        # Step 2: Check if project has embeddings
-        if not project.get("embeddingsOfData") or len(project.get("embeddingsOfData", [])) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Project does not have embeddings. Please generate embeddings first."
-            )
+        async def find_stored():
+            # Step 1: Get project display fields from database
+            project = await mongodb_client.get_project_by_url(url, projection=SLIM_PROJECT_PROJECTION)
+            
+            if not project:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Project not found in database: {url}"
+                )
+            
+            # Steps 2-3: Top 5 neighbours from the precomputed kNN graph, or a live
+            # vector search with the project's embedding when the graph cannot answer
+            logger.info("Finding similar projects...")
+            similar_projects = await mongodb_client.find_similar_to_project(url, top_k=5)
+            if similar_projects is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Project does not have embeddings. Please generate embeddings first."
+                )
+            return {"project": project, "similar_projects": similar_projects}
         
-        # Step 3: Find similar projects using vector search
-        logger.info("Performing vector similarity search...")
-        similar_projects = await mongodb_client.vector_search(
-            project["embeddingsOfData"],
-            top_k=6  # Get 6, then filter out the current project
+        # Served from the result cache until the index changes
+        stored = await search_result_cache.get_or_compute(
+            "find-similar",
+            {"url": mongodb_client._canonicalize_url(url)},
+            find_stored
         )
-        
-        # Remove the current project from results and limit to top 5
-        similar_projects = [
-            p for p in similar_projects 
-            if p["urlOfProject"] != url
-        ][:5]
+        project, similar_projects = stored["project"], stored["similar_projects"]
         
         logger.info(f"Found {len(similar_projects)} similar projects")
         
-        # Step 4: Remove embeddings from all projects before returning
-        project_without_embeddings = remove_embeddings(project)
-        similar_without_embeddings = [remove_embeddings(p) for p in similar_projects]
-        
+        # Step 4: Results are already slim (no embeddings or raw content)
         return FindSimilarResponse(
             status="success",
-            message=f"Found {len(similar_without_embeddings)} similar projects",
-            project=project_without_embeddings,
-            similar_projects=similar_without_embeddings
+            message=f"Found {len(similar_projects)} similar projects",
+            project=project,
+            similar_projects=similar_projects
         )
     
     except HTTPException:
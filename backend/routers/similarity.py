@@ -1,13 +1,18 @@
 """Router for similarity search operations"""
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+import json
 import logging
 
 from services.embedding import embedding_service
-from services.mongodb import mongodb_client
+from services.embedding_scheduler import INTERACTIVE
+from services.mongodb import mongodb_client, SLIM_PROJECT_PROJECTION
 from services.ai_intelligence import ai_intelligence_service
+from services.vector_index import vector_index_service
+from services.result_cache import search_result_cache
 from core.config import settings
 
 logger = logging.getLogger("DevFoolU.routers.similarity")
@@ -15,13 +20,34 @@ logger = logging.getLogger("DevFoolU.routers.similarity")
 router = APIRouter()
 
 
-def remove_embeddings(project: Dict) -> Dict:
-    """Remove embeddings from project data before returning to client"""
-    if project and "embeddingsOfData" in project:
-        project_copy = project.copy()
-        del project_copy["embeddingsOfData"]
-        return project_copy
-    return project
+def search_options(request: BaseModel) -> Dict:
+    """Index selection and tuning parameters for vector_search, validated up front"""
+    index = getattr(request, "index", None)
+    if index and index not in vector_index_service.available_indexes():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown index '{index}'. Available: {', '.join(vector_index_service.available_indexes())}"
+        )
+    options = {"index": index}
+    for name in ("nprobe", "ef_search", "rerank"):
+        if getattr(request, name, None):
+            options[name] = getattr(request, name)
+    filters = {
+        name: getattr(request, name)
+        for name in ("technologies", "tags", "has_github", "has_demo")
+        if getattr(request, name, None) not in (None, [])
+    }
+    if filters:
+        options["filters"] = filters
+    return options
+
+
+async def verdict_fields(input_project: Dict, results: List[Dict], defer: bool) -> Dict:
+    """``ai_verdict`` (and ``verdict_id``) for a response; deferred verdicts are generated in the background"""
+    if defer:
+        verdict_id, verdict = ai_intelligence_service.submit_verdict(input_project, results)
+        return {"ai_verdict": verdict, "verdict_id": verdict_id}
+    return {"ai_verdict": await ai_intelligence_service.generate_similarity_verdict(input_project, results)}
 
 
 class SimilaritySearchRequest(BaseModel):
@@ -29,12 +55,101 @@ class SimilaritySearchRequest(BaseModel):
     query: str  # Can be project name, description, or general query
     top_k: int = 5
     min_similarity: float = 0.3
+    mode: str = "semantic"  # semantic | hybrid (vector + BM25 keyword matches, rank-fused)
+    defer_verdict: bool = False  # respond without waiting for the AI verdict; collect it via verdict_id
+    index: Optional[str] = None  # exact | ivf | hnsw | sq8 | pq; defaults to VECTOR_INDEX_BACKEND
+    nprobe: Optional[int] = None  # IVF lists to scan; defaults to VECTOR_INDEX_IVF_NPROBE
+    ef_search: Optional[int] = None  # HNSW beam width; defaults to VECTOR_INDEX_HNSW_EF_SEARCH
+    rerank: Optional[int] = None  # sq8/pq candidates re-scored exactly; defaults to VECTOR_INDEX_QUANT_RERANK
+    technologies: Optional[List[str]] = None  # only projects using all of these (case-insensitive)
+    tags: Optional[List[str]] = None  # only projects carrying all of these tags
+    has_github: Optional[bool] = None  # true: with a GitHub link, false: without
+    has_demo: Optional[bool] = None  # true: with a demo/live link, false: without
 
 
 class SimilaritySearchByURLRequest(BaseModel):
     """Request model for finding similar projects by URL"""
     url: str
     top_k: int = 5
+    defer_verdict: bool = False
+    index: Optional[str] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    rerank: Optional[int] = None
+    technologies: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    has_github: Optional[bool] = None
+    has_demo: Optional[bool] = None
+
+
+class BatchSearchItem(BaseModel):
+    """One query of a batch search: a text ``query`` or the ``url`` of a stored project"""
+    query: Optional[str] = None
+    url: Optional[str] = None
+    top_k: Optional[int] = None  # defaults to the batch top_k
+    min_similarity: Optional[float] = None  # defaults to the batch min_similarity
+
+
+class BatchSearchRequest(BaseModel):
+    """Request model for batch similarity search"""
+    queries: List[BatchSearchItem]
+    top_k: int = 5
+    min_similarity: Optional[float] = None
+    index: Optional[str] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    rerank: Optional[int] = None
+    technologies: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    has_github: Optional[bool] = None
+    has_demo: Optional[bool] = None
+
+
+class BatchSearchResult(BaseModel):
+    """Results for one query of a batch search"""
+    query: Optional[str] = None
+    url: Optional[str] = None
+    results: List[Dict]
+    count: int
+    error: Optional[str] = None
+
+
+class BatchSearchResponse(BaseModel):
+    """Response model for batch similarity search"""
+    status: str
+    message: str
+    results: List[BatchSearchResult]
+
+
+class RangeSearchRequest(BaseModel):
+    """Request model for range search: every project at or above a similarity threshold"""
+    query: Optional[str] = None
+    url: Optional[str] = None  # search around a stored project (the project itself is left out)
+    threshold: float = 0.8
+    limit: Optional[int] = None  # cap on matches; defaults to (and is capped at) RANGE_SEARCH_MAX_RESULTS
+    page_size: int = 50
+    offset: int = 0
+    stream: bool = False  # stream every page as server-sent events instead of returning one page
+    index: Optional[str] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    rerank: Optional[int] = None
+    technologies: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    has_github: Optional[bool] = None
+    has_demo: Optional[bool] = None
+
+
+class RangeSearchResponse(BaseModel):
+    """Response model for one page of a range search"""
+    status: str
+    message: str
+    results: List[Dict]
+    count: int
+    offset: int
+    total: int  # matches found (at most the limit)
+    truncated: bool  # more projects pass the threshold than the limit allowed
+    next_offset: Optional[int] = None
 
 
 class SimilarityResponse(BaseModel):
@@ -44,6 +159,7 @@ class SimilarityResponse(BaseModel):
     results: List[Dict]
     count: int
     ai_verdict: Optional[Dict] = None  # AI-powered analysis verdict
+    verdict_id: Optional[str] = None  # set when the verdict is deferred; see /verdicts/{verdict_id}
 
 
 @router.post("/search", response_model=SimilarityResponse)
@@ -61,25 +177,47 @@ async def similarity_search(request: SimilaritySearchRequest):
     """
     try:
         logger.info(f"Similarity search query: '{request.query[:50]}...'")
+        if request.mode not in ("semantic", "hybrid"):
+            raise HTTPException(
+                status_code=400,
+                detail="mode must be 'semantic' or 'hybrid'"
+            )
+        options = search_options(request)
         
-        # Generate embedding for the query
-        query_embedding = await embedding_service.generate_query_embedding(request.query)
+        async def run_search():
+            # Generate embedding for the query
+            query_embedding = await embedding_service.generate_query_embedding(request.query)
+            
+            if request.mode == "hybrid":
+                # Vector search fused with BM25 keyword matches
+                return await mongodb_client.hybrid_search(
+                    request.query,
+                    query_embedding,
+                    top_k=request.top_k,
+                    **options
+                )
+            # Perform vector search
+            return await mongodb_client.vector_search(
+                query_embedding,
+                top_k=request.top_k,
+                **options
+            )
         
-        # Perform vector search
-        results = await mongodb_client.vector_search(
-            query_embedding,
-            top_k=request.top_k
+        # Repeated searches are served from the result cache until the index changes
+        results = await search_result_cache.get_or_compute(
+            "search",
+            {"query": request.query, "top_k": request.top_k, "mode": request.mode, **options},
+            run_search
         )
         
-        # Filter by minimum similarity
+        # Filter by minimum similarity (results are already slim: no embeddings or raw content);
+        # keyword matches are kept regardless of their cosine score
         filtered_results = [
             r for r in results 
             if r.get("similarity_score", 0) >= request.min_similarity
+            or r.get("match_type") in ("lexical", "both")
         ]
         
-        # Remove embeddings from results
-        filtered_results = [remove_embeddings(r) for r in filtered_results]
-        
         # Generate AI verdict using RAG
         # Create a synthetic input project from the query
         query_project = {
@@ -88,10 +226,7 @@ async def similarity_search(request: SimilaritySearchRequest):
             "technologiesUsedInProject": [],
             "tagsOfProject": []
         }
-        ai_verdict = await ai_intelligence_service.generate_similarity_verdict(
-            query_project,
-            filtered_results
-        )
+        verdict = await verdict_fields(query_project, filtered_results, request.defer_verdict)
         
         logger.info(f"Found {len(filtered_results)} similar projects")
         
@@ -100,9 +235,11 @@ async def similarity_search(request: SimilaritySearchRequest):
             message=f"Found {len(filtered_results)} similar projects",
             results=filtered_results,
             count=len(filtered_results),
-            ai_verdict=ai_verdict
+            **verdict
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in similarity search: {e}", exc_info=True)
         raise HTTPException(
@@ -125,44 +262,40 @@ async def similarity_search_by_url(request: SimilaritySearchByURLRequest):
     """
     try:
         logger.info(f"Finding similar projects for: {request.url}")
+        options = search_options(request)
         
-        # Get the project from database
-        project = await mongodb_client.get_project_by_url(request.url)
-        
-        if not project:
-            raise HTTPException(
-                status_code=404,
-                detail="Project not found in database"
-            )
-        
-        # Check if project has embeddings
-        if not project.get("embeddingsOfData"):
-            raise HTTPException(
-                status_code=400,
-                detail="Project does not have embeddings. Please generate embeddings first."
+        async def run_search():
+            # Get the project's display fields from database
+            project = await mongodb_client.get_project_by_url(request.url, projection=SLIM_PROJECT_PROJECTION)
+            
+            if not project:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Project not found in database"
+                )
+            
+            # Neighbours from the precomputed kNN graph, or a live search with the stored embedding
+            results = await mongodb_client.find_similar_to_project(
+                request.url,
+                top_k=request.top_k,
+                **options
             )
+            if results is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Project does not have embeddings. Please generate embeddings first."
+                )
+            return {"project": project, "results": results}
         
-        # Perform vector search
-        results = await mongodb_client.vector_search(
-            project["embeddingsOfData"],
-            top_k=request.top_k + 1  # Get one extra to filter out the current project
+        cached = await search_result_cache.get_or_compute(
+            "search-by-url",
+            {"url": mongodb_client._canonicalize_url(request.url), "top_k": request.top_k, **options},
+            run_search
         )
-        
-        # Remove the current project from results
-        filtered_results = [
-            r for r in results 
-            if r["urlOfProject"] != request.url
-        ][:request.top_k]
-        
-        # Remove embeddings from results
-        filtered_results = [remove_embeddings(r) for r in filtered_results]
+        project, filtered_results = cached["project"], cached["results"]
         
         # Generate AI verdict using RAG
-        input_project_clean = remove_embeddings(project)
-        ai_verdict = await ai_intelligence_service.generate_similarity_verdict(
-            input_project_clean,
-            filtered_results
-        )
+        verdict = await verdict_fields(project, filtered_results, request.defer_verdict)
         
         logger.info(f"Found {len(filtered_results)} similar projects")
         
@@ -171,7 +304,7 @@ async def similarity_search_by_url(request: SimilaritySearchByURLRequest):
             message=f"Found {len(filtered_results)} similar projects",
             results=filtered_results,
             count=len(filtered_results),
-            ai_verdict=ai_verdict
+            **verdict
         )
     
     except HTTPException:
@@ -184,11 +317,175 @@ async def similarity_search_by_url(request: SimilaritySearchByURLRequest):
         )
 
 
+@router.post("/search-batch", response_model=BatchSearchResponse)
+async def similarity_search_batch(request: BatchSearchRequest):
+    """
+    Run many similarity searches in one call (judging dashboards, plagiarism sweeps)
+
+    Text queries are embedded in a single model batch and all queries are scored
+    together with one matrix-matrix product. URL queries use the stored project's
+    embedding and never return that project itself. Filters apply to every query.
+    No AI verdict is generated.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="At least one query is required")
+    if len(request.queries) > settings.SIMILARITY_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.SIMILARITY_BATCH_MAX_QUERIES} queries per batch"
+        )
+    for position, item in enumerate(request.queries):
+        if bool(item.query) == bool(item.url):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Query {position} must set exactly one of 'query' or 'url'"
+            )
+
+    try:
+        options = search_options(request)
+        logger.info(f"Batch similarity search: {len(request.queries)} queries")
+
+        embeddings: List = [None] * len(request.queries)
+        errors: List[Optional[str]] = [None] * len(request.queries)
+
+        text_positions = [i for i, item in enumerate(request.queries) if item.query]
+        if text_positions:
+            vectors = await embedding_service.generate_batch_embeddings(
+                [request.queries[i].query for i in text_positions],
+                lane=INTERACTIVE,
+            )
+            for position, vector in zip(text_positions, vectors):
+                embeddings[position] = vector
+
+        for position, item in enumerate(request.queries):
+            if item.url:
+                embeddings[position] = await mongodb_client.get_project_vector(item.url)
+                if embeddings[position] is None:
+                    errors[position] = "Project not found or has no embeddings"
+
+        top_ks = [item.top_k or request.top_k for item in request.queries]
+        # One extra hit per URL query so the project itself can be dropped
+        searched = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        hit_lists = await mongodb_client.vector_search_batch(
+            [embeddings[i] for i in searched],
+            top_k=max(top_ks[i] + (1 if request.queries[i].url else 0) for i in searched) if searched else 0,
+            **options
+        )
+        results_by_position = dict(zip(searched, hit_lists))
+
+        results = []
+        for position, item in enumerate(request.queries):
+            hits = results_by_position.get(position, [])
+            if item.url:
+                own_url = mongodb_client._canonicalize_url(item.url)
+                hits = [r for r in hits if r["urlOfProject"] != own_url]
+            min_similarity = item.min_similarity if item.min_similarity is not None else request.min_similarity
+            if min_similarity is not None:
+                hits = [r for r in hits if r.get("similarity_score", 0) >= min_similarity]
+            hits = hits[:top_ks[position]]
+            results.append(BatchSearchResult(
+                query=item.query,
+                url=item.url,
+                results=hits,
+                count=len(hits),
+                error=errors[position]
+            ))
+
+        return BatchSearchResponse(
+            status="success",
+            message=f"Searched {len(searched)} of {len(request.queries)} queries",
+            results=results
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch similarity search: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error performing batch similarity search: {str(e)}"
+        )
+
+
+@router.post("/search-range")
+async def similarity_search_range(request: RangeSearchRequest):
+    """
+    Every project with similarity >= threshold (plagiarism review), best first
+
+    Unlike ``min_similarity`` on /search, matches are not cut to a top_k first: the index
+    returns all of them up to ``limit``. Pages are hydrated on demand via
+    ``offset``/``page_size``, or all streamed as server-sent events with ``stream``.
+    """
+    if bool(request.query) == bool(request.url):
+        raise HTTPException(status_code=400, detail="Set exactly one of 'query' or 'url'")
+    if not 0 < request.threshold <= 1:
+        raise HTTPException(status_code=400, detail="threshold must be in (0, 1]")
+    if request.page_size < 1 or request.offset < 0:
+        raise HTTPException(status_code=400, detail="page_size must be positive and offset non-negative")
+    limit = min(request.limit or settings.RANGE_SEARCH_MAX_RESULTS, settings.RANGE_SEARCH_MAX_RESULTS)
+
+    try:
+        options = search_options(request)
+        if request.url:
+            query_embedding = await mongodb_client.get_project_vector(request.url)
+            if query_embedding is None:
+                raise HTTPException(status_code=404, detail="Project not found or has no embeddings")
+        else:
+            query_embedding = await embedding_service.generate_query_embedding(request.query)
+
+        search = dict(
+            page_size=request.page_size,
+            offset=request.offset,
+            exclude_url=request.url,
+            **options
+        )
+
+        if request.stream:
+            async def event_generator():
+                total, truncated = 0, False
+                try:
+                    pages = mongodb_client.iter_vector_range_search(
+                        query_embedding, request.threshold, limit, **search
+                    )
+                    async for page in pages:
+                        total, truncated = page["total"], page["truncated"]
+                        yield f"data: {json.dumps(dict(page, status='results'), default=str)}\n\n"
+                    yield f"data: {json.dumps({'status': 'complete', 'total': total, 'truncated': truncated})}\n\n"
+                except Exception as e:
+                    logger.error(f"Error in range search stream: {e}", exc_info=True)
+                    yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+
+            return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+        page = await mongodb_client.vector_range_search(query_embedding, request.threshold, limit, **search)
+        end = page["offset"] + len(page["results"])
+        return RangeSearchResponse(
+            status="success",
+            message=f"Found {page['total']} projects with similarity >= {request.threshold}",
+            results=page["results"],
+            count=len(page["results"]),
+            offset=page["offset"],
+            total=page["total"],
+            truncated=page["truncated"],
+            next_offset=end if end < page["total"] else None
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in range search: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error performing range search: {str(e)}"
+        )
+
+
 @router.post("/find-by-project")
-async def find_similar_by_project_data(project_data: Dict):
+async def find_similar_by_project_data(project_data: Dict, defer_verdict: bool = False):
     """
     Find similar projects based on project data (without storing it)
     Useful for finding similar projects before scraping/storing
+    ``?defer_verdict=true`` responds before the AI verdict is ready (see /verdicts/{verdict_id})
     """
     try:
         logger.info("Finding similar projects for provided project data")
@@ -199,21 +496,15 @@ async def find_similar_by_project_data(project_data: Dict):
         # Perform vector search
         results = await mongodb_client.vector_search(embedding, top_k=5)
         
-        # Remove embeddings from results
-        results = [remove_embeddings(r) for r in results]
-        
         # Generate AI verdict using RAG
-        ai_verdict = await ai_intelligence_service.generate_similarity_verdict(
-            project_data,
-            results
-        )
+        verdict = await verdict_fields(project_data, results, defer_verdict)
         
         return SimilarityResponse(
             status="success",
             message=f"Found {len(results)} similar projects",
             results=results,
             count=len(results),
-            ai_verdict=ai_verdict
+            **verdict
         )
     
     except Exception as e:
@@ -224,6 +515,78 @@ async def find_similar_by_project_data(project_data: Dict):
         )
 
 
+@router.get("/verdicts/{verdict_id}")
+async def get_deferred_verdict(verdict_id: str, wait: float = 0.0):
+    """
+    Poll a deferred AI verdict: ``pending`` until ready, then ``ready`` with ``ai_verdict``
+
+    ``wait`` (seconds, capped at GEMINI_TIMEOUT_SECONDS) long-polls a pending verdict.
+    """
+    wait = max(0.0, min(wait, settings.GEMINI_TIMEOUT_SECONDS))
+    if wait:
+        status, verdict = await ai_intelligence_service.wait_for_verdict(verdict_id, wait)
+    else:
+        status, verdict = await ai_intelligence_service.get_verdict(verdict_id)
+    if status == "not_found":
+        raise HTTPException(status_code=404, detail="Unknown or expired verdict_id")
+    return {"status": status, "verdict_id": verdict_id, "ai_verdict": verdict}
+
+
+@router.get("/verdicts/{verdict_id}/stream")
+async def stream_deferred_verdict(verdict_id: str):
+    """Server-sent event stream that delivers a deferred AI verdict as soon as it is ready"""
+    async def event_generator():
+        try:
+            # The verdict's own deadline bounds the wait; the margin covers a queued background task
+            status, verdict = await ai_intelligence_service.wait_for_verdict(
+                verdict_id, settings.GEMINI_TIMEOUT_SECONDS + 2.0
+            )
+            event = {"status": status, "verdict_id": verdict_id, "ai_verdict": verdict}
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+        except Exception as e:
+            logger.error(f"Error in verdict stream: {e}", exc_info=True)
+            yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@router.get("/facets")
+async def get_filter_facets(limit: int = 50):
+    """Most common technologies and tags among indexed projects, for filter pickers"""
+    try:
+        await vector_index_service.ensure_loaded()
+        return {
+            "status": "success",
+            **vector_index_service.facet_values(limit=max(1, min(limit, 500)))
+        }
+
+    except Exception as e:
+        logger.error(f"Error getting facets: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error getting facets: {str(e)}"
+        )
+
+
+@router.get("/duplicates")
+async def list_duplicate_clusters(min_size: int = 2, limit: int = 50, skip: int = 0):
+    """Near-duplicate project clusters found by the duplicate scan, largest first"""
+    try:
+        page = await mongodb_client.list_duplicate_clusters(
+            min_size=max(2, min_size),
+            limit=max(1, min(limit, 500)),
+            skip=max(0, skip)
+        )
+        return {"status": "success", **page}
+
+    except Exception as e:
+        logger.error(f"Error listing duplicate clusters: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error listing duplicate clusters: {str(e)}"
+        )
+
+
 @router.get("/stats")
 async def get_similarity_stats():
     """Get statistics about the database for similarity search"""
@@ -237,7 +600,14 @@ async def get_similarity_stats():
             "projects_with_embeddings": projects_with_embeddings,
             "projects_without_embeddings": total_projects - projects_with_embeddings,
             "embedding_dimension": settings.EMBEDDING_DIMENSION,
-            "model": settings.EMBEDDING_MODEL_NAME
+            "model": settings.EMBEDDING_MODEL_NAME,
+            "query_embedding_cache": embedding_service.query_cache_stats(),
+            "embedding_batcher": embedding_service.batcher_stats(),
+            "embedding_packing": embedding_service.packing_stats(),
+            "embedding_lanes": embedding_service.lane_stats(),
+            "result_cache": search_result_cache.stats(),
+            "ai_verdicts": ai_intelligence_service.stats(),
+            "vector_index": vector_index_service.stats()
         }
     
     except Exception as e:
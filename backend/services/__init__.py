@@ -4,5 +4,14 @@ from .mongodb import mongodb_client
 from .embedding import embedding_service
 from .scraper import scraper_service
 from .mass_ingestor import mass_ingestor_service
+from .vector_index import vector_index_service
+from .index_sync import index_sync_service
 
-__all__ = ["mongodb_client", "embedding_service", "scraper_service", "mass_ingestor_service"]
+__all__ = [
+    "mongodb_client",
+    "embedding_service",
+    "scraper_service",
+    "mass_ingestor_service",
+    "vector_index_service",
+    "index_sync_service",
+]
@@ -1,34 +1,115 @@
 """AI Intelligence Service using Google Gemini for project similarity analysis"""
 
+import asyncio
+import hashlib
+import json
 import logging
-from typing import List, Dict, Optional
-import google.generativeai as genai
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
 from core.config import settings
+from services.result_cache import search_result_cache
+
+try:
+    import google.generativeai as genai
+except ImportError:  # pragma: no cover - only needed for AI_VERDICT_BACKEND=gemini
+    genai = None
 
 logger = logging.getLogger("DevFoolU.services.ai_intelligence")
 
+# Only this many similar projects go into the prompt, so only they key the verdict cache
+PROMPT_PROJECTS = 5
+
+
+class GeminiBackend:
+    """Gemini through the native async API, so generation never blocks the event loop"""
+
+    def __init__(self):
+        if genai is None:
+            raise RuntimeError("google-generativeai is not installed")
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+        self.name = settings.GEMINI_MODEL
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                max_output_tokens=settings.GEMINI_MAX_OUTPUT_TOKENS,
+                temperature=settings.GEMINI_TEMPERATURE,
+            )
+        )
+        return response.text
+
+
+class FakeLLMBackend:
+    """Deterministic local stand-in for tests and offline development (no network, optional latency)"""
+
+    name = "fake-llm"
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        names = [
+            line.split(". ", 1)[1].rsplit(" (Similarity", 1)[0]
+            for line in prompt.splitlines()
+            if line[:1].isdigit() and ". " in line
+        ]
+        return "\n".join([
+            "• Overall Similarity Assessment: Moderate",
+            f"• Key Similarities: {', '.join(names) or 'none'}",
+            "• Technology Overlap: generated by the local fake backend",
+        ])
+
 
 class AIIntelligenceService:
-    """Service for AI-powered analysis using Gemini"""
+    """
+    Service for AI-powered analysis using Gemini
+
+    Verdicts are generated without blocking the event loop, under a global concurrency
+    cap and a per-request deadline, and cached by input project plus the ordered ids of
+    the projects in the prompt. Concurrent requests for the same verdict share one call.
+    """
     
     def __init__(self):
-        """Initialize Gemini AI service"""
-        self.model = None
-        self._initialize_gemini()
+        """Initialize the configured LLM backend"""
+        self.backend: Any = None
+        self._semaphore = asyncio.Semaphore(max(1, settings.GEMINI_MAX_CONCURRENCY))
+        self._cache: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Dict[str, asyncio.Task] = {}
+        self._counters = {"generated": 0, "cache_hits": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+        self._initialize_backend()
     
-    def _initialize_gemini(self):
-        """Initialize Gemini API"""
+    def _initialize_backend(self):
+        """Initialize the LLM backend selected by AI_VERDICT_BACKEND"""
         try:
+            if settings.AI_VERDICT_BACKEND == "fake":
+                self.backend = FakeLLMBackend(settings.AI_VERDICT_FAKE_LATENCY_SECONDS)
+                logger.info("AI verdicts use the local fake LLM backend")
+                return
+            if settings.AI_VERDICT_BACKEND != "gemini":
+                logger.info("AI verdicts disabled (AI_VERDICT_BACKEND=%s)", settings.AI_VERDICT_BACKEND)
+                return
             if not settings.GEMINI_API_KEY:
                 logger.warning("GEMINI_API_KEY not set. AI intelligence features will be disabled.")
                 return
             
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+            self.backend = GeminiBackend()
             logger.info(f"Gemini AI initialized with model: {settings.GEMINI_MODEL}")
         except Exception:
             logger.exception("Error initializing Gemini AI")
-            self.model = None
+            self.backend = None
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.name if self.backend is not None else settings.GEMINI_MODEL
     
     def _create_analysis_prompt(
         self, 
@@ -69,6 +150,44 @@ Format your response as clear, concise bullet points. Be direct and insightful."
         
         return prompt
     
+    @staticmethod
+    def _project_identity(project: Dict) -> Any:
+        """Stored projects are identified by id or URL; ad-hoc inputs (text queries) by their content"""
+        for field in ("_id", "urlOfProject"):
+            if project.get(field):
+                return str(project[field])
+        return [
+            project.get(field)
+            for field in ("nameOfProject", "descriptionOfProject", "technologiesUsedInProject", "tagsOfProject")
+        ]
+
+    def verdict_key(self, input_project: Dict, similar_projects: List[Dict]) -> str:
+        """Cache key of a verdict: backend, input project and the ordered ids of the prompted results"""
+        identity = {
+            "model": self.model_name,
+            "input": self._project_identity(input_project),
+            "results": [self._project_identity(project) for project in similar_projects[:PROMPT_PROJECTS]],
+        }
+        encoded = json.dumps(identity, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+    def get_cached_verdict(self, key: str) -> Optional[Dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[0]
+
+    def _cache_verdict(self, key: str, verdict: Dict, ttl_seconds: Optional[float] = None) -> None:
+        ttl = settings.AI_VERDICT_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._cache[key] = (verdict, time.monotonic() + ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > max(0, settings.AI_VERDICT_CACHE_MAX_ENTRIES):
+            self._cache.popitem(last=False)
+    
     async def generate_similarity_verdict(
         self, 
         input_project: Dict, 
@@ -84,54 +203,172 @@ Format your response as clear, concise bullet points. Be direct and insightful."
         Returns:
             Dict containing AI verdict or None if service unavailable
         """
-        if not self.model:
+        if self.backend is None:
             logger.warning("Gemini AI not initialized. Skipping AI verdict.")
             return None
         
         if not similar_projects:
-            return {
-                "verdict": "• No similar projects found in the database.\n• Consider expanding the search criteria or checking if the project is unique.",
-                "model": settings.GEMINI_MODEL,
-                "status": "no_results"
-            }
+            return self._no_results_verdict()
         
+        key = self.verdict_key(input_project, similar_projects)
+        cached = self.get_cached_verdict(key)
+        if cached is not None:
+            self._counters["cache_hits"] += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._counters["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_event_loop().create_future()
+        self._inflight[key] = future
+        try:
+            verdict = await self._generate(input_project, similar_projects)
+            if verdict["status"] == "success":
+                self._cache_verdict(key, verdict)
+            future.set_result(verdict)
+            return verdict
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _no_results_verdict(self) -> Dict:
+        return {
+            "verdict": "• No similar projects found in the database.\n• Consider expanding the search criteria or checking if the project is unique.",
+            "model": self.model_name,
+            "status": "no_results"
+        }
+
+    def submit_verdict(
+        self,
+        input_project: Dict,
+        similar_projects: List[Dict]
+    ) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Start generating a verdict in the background, for responses that should not wait for it
+
+        Returns ``(verdict_id, verdict)``. The verdict is returned directly when it is already
+        known (cached or no results), and is otherwise fetched later by id with
+        :meth:`get_verdict` or :meth:`wait_for_verdict`. Both are None when AI is disabled.
+        """
+        if self.backend is None:
+            return None, None
+        if not similar_projects:
+            return None, self._no_results_verdict()
+
+        key = self.verdict_key(input_project, similar_projects)
+        cached = self.get_cached_verdict(key)
+        if cached is not None:
+            self._counters["cache_hits"] += 1
+            return key, cached
+        if key not in self._background:
+            task = asyncio.get_event_loop().create_task(self._deliver(key, input_project, similar_projects))
+            self._background[key] = task
+            task.add_done_callback(lambda _task, key=key: self._background.pop(key, None))
+        return key, None
+
+    async def _deliver(self, key: str, input_project: Dict, similar_projects: List[Dict]) -> None:
+        """Background half of :meth:`submit_verdict`: generate, then publish for every worker"""
+        try:
+            verdict = await self.generate_similarity_verdict(input_project, similar_projects)
+            ttl = settings.AI_VERDICT_CACHE_TTL_SECONDS
+            if verdict["status"] != "success":
+                # Failures are kept briefly so the client can still collect them
+                ttl = settings.AI_VERDICT_FAILURE_TTL_SECONDS
+                self._cache_verdict(key, verdict, ttl)
+            await search_result_cache.set_shared(f"verdict:{key}", verdict, ttl)
+        except Exception:
+            logger.exception("Error delivering deferred AI verdict")
+
+    async def get_verdict(self, verdict_id: str) -> Tuple[str, Optional[Dict]]:
+        """``("ready", verdict)``, ``("pending", None)`` or ``("not_found", None)`` for a deferred verdict"""
+        cached = self.get_cached_verdict(verdict_id)
+        if cached is not None:
+            return "ready", cached
+        if verdict_id in self._background or verdict_id in self._inflight:
+            return "pending", None
+        # Submitted on another worker
+        shared = await search_result_cache.get_shared(f"verdict:{verdict_id}")
+        if shared is not None:
+            return "ready", shared
+        return "not_found", None
+
+    async def wait_for_verdict(self, verdict_id: str, timeout: float) -> Tuple[str, Optional[Dict]]:
+        """Like :meth:`get_verdict`, but waits up to ``timeout`` seconds for a pending verdict"""
+        deadline = time.monotonic() + timeout
+        pending = self._background.get(verdict_id) or self._inflight.get(verdict_id)
+        if pending is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(pending), timeout=timeout)
+            except asyncio.TimeoutError:
+                return "pending", None
+        status, verdict = await self.get_verdict(verdict_id)
+        # Another worker may still be generating it: poll the shared tier until the deadline
+        while status == "not_found" and search_result_cache.has_shared_tier and time.monotonic() < deadline:
+            await asyncio.sleep(0.25)
+            status, verdict = await self.get_verdict(verdict_id)
+        return status, verdict
+
+    async def _generate(self, input_project: Dict, similar_projects: List[Dict]) -> Dict:
+        """One backend call under the concurrency cap; the deadline covers the wait for a slot too"""
+        prompt = self._create_analysis_prompt(input_project, similar_projects)
+
+        async def call() -> str:
+            async with self._semaphore:
+                return await self.backend.generate(prompt)
+
         try:
-            prompt = self._create_analysis_prompt(input_project, similar_projects)
-            
             logger.info("Generating AI verdict for similarity analysis...")
-            
-            # Generate content with Gemini
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=settings.GEMINI_MAX_OUTPUT_TOKENS,
-                    temperature=settings.GEMINI_TEMPERATURE,
-                )
-            )
-            
-            verdict_text = response.text.strip()
-            
-            logger.info("AI verdict generated successfully")
+            started = time.perf_counter()
+            verdict_text = (await asyncio.wait_for(call(), timeout=settings.GEMINI_TIMEOUT_SECONDS)).strip()
+            self._counters["generated"] += 1
+            logger.info(f"AI verdict generated successfully ({time.perf_counter() - started:.2f}s)")
             
             return {
                 "verdict": verdict_text,
-                "model": settings.GEMINI_MODEL,
+                "model": self.model_name,
                 "status": "success",
                 "projects_analyzed": len(similar_projects)
             }
+
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            logger.warning(f"AI verdict timed out after {settings.GEMINI_TIMEOUT_SECONDS}s")
+            return {
+                "verdict": "• AI analysis took too long and was skipped.\n• Please review the similarity scores manually.",
+                "model": self.model_name,
+                "status": "timeout",
+                "error": "AI generation timed out"
+            }
         
         except Exception:
+            self._counters["errors"] += 1
             logger.exception("Error generating AI verdict")
             return {
                 "verdict": "• AI analysis temporarily unavailable.\n• Please review the similarity scores manually.",
-                "model": settings.GEMINI_MODEL,
+                "model": self.model_name,
                 "status": "error",
                 "error": "AI generation failed"
             }
     
     def is_available(self) -> bool:
         """Check if AI service is available"""
-        return self.model is not None
+        return self.backend is not None
+
+    def stats(self) -> Dict[str, Any]:
+        """Verdict counters, cache size and calls in flight"""
+        return {
+            "backend": self.model_name if self.backend is not None else None,
+            "cached": len(self._cache),
+            "inflight": len(self._inflight),
+            "deferred_pending": len(self._background),
+            "max_concurrency": settings.GEMINI_MAX_CONCURRENCY,
+            "timeout_seconds": settings.GEMINI_TIMEOUT_SECONDS,
+            **self._counters,
+        }
 
 
 # Global AI intelligence service instance
@@ -0,0 +1,196 @@
+"""Interface shared by the approximate search backends layered over the vector index."""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# (rows, cosine scores) of the best candidates, best first
+Candidates = Tuple[np.ndarray, np.ndarray]
+
+# Arrays and JSON metadata persisted next to the embedding snapshot
+Artifact = Tuple[Dict[str, np.ndarray], Dict[str, Any]]
+
+_GATHER_CHUNK_ROWS = 65536
+
+# First top-k tried by the default range search before widening
+_RANGE_START_K = 64
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first, without sorting the full array."""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= scores.size:
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise :func:`top_k_indices` for a ``(queries, rows)`` score matrix."""
+    if k <= 0 or scores.shape[1] == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k >= scores.shape[1]:
+        return np.argsort(-scores, axis=1, kind="stable")
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def gather_rows(state: Any, rows: np.ndarray) -> np.ndarray:
+    """Copy the vectors for arbitrary index rows, which may span the base matrix and the tail."""
+    if not state.tail_count:
+        return state.base[rows]
+    rows = np.asarray(rows, dtype=np.int64)
+    base_rows = state.base.shape[0]
+    out = np.empty((rows.size, state.base.shape[1]), dtype=np.float32)
+    in_base = rows < base_rows
+    if in_base.all():
+        out[:] = state.base[rows]
+    else:
+        out[in_base] = state.base[rows[in_base]]
+        out[~in_base] = state.tail[rows[~in_base] - base_rows]
+    return out
+
+
+def iter_row_blocks(matrix: np.ndarray, block_rows: int = _GATHER_CHUNK_ROWS):
+    """Yield ``(start, block)`` slices so large (possibly mapped) matrices are scanned in bounded memory."""
+    for start in range(0, matrix.shape[0], block_rows):
+        yield start, matrix[start : start + block_rows]
+
+
+def select_top_k(state: Any, rows: np.ndarray, scores: np.ndarray, top_k: int) -> Candidates:
+    """Drop tombstoned rows and keep the best ``top_k`` candidates."""
+    if rows.size == 0:
+        return rows, scores
+    if state.dead_count:
+        keep = state.live[rows]
+        rows, scores = rows[keep], scores[keep]
+    order = top_k_indices(scores, min(top_k, scores.size))
+    return rows[order], scores[order]
+
+
+def sample_queries(state: Any, count: int, seed: int = 0) -> np.ndarray:
+    """Indexed vectors to use as benchmark queries when no real queries are supplied."""
+    rows = np.flatnonzero(state.live)
+    if rows.size == 0:
+        return np.empty((0, state.dimension), dtype=np.float32)
+    sample = np.random.default_rng(seed).choice(rows, size=min(count, rows.size), replace=False)
+    return gather_rows(state, np.sort(sample))
+
+
+def evaluate_backend(
+    state: Any,
+    backend: Optional["AnnBackend"],
+    queries: np.ndarray,
+    k: int = 10,
+    **params: Any,
+) -> Optional[Dict[str, Any]]:
+    """
+    recall@k against exact search plus per-query latency; ``backend=None`` times exact search.
+
+    With self-queries (:func:`sample_queries`) the query row ranks first in both lists,
+    which slightly flatters absolute recall; use it to compare modes and settings.
+    """
+    k = min(k, state.live_count)
+    if k <= 0 or queries.shape[0] == 0:
+        return None
+
+    hits = 0
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        if backend is None:
+            found = top_k_indices(state.score(query), k)
+        else:
+            candidates = backend.search(state, query, k, **params)
+            if candidates is None:
+                return None
+            found = candidates[0]
+        latencies.append(time.perf_counter() - started)
+        if backend is not None:
+            hits += np.intersect1d(top_k_indices(state.score(query), k), found).size
+
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "k": k,
+        "queries": int(queries.shape[0]),
+        "recall": 1.0 if backend is None else round(hits / (k * queries.shape[0]), 4),
+        "latency_ms_mean": round(float(latencies_ms.mean()), 3),
+        "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 3),
+        "latency_ms_p99": round(float(np.percentile(latencies_ms, 99)), 3),
+    }
+
+
+class AnnBackend:
+    """
+    Approximate top-k structure over the row space of the resident index.
+
+    Backends never own the canonical vectors: rows are ``_IndexState`` rows, tombstones
+    come from ``state.live`` and rows appended by deltas are picked up in :meth:`refresh`.
+    Updates build new arrays and swap them in with a single assignment, so a search on
+    the event loop never observes a half-applied refresh running in a worker thread.
+    """
+
+    name = ""
+    artifact_keys: Tuple[str, ...] = ()
+    mmap_keys: Tuple[str, ...] = ()
+
+    def is_trained(self) -> bool:
+        raise NotImplementedError
+
+    def is_ready(self, state: Any) -> bool:
+        """True when the structure covers ``state``'s base rows and can answer queries."""
+        raise NotImplementedError
+
+    def train(self, state: Any) -> None:
+        """Offline build over every live row; slow, always run in a worker thread."""
+        raise NotImplementedError
+
+    def refresh(self, state: Any) -> None:
+        """Catch up with rows appended by deltas or a rebuilt base matrix."""
+        raise NotImplementedError
+
+    def search(self, state: Any, query: np.ndarray, top_k: int, **params: Any) -> Optional[Candidates]:
+        """Best candidates for a normalized query, or None when the backend cannot serve ``state``."""
+        raise NotImplementedError
+
+    def range_search(
+        self,
+        state: Any,
+        query: np.ndarray,
+        threshold: float,
+        limit: int,
+        **params: Any,
+    ) -> Optional[Candidates]:
+        """
+        Up to ``limit`` candidates scoring at least ``threshold``, best first.
+
+        The default widens a top-k search (which also widens beam or probe sizes tied to
+        ``top_k``) until its worst result falls below the threshold or ``limit`` is reached.
+        """
+        top_k = min(limit, _RANGE_START_K)
+        while True:
+            found = self.search(state, query, top_k, **params)
+            if found is None:
+                return None
+            rows, scores = found
+            keep = scores >= threshold
+            if not keep.all() or rows.size < top_k or top_k >= limit:
+                return rows[keep], scores[keep]
+            top_k = min(limit, top_k * 4)
+
+    def artifact(self) -> Optional[Artifact]:
+        return None
+
+    def restore(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], state: Any) -> bool:
+        return False
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
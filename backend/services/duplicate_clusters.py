@@ -0,0 +1,223 @@
+"""Corpus-wide near-duplicate detection: similar pairs above a threshold, union-found into clusters."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from services.ann_index import gather_rows
+from services.mongodb import mongodb_client
+from services.vector_index import vector_index_service
+
+logger = logging.getLogger("DevFoolU.duplicate_clusters")
+
+# An incremental run with more unchecked projects than this share of the corpus runs in full
+_FULL_RUN_SHARE = 0.5
+
+
+class _UnionFind:
+    """Disjoint sets over project ids (path halving, union by size)."""
+
+    def __init__(self):
+        self._parent: Dict[Any, Any] = {}
+        self._size: Dict[Any, int] = {}
+
+    def find(self, item: Any) -> Any:
+        parent = self._parent.setdefault(item, item)
+        if parent == item:
+            self._size.setdefault(item, 1)
+            return item
+        while parent != self._parent[parent]:
+            self._parent[item] = self._parent[parent]
+            item, parent = parent, self._parent[parent]
+        return parent
+
+    def union(self, first: Any, second: Any) -> None:
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return
+        if self._size[first] < self._size[second]:
+            first, second = second, first
+        self._parent[second] = first
+        self._size[first] += self._size.pop(second)
+
+    def groups(self) -> List[List[Any]]:
+        members: Dict[Any, List[Any]] = {}
+        for item in list(self._parent):
+            members.setdefault(self.find(item), []).append(item)
+        return [group for group in members.values() if len(group) > 1]
+
+
+def similar_pairs(
+    state: Any,
+    query_rows: np.ndarray,
+    threshold: float,
+    symmetric: bool,
+    tile_rows: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Row pairs with cosine similarity >= ``threshold`` between ``query_rows`` and every live row.
+
+    Scores are computed tile by tile (``tile_rows`` x ``tile_rows`` float32), so memory is
+    bounded regardless of corpus size. ``symmetric`` means ``query_rows`` are all live rows:
+    only the upper triangle is scored and each pair is reported once.
+    """
+    live_rows = np.flatnonzero(state.live)
+    tile_rows = max(64, tile_rows)
+    firsts, seconds, scores = [], [], []
+    for query_start in range(0, query_rows.size, tile_rows):
+        rows = query_rows[query_start : query_start + tile_rows]
+        queries = gather_rows(state, rows)
+        for column_start in range(query_start if symmetric else 0, live_rows.size, tile_rows):
+            columns = live_rows[column_start : column_start + tile_rows]
+            tile = queries @ gather_rows(state, columns).T
+            hit_rows, hit_columns = np.nonzero(tile >= threshold)
+            first, second = rows[hit_rows], columns[hit_columns]
+            keep = first < second if symmetric else first != second
+            firsts.append(first[keep])
+            seconds.append(second[keep])
+            scores.append(tile[hit_rows[keep], hit_columns[keep]])
+    if not firsts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    return np.concatenate(firsts), np.concatenate(seconds), np.concatenate(scores)
+
+
+def _cluster_id(members: Iterable[Any]) -> str:
+    return min(str(member) for member in members)
+
+
+class DuplicateClusterService:
+    """
+    Groups projects whose embeddings are near-identical (cosine >= ``DUPLICATE_SIMILARITY_THRESHOLD``).
+
+    A full run compares every pair of indexed projects once; later runs only compare
+    projects added or re-embedded since their last check (``duplicateCheckedAt``) against
+    the whole corpus and merge the new pairs into the stored clusters. Incremental runs
+    never split a cluster; a full run rebuilds them all. Each member carries
+    ``duplicateClusterId`` (smallest member ``_id``) and ``duplicateClusterSize``.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._status: Dict[str, Any] = {"state": "idle"}
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> Dict[str, Any]:
+        return dict(self._status)
+
+    def schedule(self, full: bool = False, threshold: Optional[float] = None) -> bool:
+        """Start :meth:`run` as a background task unless one is already running."""
+        if self.is_running():
+            return False
+        self._task = asyncio.create_task(self._run_in_background(full, threshold))
+        return True
+
+    async def _run_in_background(self, full: bool, threshold: Optional[float]) -> None:
+        try:
+            await self.run(full=full, threshold=threshold)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Duplicate cluster scan failed: %s", exc, exc_info=True)
+
+    async def run(self, full: bool = False, threshold: Optional[float] = None) -> Dict[str, Any]:
+        """Find new duplicate pairs, update the clusters and return the run summary."""
+        from services.index_sync import index_sync_service
+
+        threshold = threshold if threshold is not None else settings.DUPLICATE_SIMILARITY_THRESHOLD
+        started = time.perf_counter()
+        checked_at = datetime.utcnow()
+        status: Dict[str, Any] = {
+            "state": "running",
+            "startedAt": checked_at.isoformat(),
+            "threshold": threshold,
+            "mode": "full" if full else "incremental",
+        }
+        self._status = status
+
+        try:
+            await index_sync_service.sync_once()
+            state = vector_index_service._state
+            live_rows = np.flatnonzero(state.live)
+
+            if not full:
+                unchecked = await mongodb_client.get_unchecked_duplicate_ids()
+                query_rows = np.asarray(
+                    sorted(row for row in (state.row_by_id.get(project_id) for project_id in unchecked) if row is not None),
+                    dtype=np.int64,
+                )
+                if query_rows.size > _FULL_RUN_SHARE * max(1, live_rows.size):
+                    full = True
+                    status["mode"] = "full"
+            if full:
+                query_rows = live_rows
+            status["checked"] = int(query_rows.size)
+            logger.info("Duplicate scan (%s): %s of %s projects to compare", status["mode"], query_rows.size, live_rows.size)
+
+            firsts, seconds, scores = await asyncio.to_thread(
+                similar_pairs,
+                state,
+                query_rows,
+                threshold,
+                full,
+                settings.DUPLICATE_SCAN_TILE_ROWS,
+            )
+            status["pairs"] = int(firsts.size)
+
+            previous = await mongodb_client.get_duplicate_assignments()
+            clusters = _UnionFind()
+            if not full:
+                # Seed with the stored clusters of projects still indexed
+                by_cluster: Dict[str, Any] = {}
+                for project_id, (cluster_id, _size) in previous.items():
+                    if project_id in state.row_by_id:
+                        clusters.union(by_cluster.setdefault(cluster_id, project_id), project_id)
+            for first, second in zip(firsts.tolist(), seconds.tolist()):
+                clusters.union(state.ids[first], state.ids[second])
+
+            assignments: Dict[Any, Tuple[str, int]] = {}
+            for members in clusters.groups():
+                cluster_id = _cluster_id(members)
+                for project_id in members:
+                    assignments[project_id] = (cluster_id, len(members))
+
+            changed = {
+                project_id: assignment
+                for project_id, assignment in assignments.items()
+                if previous.get(project_id) != assignment
+            }
+            cleared = [project_id for project_id in previous if project_id not in assignments]
+            checked = [state.ids[row] for row in query_rows.tolist()]
+            status["updated"] = await mongodb_client.write_duplicate_clusters(changed, cleared, checked, checked_at)
+            status["clusters"] = len({cluster_id for cluster_id, _size in assignments.values()})
+            status["projectsInClusters"] = len(assignments)
+            status["largestCluster"] = max((size for _cluster, size in assignments.values()), default=0)
+            status["minPairSimilarity"] = float(scores.min()) if scores.size else None
+        except Exception as exc:
+            status["state"] = "failed"
+            status["error"] = str(exc)
+            raise
+        finally:
+            status["seconds"] = round(time.perf_counter() - started, 2)
+
+        status["state"] = "completed"
+        status["finishedAt"] = datetime.utcnow().isoformat()
+        logger.info(
+            "Duplicate scan finished: %s pairs, %s clusters (%s projects) in %.1fs",
+            status["pairs"],
+            status["clusters"],
+            status["projectsInClusters"],
+            status["seconds"],
+        )
+        return dict(status)
+
+
+# Global duplicate cluster instance
+duplicate_cluster_service = DuplicateClusterService()
@@ -1,36 +1,88 @@
 """Embedding service for generating vector embeddings"""
 
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
 import logging
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 from core.config import settings
+from services.embedding_cache import QueryEmbeddingCache, normalize_query
+from services.embedding_batcher import MicroBatcher
+from services.embedding_scheduler import BULK, INTERACTIVE, EmbeddingScheduler
+from services.inference_backend import counting_tokenizer, load_backend, lowercases_input, token_budget
+from services.text_packing import FIELD_SEPARATOR, TokenPacker
+from services.vector_codec import embedding_text_hash
 
 logger = logging.getLogger("DevFoolU.embedding")
 
 
 class EmbeddingService:
-    """Service for generating embeddings using sentence-transformers"""
+    """
+    Service for generating embeddings using sentence-transformers
+
+    ``model`` is a ``SentenceTransformer`` (EMBEDDING_BACKEND=torch) or an ONNX Runtime
+    backend with the same ``encode`` interface (onnx, onnx-int8).
+    """
     
     def __init__(self):
-        self.model: Optional[SentenceTransformer] = None
+        self.model: Optional[Any] = None
         self._ready = False
-        self._executor = ThreadPoolExecutor(max_workers=4)
+        # Searches and ingestion run in separate lanes so bulk batches never delay a query
+        self._scheduler = EmbeddingScheduler(
+            interactive_workers=settings.EMBEDDING_INTERACTIVE_WORKERS,
+            interactive_threads=settings.EMBEDDING_INTERACTIVE_THREADS,
+            bulk_workers=settings.EMBEDDING_BULK_WORKERS,
+            bulk_threads=settings.EMBEDDING_BULK_THREADS,
+            bulk_chunk_size=settings.EMBEDDING_BULK_CHUNK_SIZE,
+            bulk_max_defer_ms=settings.EMBEDDING_BULK_MAX_DEFER_MS,
+        )
+        self._query_cache: Optional[QueryEmbeddingCache] = None
+        self._lowercase_queries = False
+        self._batcher: Optional[MicroBatcher] = None
+        self._packer: Optional[TokenPacker] = None
+        self._bucket_counters = {"encode_calls": 0, "tokens": 0, "padded_tokens": 0}
+    
+    def configure_lanes(self, **lane_options: Any) -> None:
+        """Replace the lane scheduler (see :class:`EmbeddingScheduler`) before :meth:`initialize`"""
+        if self._ready:
+            raise RuntimeError("Configure embedding lanes before the model is loaded")
+        self._scheduler.shutdown(wait=False)
+        self._scheduler = EmbeddingScheduler(**lane_options)
     
     async def initialize(self):
         """Initialize the embedding model"""
         try:
-            logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL_NAME}")
+            logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL_NAME} ({settings.EMBEDDING_BACKEND})")
             
             # Load model in executor to avoid blocking
-            loop = asyncio.get_event_loop()
-            self.model = await loop.run_in_executor(
-                self._executor,
-                SentenceTransformer,
-                settings.EMBEDDING_MODEL_NAME
-            )
+            self.model = await self._scheduler.run(BULK, load_backend, settings.EMBEDDING_BACKEND)
+            
+            # Uncased tokenizers lowercase anyway, so case variants can share a cache entry
+            self._lowercase_queries = lowercases_input(self.model)
+            if settings.EMBEDDING_QUERY_CACHE_ENABLED:
+                self._query_cache = QueryEmbeddingCache(
+                    max_bytes=settings.EMBEDDING_QUERY_CACHE_MAX_BYTES,
+                    ttl_seconds=settings.EMBEDDING_QUERY_CACHE_TTL_SECONDS,
+                    persist_path=settings.EMBEDDING_QUERY_CACHE_PATH if settings.EMBEDDING_QUERY_CACHE_PERSIST else None,
+                    persist_max_entries=settings.EMBEDDING_QUERY_CACHE_PERSIST_MAX_ENTRIES,
+                )
+            
+            if settings.EMBEDDING_TOKEN_PACKING_ENABLED:
+                tokenizer = counting_tokenizer(self.model)
+                budget = token_budget(self.model, tokenizer) if tokenizer is not None else 0
+                if budget > 0:
+                    self._packer = TokenPacker(tokenizer, budget)
+                else:
+                    logger.info("Embedding model has no fast tokenizer or sequence limit; texts are not packed")
+            
+            if settings.EMBEDDING_MICRO_BATCH_ENABLED:
+                self._batcher = MicroBatcher(
+                    self.model.encode,
+                    self._scheduler.executor(INTERACTIVE),
+                    max_batch=settings.EMBEDDING_MICRO_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.EMBEDDING_MICRO_BATCH_MAX_WAIT_MS,
+                )
             
             self._ready = True
             logger.info(f"✅ Embedding model loaded (dimension: {self.model.get_sentence_embedding_dimension()})")
@@ -42,10 +94,17 @@ class EmbeddingService:
     def is_ready(self) -> bool:
         """Check if model is ready"""
         return self._ready and self.model is not None
+
+    @property
+    def model_id(self) -> str:
+        """Model name, tagged with the inference backend unless it is the PyTorch reference"""
+        if settings.EMBEDDING_BACKEND == "torch":
+            return settings.EMBEDDING_MODEL_NAME
+        return f"{settings.EMBEDDING_MODEL_NAME}@{settings.EMBEDDING_BACKEND}"
     
-    def _create_combined_text(self, project: Dict) -> str:
+    def _combined_text_parts(self, project: Dict) -> List[str]:
         """
-        Combine all relevant fields from a project into a single text for embedding
+        Labelled project fields for embedding, in priority order (packing drops from the end)
         """
         parts = []
         
@@ -90,44 +149,70 @@ class EmbeddingService:
             if raw_text:
                 parts.append(f"Narrative: {raw_text[:2500]}")
         
-        # Combine all parts
-        combined = " | ".join(parts)
+        return parts
+    
+    def _create_combined_text(self, project: Dict) -> str:
+        """
+        Combine all relevant fields from a project into a single text for embedding
+
+        This is the full text ``embeddingTextHash`` is taken over; what is encoded is this
+        text packed to the model's token budget (see :meth:`_project_texts`).
+        """
+        combined = FIELD_SEPARATOR.join(self._combined_text_parts(project))
         
         # Fallback if empty
         if not combined.strip():
             combined = project.get('nameOfProject', project.get('urlOfProject', 'Unknown Project'))
         
         return combined
+
+    def _project_texts(self, projects: List[Dict]) -> Tuple[List[str], Optional[List[int]]]:
+        """
+        Texts to encode for ``projects`` and their lengths in word pieces
+
+        With a packer, fields are added in priority order until the model's token budget
+        is spent, so text the model would truncate is never tokenized; without one the
+        full combined text is returned and lengths are unknown (None).
+        """
+        if self._packer is None:
+            return [self._create_combined_text(project) for project in projects], None
+        parts = [
+            self._combined_text_parts(project) or [self._create_combined_text(project)]
+            for project in projects
+        ]
+        packed = self._packer.pack(parts)
+        return [text for text, _ in packed], [tokens for _, tokens in packed]
     
-    async def generate_embedding(self, text: str) -> List[float]:
+    async def generate_embedding(self, text: str, lane: str = INTERACTIVE) -> np.ndarray:
         """
-        Generate embedding for a single text
+        Generate embedding for a single text (float32, stored as-is without a list round trip)
+
+        ``lane`` is ``interactive`` for request paths and ``bulk`` for ingestion and backfills.
         """
         if not self.is_ready():
             raise Exception("Embedding model not initialized")
         
         try:
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                self._executor,
-                self.model.encode,
-                text
-            )
-            return embedding.tolist()
+            if self._batcher is not None and lane == INTERACTIVE:
+                # Coalesced with concurrent requests into one encode call
+                return await self._batcher.submit(text)
+            
+            embedding = await self._scheduler.run(lane, self.model.encode, text)
+            return np.asarray(embedding, dtype=np.float32)
             
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             raise
     
-    async def generate_project_embedding(self, project: Dict) -> List[float]:
+    async def generate_project_embedding(self, project: Dict, lane: str = INTERACTIVE) -> np.ndarray:
         """
         Generate embedding for a project by combining its fields
         """
         try:
-            combined_text = self._create_combined_text(project)
+            combined_text = self._project_texts([project])[0][0]
             logger.debug(f"Generating embedding for: {project.get('nameOfProject', 'Unknown')[:50]}...")
             
-            embedding = await self.generate_embedding(combined_text)
+            embedding = await self.generate_embedding(combined_text, lane=lane)
             logger.debug(f"✅ Generated {len(embedding)}-dim embedding")
             
             return embedding
@@ -136,40 +221,127 @@ class EmbeddingService:
             logger.error(f"Error generating project embedding: {e}")
             raise
     
-    async def generate_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
+    async def generate_batch_embeddings(
+        self,
+        texts: List[str],
+        token_counts: Optional[List[int]] = None,
+        lane: str = BULK,
+    ) -> np.ndarray:
         """
-        Generate embeddings for multiple texts in batch (more efficient)
+        Generate embeddings for multiple texts in batch (more efficient); one float32 row per text
+
+        Texts are sorted by length (``token_counts`` when given, else measured) and encoded
+        in buckets, so each forward pass pads to a similar length; rows are returned in
+        caller order. In the bulk lane buckets hold EMBEDDING_BULK_CHUNK_SIZE texts and each
+        one first yields to queued interactive work.
         """
         if not self.is_ready():
             raise Exception("Embedding model not initialized")
         
         try:
-            loop = asyncio.get_event_loop()
-            embeddings = await loop.run_in_executor(
-                self._executor,
-                self.model.encode,
-                texts
-            )
-            return [emb.tolist() for emb in embeddings]
+            if not texts:
+                return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+            tokens_known = token_counts is not None or self._packer is not None
+            if token_counts is None:
+                # Character length is a fair sort key when the model has no fast tokenizer
+                token_counts = self._packer.count(texts) if self._packer is not None else [len(text) for text in texts]
+
+            order = np.argsort(np.asarray(token_counts), kind="stable")
+            if lane == BULK:
+                bucket_size = self._scheduler.bulk_chunk_size
+            else:
+                bucket_size = max(1, settings.EMBEDDING_ENCODE_BATCH_SIZE)
+            out: Optional[np.ndarray] = None
+            for start in range(0, len(texts), bucket_size):
+                bucket = order[start : start + bucket_size]
+                rows = await self._scheduler.run(
+                    lane, self.model.encode, [texts[i] for i in bucket], batch_size=len(bucket)
+                )
+                rows = np.asarray(rows, dtype=np.float32).reshape(len(bucket), -1)
+                if out is None:
+                    out = np.empty((len(texts), rows.shape[1]), dtype=np.float32)
+                out[bucket] = rows
+                self._bucket_counters["encode_calls"] += 1
+                if tokens_known:
+                    lengths = [token_counts[i] for i in bucket]
+                    self._bucket_counters["tokens"] += sum(lengths)
+                    self._bucket_counters["padded_tokens"] += max(lengths) * len(lengths)
+            return out
             
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {e}")
             raise
 
-    async def generate_embeddings_for_projects(self, projects: List[Dict]) -> List[List[float]]:
-        """Generate embeddings for multiple projects in one batch call."""
-        texts = [self._create_combined_text(project) for project in projects]
-        return await self.generate_batch_embeddings(texts)
+    async def generate_embeddings_for_projects(self, projects: List[Dict], lane: str = BULK) -> np.ndarray:
+        """Generate embeddings for multiple projects: packed to the token budget, encoded in length buckets."""
+        texts, token_counts = self._project_texts(projects)
+        return await self.generate_batch_embeddings(texts, token_counts, lane=lane)
+
+    def embedding_text_hash(self, project: Dict) -> str:
+        """Hash of the text a project's embedding is computed from (stored as ``embeddingTextHash``)"""
+        return embedding_text_hash(self._create_combined_text(project))
     
-    async def generate_query_embedding(self, query: str) -> List[float]:
+    async def generate_query_embedding(self, query: str) -> np.ndarray:
         """
         Generate embedding for a search query
+
+        Repeated queries (retries, pagination, shared links) are served from the query
+        cache, keyed by model name and normalized text; the returned array is read-only.
         """
-        return await self.generate_embedding(query)
+        if self._query_cache is None:
+            return await self.generate_embedding(query)
+
+        normalized = normalize_query(query, lowercase=self._lowercase_queries)
+        key = (self.model_id, normalized)
+        cache = self._query_cache
+        if not cache.persistent:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            return cache.put(key, await self.generate_embedding(normalized))
+
+        # A persisted cache may touch SQLite, so look up and write through off the event loop
+        loop = asyncio.get_event_loop()
+        cached = await loop.run_in_executor(None, cache.get, key)
+        if cached is not None:
+            return cached
+        embedding = await self.generate_embedding(normalized)
+        return await loop.run_in_executor(None, cache.put, key, embedding)
+
+    def batcher_stats(self) -> Dict:
+        """Batch counts and sizes of the single-text micro-batcher"""
+        if self._batcher is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._batcher.stats()}
+
+    def packing_stats(self) -> Dict:
+        """Token budget use of packed project texts and padding efficiency of length-bucketed encodes"""
+        counters = self._bucket_counters
+        return {
+            "packing": self._packer.stats() if self._packer is not None else {"enabled": False},
+            **counters,
+            "padding_efficiency": (
+                round(counters["tokens"] / counters["padded_tokens"], 4) if counters["padded_tokens"] else None
+            ),
+        }
+
+    def lane_stats(self) -> Dict:
+        """Queue depth, waits and thread settings of the interactive and bulk lanes"""
+        return self._scheduler.stats()
+
+    def query_cache_stats(self) -> Dict:
+        """Hit/miss counters and size of the query embedding cache"""
+        if self._query_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._query_cache.stats()}
     
     def cleanup(self):
         """Cleanup resources"""
-        self._executor.shutdown(wait=True)
+        if self._batcher is not None:
+            self._batcher.stop()
+        self._scheduler.shutdown(wait=True)
+        if self._query_cache is not None:
+            self._query_cache.close()
 
 
 # Global embedding service instance
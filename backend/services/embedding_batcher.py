@@ -0,0 +1,123 @@
+"""Dynamic micro-batching of concurrent single-text embedding requests."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("DevFoolU.embedding_batcher")
+
+# (text, caller future)
+_Request = Tuple[str, asyncio.Future]
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent ``submit`` calls into one ``encode(texts)`` call.
+
+    A single dispatcher task takes the first queued text, drains whatever else is queued,
+    and waits at most ``max_wait_ms`` for more before encoding, up to ``max_batch`` texts.
+    While a batch runs, new requests queue up and form the next batch, so the batch size
+    follows the load: an idle service encodes a lone request after ``max_wait_ms`` at most,
+    a busy one amortizes each forward pass over many callers.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Any],
+        executor: Executor,
+        max_batch: int = 32,
+        max_wait_ms: float = 2.0,
+    ):
+        self._encode = encode
+        self._executor = executor
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._encode_seconds = 0.0
+
+    def _ensure_running(self) -> asyncio.Queue:
+        """Start (or restart, e.g. under a new event loop in the CLI) the dispatcher task."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+        return self._queue
+
+    async def submit(self, text: str) -> np.ndarray:
+        """Embedding of ``text`` as float32, computed in a shared batch."""
+        queue = self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((text, future))
+        return await future
+
+    async def _collect(self, queue: asyncio.Queue) -> List[_Request]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect(queue)
+            # Callers that gave up (cancelled or timed out) are not encoded
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                embeddings = await loop.run_in_executor(self._executor, self._encode, [text for text, _ in batch])
+                rows = np.asarray(embeddings, dtype=np.float32).reshape(len(batch), -1)
+            except Exception as exc:  # noqa: BLE001
+                logger.error(f"Error encoding micro-batch of {len(batch)}: {exc}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self._encode_seconds += time.perf_counter() - started
+            self._batches += 1
+            self._items += len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+            for (_, future), row in zip(batch, rows):
+                if not future.done():
+                    future.set_result(row)
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self._batches,
+            "items": self._items,
+            "mean_batch": round(self._items / self._batches, 2) if self._batches else None,
+            "largest_batch": self._largest_batch,
+            "items_per_encode_second": round(self._items / self._encode_seconds, 1) if self._encode_seconds else None,
+        }
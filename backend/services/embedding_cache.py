@@ -0,0 +1,246 @@
+"""Byte-bounded LRU/TTL cache of query embeddings, optionally persisted to SQLite."""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("DevFoolU.embedding_cache")
+
+# (model name, normalized query text)
+CacheKey = Tuple[str, str]
+
+# Rough per-entry bookkeeping on top of the vector and key bytes (OrderedDict node, tuple, floats)
+_ENTRY_OVERHEAD_BYTES = 200
+
+# The disk store is pruned at most this many writes apart (sooner for small stores)
+_PRUNE_EVERY_PUTS = 1000
+
+
+def normalize_query(text: str, lowercase: bool = False) -> str:
+    """
+    Cache key text: NFC, whitespace runs collapsed, optionally lowercased.
+
+    Only changes that cannot alter the embedding are applied: the tokenizer splits on
+    whitespace anyway, and ``lowercase`` is set only for uncased models.
+    """
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return normalized.lower() if lowercase else normalized
+
+
+class _DiskStore:
+    """SQLite table of float32 vectors keyed by model and query, shared by every worker."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(path), timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            " model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (model, query))"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey, not_before: float) -> Optional[Tuple[np.ndarray, float]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT vector, created_at FROM query_embeddings WHERE model = ? AND query = ? AND created_at >= ?",
+                (key[0], key[1], not_before),
+            ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).copy(), float(row[1])
+
+    def put(self, key: CacheKey, vector: np.ndarray, created_at: float) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector, created_at) VALUES (?, ?, ?, ?)",
+                (key[0], key[1], vector.tobytes(), created_at),
+            )
+
+    def prune(self, max_entries: int, not_before: float) -> int:
+        """Drop expired rows and all but the newest ``max_entries``; returns rows removed."""
+        with self._lock:
+            removed = self._connection.execute(
+                "DELETE FROM query_embeddings WHERE created_at < ?", (not_before,)
+            ).rowcount
+            removed += self._connection.execute(
+                "DELETE FROM query_embeddings WHERE rowid NOT IN"
+                " (SELECT rowid FROM query_embeddings ORDER BY created_at DESC LIMIT ?)",
+                (max_entries,),
+            ).rowcount
+        return removed
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._connection.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM query_embeddings")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU of query embeddings bounded by bytes rather than entries, with a TTL.
+
+    Vectors are stored as read-only float32 arrays, so a hit is returned without a copy.
+    With a disk store, memory misses fall through to SQLite before the model runs, and
+    new vectors are written through, so a restarted worker starts warm. The store is
+    pruned to ``persist_max_entries`` and the TTL on start and every few writes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float = 0.0,
+        persist_path: Optional[Path] = None,
+        persist_max_entries: int = 100000,
+    ):
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self._entries: "OrderedDict[CacheKey, Tuple[np.ndarray, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._persist_max_entries = max(1, int(persist_max_entries))
+        self._prune_every = min(_PRUNE_EVERY_PUTS, max(1, self._persist_max_entries // 10))
+        self._puts_since_prune = 0
+        self._store: Optional[_DiskStore] = None
+        if persist_path is not None:
+            try:
+                self._store = _DiskStore(Path(persist_path))
+                removed = self._store.prune(self._persist_max_entries, self._not_before())
+                if removed:
+                    logger.info(f"Pruned {removed} stale query embeddings from {persist_path}")
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding cache persistence disabled ({persist_path}): {e}")
+                self._store = None
+
+    @property
+    def persistent(self) -> bool:
+        return self._store is not None
+
+    def _not_before(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds else 0.0
+
+    @staticmethod
+    def _entry_bytes(key: CacheKey, vector: np.ndarray) -> int:
+        return vector.nbytes + len(key[0]) + len(key[1]) + _ENTRY_OVERHEAD_BYTES
+
+    def get(self, key: CacheKey) -> Optional[np.ndarray]:
+        """Cached vector for ``key``, or None (counted as a miss)."""
+        not_before = self._not_before()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] >= not_before:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[0]
+                self._remove(key)
+
+        if self._store is not None:
+            try:
+                stored = self._store.get(key, not_before)
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding cache read failed: {e}")
+                stored = None
+            if stored is not None:
+                vector = self._insert(key, stored[0], stored[1])
+                with self._lock:
+                    self._disk_hits += 1
+                return vector
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key: CacheKey, vector: Any) -> np.ndarray:
+        """Store ``vector`` (as read-only float32) and return the cached array."""
+        created_at = time.time()
+        array = self._insert(key, vector, created_at)
+        if self._store is not None:
+            with self._lock:
+                self._puts_since_prune += 1
+                prune = self._puts_since_prune >= self._prune_every
+                if prune:
+                    self._puts_since_prune = 0
+            try:
+                self._store.put(key, array, created_at)
+                if prune:
+                    self._store.prune(self._persist_max_entries, self._not_before())
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding cache write failed: {e}")
+        return array
+
+    def _insert(self, key: CacheKey, vector: Any, created_at: float) -> np.ndarray:
+        array = np.array(vector, dtype=np.float32).reshape(-1)
+        array.flags.writeable = False
+        size = self._entry_bytes(key, array)
+        if size > self.max_bytes:
+            return array
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (array, created_at, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+        return array
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._store is not None:
+            self._store.clear()
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round((self._hits + self._disk_hits) / lookups, 4) if lookups else None,
+            }
+        if self._store is not None:
+            try:
+                stats["persisted_entries"] = self._store.count()
+            except sqlite3.Error:
+                stats["persisted_entries"] = None
+        return stats
@@ -0,0 +1,149 @@
+"""Background job that rewrites array-of-doubles embeddings as packed float32 BSON vectors."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import bson
+import numpy as np
+
+from core.config import settings
+from services.embedding import embedding_service
+from services.mongodb import mongodb_client
+from services.vector_codec import EMBEDDING_PENDING, EMBEDDING_READY, encode_embedding
+
+logger = logging.getLogger("DevFoolU.embedding_migration")
+
+
+class EmbeddingMigrationService:
+    """
+    Converts legacy embeddings page by page in ``_id`` order.
+
+    Only documents still holding an array are selected, so the job is resumable by
+    construction: after a crash or restart it continues with whatever is left. Vectors
+    are re-encoded exactly (float32 is what the index always scored), so neither
+    ``updatedAt`` nor the vector index needs to change. Vectors of the current model get
+    the same tags as a fresh embedding (version, text hash, ready), so they are not
+    re-embedded afterwards; vectors of another model are marked pending.
+
+    Each run first tags documents written before ``embeddingState`` existed, so the
+    re-embedding jobs can find pending projects through the partial index.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._status: Dict[str, Any] = {"state": "idle"}
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> Dict[str, Any]:
+        return dict(self._status)
+
+    def schedule(self, batch_size: Optional[int] = None, limit: Optional[int] = None) -> bool:
+        """Start :meth:`run` as a background task unless one is already running."""
+        if self.is_running():
+            return False
+        self._task = asyncio.create_task(self._run_in_background(batch_size, limit))
+        return True
+
+    async def _run_in_background(self, batch_size: Optional[int], limit: Optional[int]) -> None:
+        try:
+            await self.run(batch_size=batch_size, limit=limit)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Embedding migration failed: %s", exc, exc_info=True)
+
+    async def run(self, batch_size: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Convert up to ``limit`` documents (all by default) and return the run summary."""
+        batch_size = max(1, batch_size or settings.EMBEDDING_MIGRATION_BATCH_SIZE)
+        started = time.perf_counter()
+        status: Dict[str, Any] = {
+            "state": "running",
+            "startedAt": datetime.utcnow().isoformat(),
+            "remaining": await mongodb_client.count_legacy_embeddings(),
+            "scanned": 0,
+            "converted": 0,
+            "skipped": 0,
+            "bytesBefore": 0,
+            "bytesAfter": 0,
+            "lastId": None,
+            "statesBackfilled": 0,
+        }
+        self._status = status
+        logger.info("Embedding migration started: %s documents to convert", status["remaining"])
+
+        try:
+            status["statesBackfilled"] = await mongodb_client.backfill_embedding_states()
+            after_id = None
+            while limit is None or status["scanned"] < limit:
+                page_size = batch_size if limit is None else min(batch_size, limit - status["scanned"])
+                docs = await mongodb_client.get_legacy_embedding_batch(after_id, page_size)
+                if not docs:
+                    break
+                after_id = docs[-1]["_id"]
+
+                updates = []
+                for doc in docs:
+                    legacy = doc.get("embeddingsOfData")
+                    try:
+                        vector = np.asarray(legacy, dtype=np.float32).reshape(-1)
+                    except (TypeError, ValueError):
+                        status["skipped"] += 1
+                        continue
+                    encoded = encode_embedding(vector)
+                    fields: Dict[str, Any] = {"embeddingsOfData": encoded, "embeddingDim": int(vector.size)}
+                    if self._from_current_model(doc, vector):
+                        fields.update(
+                            embeddingModel=settings.EMBEDDING_MODEL_NAME,
+                            embeddingModelVersion=settings.EMBEDDING_MODEL_VERSION,
+                            embeddingTextHash=embedding_service.embedding_text_hash(doc),
+                            embeddingState=EMBEDDING_READY,
+                        )
+                    else:
+                        fields["embeddingState"] = EMBEDDING_PENDING
+                    updates.append((doc, fields))
+                    status["bytesBefore"] += len(bson.encode({"embeddingsOfData": legacy}))
+                    status["bytesAfter"] += len(bson.encode({"embeddingsOfData": encoded}))
+
+                converted = await mongodb_client.replace_embedding_encodings(updates)
+                status["converted"] += converted
+                # Rows whose updatedAt moved were rewritten by a newer writer meanwhile.
+                status["skipped"] += len(updates) - converted
+                status["scanned"] += len(docs)
+                status["lastId"] = str(after_id)
+                status["remaining"] = max(0, status["remaining"] - converted)
+        except Exception as exc:
+            status["state"] = "failed"
+            status["error"] = str(exc)
+            raise
+        finally:
+            status["seconds"] = round(time.perf_counter() - started, 2)
+
+        status["state"] = "completed"
+        status["finishedAt"] = datetime.utcnow().isoformat()
+        logger.info(
+            "Embedding migration finished: %s converted, %s skipped, %s -> %s bytes in %.1fs",
+            status["converted"],
+            status["skipped"],
+            status["bytesBefore"],
+            status["bytesAfter"],
+            status["seconds"],
+        )
+        return dict(status)
+
+    @staticmethod
+    def _from_current_model(doc: Dict[str, Any], vector: np.ndarray) -> bool:
+        """True unless the document's tags or the vector's size say another model produced it."""
+        return (
+            doc.get("embeddingModel") in (None, settings.EMBEDDING_MODEL_NAME)
+            and doc.get("embeddingModelVersion") in (None, settings.EMBEDDING_MODEL_VERSION)
+            and vector.size == settings.EMBEDDING_DIMENSION
+        )
+
+
+# Global embedding migration instance
+embedding_migration_service = EmbeddingMigrationService()
@@ -0,0 +1,191 @@
+"""Interactive and bulk lanes for embedding inference, so ingestion never queues ahead of searches."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger("DevFoolU.embedding_scheduler")
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+# How often a deferred bulk chunk re-checks the interactive lane
+_POLL_SECONDS = 0.005
+
+
+class LaneExecutor(Executor):
+    """
+    Thread pool of one lane, with queue-depth accounting and its own torch intra-op threads.
+
+    ``torch.set_num_threads`` is applied inside each worker thread before its first task
+    (OpenMP keeps the setting per thread), and only once torch is loaded, so the ONNX
+    backends never import it.
+    """
+
+    def __init__(self, name: str, workers: int, intra_op_threads: int = 0):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.intra_op_threads = max(0, int(intra_op_threads))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"embed-{name}")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._max_queued = 0
+        self._completed = 0
+        self._wait_seconds = 0.0
+        self._busy_seconds = 0.0
+
+    @property
+    def busy(self) -> bool:
+        """True while any task is queued or running in this lane."""
+        return bool(self._queued or self._running)
+
+    def _apply_intra_op_threads(self) -> None:
+        if not self.intra_op_threads or getattr(self._local, "threads_set", False):
+            return
+        torch = sys.modules.get("torch")
+        if torch is None:
+            return
+        torch.set_num_threads(self.intra_op_threads)
+        self._local.threads_set = True
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        enqueued = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+
+        def task() -> Any:
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_seconds += started - enqueued
+            try:
+                self._apply_intra_op_threads()
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._busy_seconds += time.perf_counter() - started
+
+        future = self._pool.submit(task)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future) -> None:
+        # A task cancelled while queued never ran, so it never left the queue count
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "intra_op_threads": self.intra_op_threads or None,
+                "queued": self._queued,
+                "running": self._running,
+                "max_queued": self._max_queued,
+                "completed": self._completed,
+                "mean_wait_ms": round(self._wait_seconds / self._completed * 1000, 2) if self._completed else None,
+                "busy_seconds": round(self._busy_seconds, 2),
+            }
+
+
+class EmbeddingScheduler:
+    """
+    Runs model calls in an interactive or a bulk lane.
+
+    Each lane has its own workers, so a running ingest batch never occupies the threads
+    searches need. Bulk work is submitted one chunk at a time, and before each chunk the
+    bulk lane waits while the interactive lane has anything queued or running, for at most
+    ``bulk_max_defer_ms`` so bulk work still progresses under constant traffic. A search
+    therefore waits for at most the bulk chunk already running.
+
+    ``interactive_threads=0`` splits the cores the bulk lane leaves between the
+    interactive workers, so the two lanes together do not oversubscribe the CPU.
+    """
+
+    def __init__(
+        self,
+        interactive_workers: int = 2,
+        interactive_threads: int = 0,
+        bulk_workers: int = 1,
+        bulk_threads: int = 0,
+        bulk_chunk_size: int = 16,
+        bulk_max_defer_ms: float = 2000.0,
+    ):
+        if interactive_threads <= 0:
+            spare = (os.cpu_count() or 1) - max(1, bulk_workers) * max(0, bulk_threads)
+            interactive_threads = max(1, spare // max(1, interactive_workers))
+        self._lanes: Dict[str, LaneExecutor] = {
+            INTERACTIVE: LaneExecutor(INTERACTIVE, interactive_workers, interactive_threads),
+            BULK: LaneExecutor(BULK, bulk_workers, bulk_threads),
+        }
+        self.bulk_chunk_size = max(1, int(bulk_chunk_size))
+        self.bulk_max_defer = max(0.0, float(bulk_max_defer_ms)) / 1000.0
+        self._deferred_chunks = 0
+        self._forced_chunks = 0
+        self._deferred_seconds = 0.0
+        logger.info(
+            "Embedding lanes: interactive %d worker(s) x %d thread(s), bulk %d worker(s) x %s thread(s), chunks of %d",
+            interactive_workers,
+            interactive_threads,
+            bulk_workers,
+            bulk_threads or "default",
+            self.bulk_chunk_size,
+        )
+
+    def executor(self, lane: str) -> LaneExecutor:
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown embedding lane '{lane}'. Available: {', '.join(LANES)}")
+        return self._lanes[lane]
+
+    async def run(self, lane: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` in ``lane``; a bulk call first yields to interactive work."""
+        executor = self.executor(lane)
+        if lane == BULK:
+            await self._yield_to_interactive()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+
+    async def _yield_to_interactive(self) -> None:
+        interactive = self._lanes[INTERACTIVE]
+        if not interactive.busy:
+            return
+        started = time.monotonic()
+        self._deferred_chunks += 1
+        while interactive.busy:
+            if time.monotonic() - started >= self.bulk_max_defer:
+                self._forced_chunks += 1
+                break
+            await asyncio.sleep(_POLL_SECONDS)
+        self._deferred_seconds += time.monotonic() - started
+
+    def shutdown(self, wait: bool = True) -> None:
+        for executor in self._lanes.values():
+            executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **{lane: executor.stats() for lane, executor in self._lanes.items()},
+            "bulk_chunk_size": self.bulk_chunk_size,
+            "bulk_deferred_chunks": self._deferred_chunks,
+            "bulk_forced_chunks": self._forced_chunks,
+            "bulk_deferred_seconds": round(self._deferred_seconds, 2),
+        }
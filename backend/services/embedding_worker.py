@@ -0,0 +1,199 @@
+"""Standalone embedding worker: leases queued projects from MongoDB and encodes them in large batches."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+from services.embedding import embedding_service
+from services.embedding_scheduler import BULK
+from services.mongodb import mongodb_client
+from services.vector_codec import embedding_is_current
+
+logger = logging.getLogger("DevFoolU.embedding_worker")
+
+
+class EmbeddingWorker:
+    """
+    Drains the MongoDB embedding queue (``MONGODB_EMBEDDING_QUEUE_COLLECTION``).
+
+    Each round leases up to ``batch_size`` projects, skips the ones whose stored vector
+    already matches their text, encodes the rest in one length-bucketed batch and writes
+    them back with a single ``bulk_write``. Any number of workers, in any number of
+    processes or hosts, can drain the same queue: leases are atomic per project and expire
+    if a worker dies. Every ``EMBEDDING_WORKER_SWEEP_SECONDS`` the worker also queues
+    pending projects that were written without an enqueue (e.g. before the worker existed).
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, batch_size: Optional[int] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = max(1, batch_size or settings.EMBEDDING_WORKER_BATCH_SIZE)
+        self._stopping = False
+        self._stats: Dict[str, Any] = {
+            "batches": 0,
+            "claimed": 0,
+            "encoded": 0,
+            "written": 0,
+            "unchanged": 0,
+            "missing": 0,
+            "failed": 0,
+            "swept": 0,
+            "encodeSeconds": 0.0,
+        }
+
+    def stop(self) -> None:
+        """Finish the current batch, then return from :meth:`run`."""
+        self._stopping = True
+
+    async def run(self, once: bool = False) -> Dict[str, Any]:
+        """Process batches until stopped (or, with ``once``, until the queue is empty)."""
+        logger.info("Embedding worker %s started (batches of %d)", self.worker_id, self.batch_size)
+        next_sweep = 0.0
+        while not self._stopping:
+            if time.monotonic() >= next_sweep:
+                self._stats["swept"] += await mongodb_client.enqueue_pending_embeddings()
+                next_sweep = time.monotonic() + settings.EMBEDDING_WORKER_SWEEP_SECONDS
+
+            token, urls = await mongodb_client.claim_embedding_work(
+                self.worker_id,
+                self.batch_size,
+                lease_seconds=settings.EMBEDDING_WORKER_LEASE_SECONDS,
+                max_attempts=settings.EMBEDDING_WORKER_MAX_ATTEMPTS,
+            )
+            if not urls:
+                if once:
+                    break
+                await asyncio.sleep(settings.EMBEDDING_WORKER_IDLE_SECONDS)
+                continue
+            await self._process(token, urls)
+
+        logger.info("Embedding worker %s stopped: %s", self.worker_id, self.stats())
+        return self.stats()
+
+    async def _process(self, token: str, urls: List[str]) -> None:
+        self._stats["batches"] += 1
+        self._stats["claimed"] += len(urls)
+        try:
+            projects = await mongodb_client.get_projects_for_embedding(urls)
+            self._stats["missing"] += len(urls) - len(projects)
+
+            stale = []
+            for project in projects:
+                text_hash = embedding_service.embedding_text_hash(project)
+                if embedding_is_current(project, text_hash):
+                    self._stats["unchanged"] += 1
+                else:
+                    stale.append((project, text_hash))
+
+            if stale:
+                started = time.perf_counter()
+                vectors = await embedding_service.generate_embeddings_for_projects(
+                    [project for project, _ in stale], lane=BULK
+                )
+                self._stats["encodeSeconds"] += time.perf_counter() - started
+                self._stats["encoded"] += len(stale)
+                self._stats["written"] += await mongodb_client.write_project_embeddings(
+                    [(project, vector, text_hash) for (project, text_hash), vector in zip(stale, vectors)]
+                )
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Embedding batch of %d failed on %s: %s", len(urls), self.worker_id, exc, exc_info=True)
+            self._stats["failed"] += len(urls)
+            await mongodb_client.release_embedding_work(
+                token,
+                urls,
+                str(exc),
+                retry_seconds=settings.EMBEDDING_WORKER_RETRY_SECONDS,
+                max_attempts=settings.EMBEDDING_WORKER_MAX_ATTEMPTS,
+            )
+            return
+
+        await mongodb_client.complete_embedding_work(token, urls)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats, workerId=self.worker_id)
+        stats["encodeSeconds"] = round(stats["encodeSeconds"], 2)
+        if self._stats["encodeSeconds"]:
+            stats["projectsPerSecond"] = round(self._stats["encoded"] / self._stats["encodeSeconds"], 1)
+        return stats
+
+
+async def run_worker(threads: int = 0, batch_size: Optional[int] = None, once: bool = False) -> Dict[str, Any]:
+    """
+    Connect, load the model and drain the queue in this process.
+
+    ``threads`` bounds torch (and ONNX Runtime) intra-op threads; the worker serves no
+    searches, so all of them go to the bulk lane.
+    """
+    threads = threads or (os.cpu_count() or 1)
+    if not settings.EMBEDDING_ONNX_THREADS:
+        settings.EMBEDDING_ONNX_THREADS = threads
+    embedding_service.configure_lanes(
+        interactive_workers=1,
+        interactive_threads=1,
+        bulk_workers=1,
+        bulk_threads=threads,
+        bulk_chunk_size=settings.EMBEDDING_ENCODE_BATCH_SIZE,
+    )
+
+    worker = EmbeddingWorker(batch_size=batch_size)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, worker.stop)
+        except (NotImplementedError, RuntimeError):  # pragma: no cover - Windows
+            pass
+
+    await mongodb_client.connect()
+    try:
+        await embedding_service.initialize()
+        return await worker.run(once=once)
+    finally:
+        embedding_service.cleanup()
+        await mongodb_client.close()
+
+
+def _worker_process(threads: int, batch_size: Optional[int], once: bool) -> None:
+    from core.logger import setup_logging
+
+    setup_logging()
+    asyncio.run(run_worker(threads=threads, batch_size=batch_size, once=once))
+
+
+def run_worker_pool(
+    processes: int,
+    threads: int = 0,
+    batch_size: Optional[int] = None,
+    once: bool = False,
+) -> Dict[str, Any]:
+    """
+    Run ``processes`` workers, each with its own model and ``threads`` intra-op threads
+    (default: the cores split evenly), and wait for them to exit.
+    """
+    processes = max(1, processes)
+    threads = threads or max(1, (os.cpu_count() or 1) // processes)
+    context = multiprocessing.get_context("spawn")
+    children = [
+        context.Process(
+            target=_worker_process,
+            args=(threads, batch_size, once),
+            name=f"embedding-worker-{index}",
+        )
+        for index in range(processes)
+    ]
+    for child in children:
+        child.start()
+    # Ctrl+C reaches the whole process group: each child finishes its batch and exits
+    for child in children:
+        child.join()
+    return {
+        "processes": processes,
+        "threadsPerProcess": threads,
+        "exitCodes": [child.exitcode for child in children],
+    }
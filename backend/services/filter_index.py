@@ -0,0 +1,352 @@
+"""Bitmap indexes over project facets (technologies, tags, links) for filtered vector search."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.config import settings
+from services.ann_index import AnnBackend, Artifact, Candidates
+
+logger = logging.getLogger("DevFoolU.filter_index")
+
+# A facet set is dense (packed bits) once more than one row in this many carries it
+_DENSE_EVERY = 32
+
+
+def normalize_facet(value: Any) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def _values(value: Any) -> List[str]:
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, (list, tuple)):
+        return []
+    return [normalized for normalized in (normalize_facet(item) for item in value) if normalized]
+
+
+def facet_keys(doc: Mapping[str, Any]) -> Tuple[str, ...]:
+    """Sorted facet keys of a project document, e.g. ``tech:solidity``, ``tag:healthcare``, ``has:github``."""
+    keys = {f"tech:{value}" for value in _values(doc.get("technologiesUsed"))}
+    keys.update(f"tag:{value}" for value in _values(doc.get("tagsOfProject")))
+    if str(doc.get("githubUrl") or "").strip():
+        keys.add("has:github")
+    if str(doc.get("demoUrl") or "").strip() or str(doc.get("liveUrl") or "").strip():
+        keys.add("has:demo")
+    return tuple(sorted(keys))
+
+
+def facet_hash(keys: Sequence[str]) -> int:
+    """Process-independent fingerprint of a facet set (persisted with the snapshot)."""
+    digest = hashlib.blake2b("\x1f".join(keys).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def filter_keys(filters: Mapping[str, Any]) -> Tuple[List[str], List[str]]:
+    """Split request filters into required and excluded facet keys."""
+    required = [f"tech:{value}" for value in _values(filters.get("technologies"))]
+    required += [f"tag:{value}" for value in _values(filters.get("tags"))]
+    excluded: List[str] = []
+    for flag, key in (("has_github", "has:github"), ("has_demo", "has:demo")):
+        if filters.get(flag) is True:
+            required.append(key)
+        elif filters.get(flag) is False:
+            excluded.append(key)
+    return required, excluded
+
+
+class _Bitmap:
+    """
+    Rows carrying one facet: a sorted ``int32`` array when sparse, packed bits
+    (one bit per row) when dense. Immutable; appends build a new bitmap.
+    """
+
+    __slots__ = ("rows", "bits", "size", "count")
+
+    def __init__(self, rows: np.ndarray, size: int):
+        self.size = size
+        self.count = int(rows.size)
+        if rows.size * _DENSE_EVERY > size:
+            mask = np.zeros(size, dtype=bool)
+            mask[rows] = True
+            self.rows = None
+            self.bits = np.packbits(mask)
+        else:
+            self.rows = rows.astype(np.int32, copy=False)
+            self.bits = None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.rows.nbytes if self.rows is not None else self.bits.nbytes)
+
+    def to_rows(self) -> np.ndarray:
+        if self.rows is not None:
+            return self.rows
+        return np.flatnonzero(np.unpackbits(self.bits, count=self.size)).astype(np.int32)
+
+    def to_mask(self, size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool)
+        if self.rows is not None:
+            mask[self.rows[self.rows < size]] = True
+        else:
+            limit = min(size, self.size)
+            mask[:limit] = np.unpackbits(self.bits, count=self.size)[:limit].astype(bool)
+        return mask
+
+    def contains(self, rows: np.ndarray) -> np.ndarray:
+        if self.rows is not None:
+            positions = np.searchsorted(self.rows, rows)
+            found = positions < self.rows.size
+            found[found] = self.rows[positions[found]] == rows[found]
+            return found
+        inside = rows < self.size
+        hit = np.zeros(rows.size, dtype=bool)
+        probe = rows[inside]
+        hit[inside] = (self.bits[probe >> 3] >> (7 - (probe & 7))) & 1 == 1
+        return hit
+
+
+class _FacetLayout:
+    __slots__ = ("base", "state", "bitmaps", "hashes", "built_at")
+
+    def __init__(
+        self,
+        state: Any,
+        bitmaps: Dict[str, _Bitmap],
+        hashes: np.ndarray,
+        built_at: Optional[str] = None,
+    ):
+        self.base = state.base
+        self.state = state
+        self.bitmaps = bitmaps
+        self.hashes = hashes
+        self.built_at = built_at or datetime.utcnow().isoformat()
+
+    @property
+    def size(self) -> int:
+        return int(self.hashes.size)
+
+
+def _layout_from_rows(state: Any, row_keys: Dict[str, List[int]], hashes: np.ndarray, built_at: Optional[str] = None) -> _FacetLayout:
+    size = int(hashes.size)
+    bitmaps = {key: _Bitmap(np.asarray(rows, dtype=np.int32), size) for key, rows in row_keys.items() if rows}
+    return _FacetLayout(state, bitmaps, hashes, built_at)
+
+
+class FilterIndex(AnnBackend):
+    """
+    Facet bitmaps over the index rows, built from the documents the index loads.
+
+    :meth:`select` turns request filters into candidate rows before top-k selection:
+    selective filters yield a short row list to gather and score, broad ones a boolean
+    mask applied to a full scan. Appended rows take their facets from :meth:`stage`,
+    which the index calls with each delta's documents before refreshing.
+    """
+
+    name = "filters"
+    artifact_keys = ("rows", "offsets", "hashes")
+
+    def __init__(self):
+        self._layout: Optional[_FacetLayout] = None
+        self._staged: Dict[Any, Tuple[str, ...]] = {}
+
+    def is_trained(self) -> bool:
+        return self._layout is not None
+
+    def is_ready(self, state: Any) -> bool:
+        layout = self._layout
+        return layout is not None and layout.base is state.base
+
+    def search(self, state: Any, query: np.ndarray, top_k: int, **params: Any) -> Optional[Candidates]:
+        return None
+
+    def train(self, state: Any) -> None:
+        raise ValueError("The filter index is built from documents when the vector index loads")
+
+    # -- maintenance ----------------------------------------------------------
+
+    def build(self, state: Any, row_keys: Sequence[Sequence[str]]) -> None:
+        """Index ``row_keys[row]`` for every row of a freshly loaded state."""
+        rows_by_key: Dict[str, List[int]] = {}
+        hashes = np.empty(state.size, dtype=np.int64)
+        for row, keys in enumerate(row_keys):
+            hashes[row] = facet_hash(keys)
+            for key in keys:
+                rows_by_key.setdefault(key, []).append(row)
+        self._layout = _layout_from_rows(state, rows_by_key, hashes)
+        self._staged = {}
+        logger.info("Filter index built: %s facet values over %s rows", len(self._layout.bitmaps), state.size)
+
+    def stage(self, project_id: Any, keys: Tuple[str, ...]) -> None:
+        """Facets for a project about to be appended by a delta."""
+        self._staged[project_id] = keys
+
+    def facets_changed(self, row: int, keys: Tuple[str, ...]) -> bool:
+        layout = self._layout
+        if layout is None or row >= layout.size:
+            return False
+        return int(layout.hashes[row]) != facet_hash(keys)
+
+    def refresh(self, state: Any) -> None:
+        layout = self._layout
+        if layout is None:
+            return
+        if layout.base is not state.base:
+            layout = self._remap(layout, state)
+        if state.size > layout.size:
+            layout = self._append(layout, state)
+        elif layout.state is not state:
+            layout = _FacetLayout(state, layout.bitmaps, layout.hashes, layout.built_at)
+        self._layout = layout
+
+    def _append(self, layout: _FacetLayout, state: Any) -> _FacetLayout:
+        start, size = layout.size, state.size
+        hashes = np.empty(size, dtype=np.int64)
+        hashes[:start] = layout.hashes
+        added: Dict[str, List[int]] = {}
+        for row in range(start, size):
+            keys = self._staged.pop(state.ids[row], ())
+            hashes[row] = facet_hash(keys)
+            for key in keys:
+                added.setdefault(key, []).append(row)
+
+        bitmaps = dict(layout.bitmaps)
+        for key, rows in added.items():
+            previous = bitmaps.get(key)
+            merged = np.asarray(rows, dtype=np.int32)
+            if previous is not None:
+                merged = np.concatenate([previous.to_rows(), merged])
+            bitmaps[key] = _Bitmap(merged, size)
+        return _FacetLayout(state, bitmaps, hashes, layout.built_at)
+
+    def _remap(self, layout: _FacetLayout, state: Any) -> _FacetLayout:
+        """Carry facets over to a new base (compaction, snapshot) by project id."""
+        old = layout.state
+        old_count = min(layout.size, old.size)
+        new_rows = np.full(old_count, -1, dtype=np.int64)
+        for row in np.flatnonzero(old.live[:old_count]).tolist():
+            new_rows[row] = state.row_by_id.get(old.ids[row], -1)
+
+        # Rows the old layout never saw start without facets until a delta restages them.
+        hashes = np.full(state.size, facet_hash(()), dtype=np.int64)
+        kept = np.flatnonzero(new_rows >= 0)
+        hashes[new_rows[kept]] = layout.hashes[kept]
+
+        bitmaps: Dict[str, _Bitmap] = {}
+        for key, bitmap in layout.bitmaps.items():
+            rows = bitmap.to_rows()
+            rows = new_rows[rows[rows < old_count]]
+            rows = np.sort(rows[rows >= 0])
+            if rows.size:
+                bitmaps[key] = _Bitmap(rows.astype(np.int32), state.size)
+        return _FacetLayout(state, bitmaps, hashes, layout.built_at)
+
+    # -- queries --------------------------------------------------------------
+
+    def select(self, state: Any, filters: Mapping[str, Any]) -> Optional[np.ndarray]:
+        """
+        Candidate rows for ``filters``: sorted row ids when selective, otherwise a boolean
+        mask over all rows (check ``dtype``). None when no filter is set.
+        """
+        required, excluded = filter_keys(filters)
+        if not required and not excluded:
+            return None
+        layout = self._layout
+        if layout is None:
+            raise RuntimeError("Filter index is not built")
+
+        size = state.size
+        if any(key not in layout.bitmaps for key in required):
+            return np.empty(0, dtype=np.int64)
+        positive = sorted((layout.bitmaps[key] for key in required), key=lambda bitmap: bitmap.count)
+        negative = [layout.bitmaps[key] for key in excluded if key in layout.bitmaps]
+        scan_limit = settings.VECTOR_INDEX_FILTER_SCAN_RATIO * max(1, size)
+
+        if positive and positive[0].count <= scan_limit:
+            rows = positive[0].to_rows().astype(np.int64)
+            for bitmap in positive[1:]:
+                rows = rows[bitmap.contains(rows)]
+            for bitmap in negative:
+                rows = rows[~bitmap.contains(rows)]
+            rows = rows[rows < size]
+            return rows[state.live[rows]]
+
+        mask = state.live.copy()
+        for bitmap in positive:
+            mask &= bitmap.to_mask(size)
+        for bitmap in negative:
+            mask &= ~bitmap.to_mask(size)
+        if np.count_nonzero(mask) <= scan_limit:
+            return np.flatnonzero(mask)
+        return mask
+
+    # -- persistence ----------------------------------------------------------
+
+    def artifact(self) -> Optional[Artifact]:
+        layout = self._layout
+        if layout is None:
+            return None
+        base_rows = layout.base.shape[0]
+        keys = sorted(layout.bitmaps)
+        parts = []
+        for key in keys:
+            rows = layout.bitmaps[key].to_rows()
+            parts.append(rows[rows < base_rows])
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([part.size for part in parts], out=offsets[1:])
+        arrays = {
+            "rows": np.concatenate(parts) if parts else np.empty(0, dtype=np.int32),
+            "offsets": offsets,
+            "hashes": layout.hashes[:base_rows],
+        }
+        return arrays, {"keys": keys, "built_at": layout.built_at}
+
+    def restore(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], state: Any) -> bool:
+        base_rows = state.base.shape[0]
+        keys = meta.get("keys") or []
+        offsets = arrays["offsets"]
+        if arrays["hashes"].shape != (base_rows,) or offsets.size != len(keys) + 1:
+            return False
+        rows = arrays["rows"]
+        rows_by_key = {key: rows[offsets[i] : offsets[i + 1]] for i, key in enumerate(keys)}
+        layout = _FacetLayout(
+            state,
+            {key: _Bitmap(np.asarray(part, dtype=np.int32), base_rows) for key, part in rows_by_key.items() if part.size},
+            np.asarray(arrays["hashes"], dtype=np.int64),
+            meta.get("built_at"),
+        )
+        self._layout = self._append(layout, state) if state.size > base_rows else layout
+        return True
+
+    def reset(self) -> None:
+        self._layout = None
+        self._staged = {}
+
+    def stats(self) -> Dict[str, Any]:
+        layout = self._layout
+        if layout is None:
+            return {"trained": False}
+        dense = sum(1 for bitmap in layout.bitmaps.values() if bitmap.bits is not None)
+        return {
+            "trained": True,
+            "facet_values": len(layout.bitmaps),
+            "dense_bitmaps": dense,
+            "rows": layout.size,
+            "memory_bytes": int(sum(bitmap.nbytes for bitmap in layout.bitmaps.values()) + layout.hashes.nbytes),
+            "built_at": layout.built_at,
+        }
+
+    def top_values(self, prefix: str, limit: int = 50) -> List[Tuple[str, int]]:
+        """Most common values of one facet (``tech`` or ``tag``), for filter pickers."""
+        layout = self._layout
+        if layout is None:
+            return []
+        marker = f"{prefix}:"
+        counts = [(key[len(marker):], bitmap.count) for key, bitmap in layout.bitmaps.items() if key.startswith(marker)]
+        return sorted(counts, key=lambda item: (-item[1], item[0]))[:limit]
+
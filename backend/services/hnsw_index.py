@@ -0,0 +1,454 @@
+"""HNSW-style navigable small-world graph over the resident index, in NumPy and Python."""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import random
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.config import settings
+from services.ann_index import AnnBackend, Artifact, Candidates, gather_rows, select_top_k
+
+logger = logging.getLogger("DevFoolU.hnsw_index")
+
+_EMPTY = np.empty(0, dtype=np.int32)
+_MAX_LEVEL = 16
+
+
+class _Graph:
+    """
+    Layered proximity graph whose node ids are index rows.
+
+    Layer 0 adjacency is a fixed-width ``int32`` matrix padded with ``-1``; the sparse
+    upper layers are ``{node: neighbours}`` dicts. Rows ``[0, count)`` have been
+    inserted (tombstoned rows are kept as routing nodes and filtered from results);
+    rows past ``count`` are appended by deltas and scored exactly until inserted.
+    """
+
+    __slots__ = ("base", "state", "neighbors", "levels", "upper", "entry", "max_level", "count", "built_at")
+
+    def __init__(self, state: Any, capacity: int, m0: int):
+        self.base = state.base
+        self.state = state
+        self.neighbors = np.full((max(1, capacity), m0), -1, dtype=np.int32)
+        self.levels = np.zeros(max(1, capacity), dtype=np.int8)
+        self.upper: List[Dict[int, np.ndarray]] = []
+        self.entry = -1
+        self.max_level = -1
+        self.count = 0
+        self.built_at = datetime.utcnow().isoformat()
+
+    def ensure_capacity(self, rows: int) -> None:
+        capacity = self.neighbors.shape[0]
+        if rows <= capacity:
+            return
+        grown = max(rows, capacity * 2)
+        neighbors = np.full((grown, self.neighbors.shape[1]), -1, dtype=np.int32)
+        neighbors[:capacity] = self.neighbors
+        levels = np.zeros(grown, dtype=np.int8)
+        levels[:capacity] = self.levels
+        # Readers pick up the grown arrays with the next attribute access.
+        self.neighbors = neighbors
+        self.levels = levels
+
+    def links(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            row = self.neighbors[node]
+            return row[row >= 0]
+        return self.upper[level - 1].get(node, _EMPTY)
+
+    def set_links(self, node: int, level: int, links: Sequence[int]) -> None:
+        if level == 0:
+            row = np.full(self.neighbors.shape[1], -1, dtype=np.int32)
+            row[: len(links)] = links
+            self.neighbors[node] = row
+        else:
+            self.upper[level - 1][node] = np.asarray(links, dtype=np.int32)
+
+    @property
+    def upper_nodes(self) -> int:
+        return sum(len(layer) for layer in self.upper)
+
+
+class HnswIndex(AnnBackend):
+    """
+    Greedy descent through sparse upper layers, then a best-first beam of width
+    ``ef_search`` on layer 0. Inserts use the neighbour-selection heuristic from
+    Malkov & Yashunin (2018) so clustered embeddings stay navigable.
+    """
+
+    name = "hnsw"
+    artifact_keys = ("neighbors", "levels", "upper_nodes", "upper_levels", "upper_neighbors")
+
+    def __init__(self):
+        self._graph: Optional[_Graph] = None
+        self._rng = random.Random(0)
+        self._train_seconds: Optional[float] = None
+
+    @property
+    def m(self) -> int:
+        return max(2, settings.VECTOR_INDEX_HNSW_M)
+
+    def is_trained(self) -> bool:
+        return self._graph is not None
+
+    def is_ready(self, state: Any) -> bool:
+        graph = self._graph
+        return graph is not None and graph.base is state.base
+
+    # -- search ---------------------------------------------------------------
+
+    def _search_layer(
+        self,
+        graph: _Graph,
+        state: Any,
+        query: np.ndarray,
+        entries: Sequence[int],
+        ef: int,
+        level: int,
+    ) -> List[Tuple[float, int]]:
+        """Best-first search on one layer; returns up to ``ef`` ``(similarity, node)`` pairs, best first."""
+        limit = state.size
+        visited = np.zeros(limit, dtype=bool)
+        entries = np.asarray([node for node in entries if node < limit], dtype=np.int64)
+        visited[entries] = True
+        sims = gather_rows(state, entries) @ query
+
+        candidates = [(-sim, node) for sim, node in zip(sims.tolist(), entries.tolist())]
+        heapq.heapify(candidates)
+        results = [(sim, node) for sim, node in zip(sims.tolist(), entries.tolist())]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative < results[0][0]:
+                break
+            links = graph.links(node, level)
+            links = links[links < limit]
+            links = links[~visited[links]]
+            if links.size == 0:
+                continue
+            visited[links] = True
+            sims = gather_rows(state, links) @ query
+            if len(results) >= ef:
+                # Only neighbours that beat the current worst result can enter the beam.
+                better = sims > results[0][0]
+                links, sims = links[better], sims[better]
+            for sim, neighbor in zip(sims.tolist(), links.tolist()):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbor))
+                    heapq.heappush(results, (sim, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    def _descend(self, graph: _Graph, state: Any, query: np.ndarray, to_level: int) -> List[int]:
+        entry = [graph.entry]
+        for level in range(graph.max_level, to_level, -1):
+            entry = [self._search_layer(graph, state, query, entry, 1, level)[0][1]]
+        return entry
+
+    def search(self, state: Any, query: np.ndarray, top_k: int, **params: Any) -> Optional[Candidates]:
+        graph = self._graph
+        if graph is None or graph.base is not state.base or graph.entry < 0:
+            return None
+
+        ef = params.get("ef_search") or settings.VECTOR_INDEX_HNSW_EF_SEARCH
+        # Tombstoned nodes still route the search but are dropped from results.
+        ef = max(int(ef), top_k + min(state.dead_count, top_k))
+        entry = self._descend(graph, state, query, 0)
+        found = self._search_layer(graph, state, query, entry, ef, 0)
+        rows = np.fromiter((node for _sim, node in found), dtype=np.int64, count=len(found))
+        scores = np.fromiter((sim for sim, _node in found), dtype=np.float32, count=len(found))
+
+        inserted = min(graph.count, state.size)
+        if inserted < state.size:
+            # Rows appended since the last refresh are scored exactly.
+            pending = np.arange(inserted, state.size, dtype=np.int64)
+            rows = np.concatenate([rows, pending])
+            scores = np.concatenate([scores, gather_rows(state, pending) @ query])
+        return select_top_k(state, rows, scores, top_k)
+
+    # -- construction ---------------------------------------------------------
+
+    def _select(self, state: Any, candidates: List[Tuple[float, int]], limit: int) -> List[int]:
+        """Keep a candidate only if it is closer to the base node than to every neighbour kept so far."""
+        if len(candidates) <= limit:
+            return [node for _sim, node in candidates]
+        nodes = np.asarray([node for _sim, node in candidates], dtype=np.int64)
+        sims = np.asarray([sim for sim, _node in candidates], dtype=np.float32)
+        vectors = gather_rows(state, nodes)
+        pairwise = vectors @ vectors.T
+
+        kept: List[int] = []
+        for position in range(nodes.size):
+            if not kept or pairwise[position, kept].max() < sims[position]:
+                kept.append(position)
+                if len(kept) == limit:
+                    break
+        return nodes[kept].tolist()
+
+    def _random_level(self) -> int:
+        level = int(-math.log(1.0 - self._rng.random()) / math.log(self.m))
+        return min(level, _MAX_LEVEL)
+
+    def _insert(self, graph: _Graph, state: Any, node: int) -> None:
+        m = self.m
+        level = self._random_level()
+        graph.levels[node] = level
+        while len(graph.upper) < level:
+            graph.upper.append({})
+
+        if graph.entry < 0:
+            graph.entry, graph.max_level = node, level
+            return
+
+        vector = state.vector(node)
+        entry = self._descend(graph, state, vector, level)
+        ef_construction = max(m, settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION)
+        for layer in range(min(level, graph.max_level), -1, -1):
+            found = [(sim, other) for sim, other in self._search_layer(graph, state, vector, entry, ef_construction, layer) if other != node]
+            selected = self._select(state, found, m)
+            graph.set_links(node, layer, selected)
+
+            capacity = 2 * m if layer == 0 else m
+            for neighbor in selected:
+                links = graph.links(neighbor, layer)
+                if links.size < capacity:
+                    graph.set_links(neighbor, layer, [*links.tolist(), node])
+                    continue
+                pool = np.append(links, node).astype(np.int64)
+                sims = gather_rows(state, pool) @ state.vector(neighbor)
+                order = np.argsort(-sims, kind="stable")
+                graph.set_links(
+                    neighbor,
+                    layer,
+                    self._select(state, [(float(sims[i]), int(pool[i])) for i in order], capacity),
+                )
+            entry = [other for _sim, other in found] or entry
+
+        if level > graph.max_level:
+            graph.entry, graph.max_level = node, level
+
+    def _insert_rows(self, graph: _Graph, state: Any, rows: Sequence[int]) -> None:
+        graph.ensure_capacity(state.size)
+        for row in rows:
+            if state.live[row]:
+                self._insert(graph, state, int(row))
+
+    def train(self, state: Any) -> None:
+        started = time.perf_counter()
+        graph = _Graph(state, state.size, 2 * self.m)
+        self._insert_rows(graph, state, range(state.size))
+        graph.count = state.size
+        self._graph = graph
+        self._train_seconds = time.perf_counter() - started
+        logger.info(
+            "HNSW graph built: %s nodes, %s upper-layer nodes, max level %s in %.1fs",
+            state.live_count,
+            graph.upper_nodes,
+            graph.max_level,
+            self._train_seconds,
+        )
+
+    def refresh(self, state: Any) -> None:
+        graph = self._graph
+        if graph is None:
+            return
+        if graph.base is not state.base:
+            self._graph = self._remap(graph, state)
+            return
+        self._catch_up(graph, state)
+
+    def _catch_up(self, graph: _Graph, state: Any) -> None:
+        if state.size > graph.count:
+            # Incremental insertion: new rows are linked in place; until ``count``
+            # passes them, searches score them exactly instead.
+            self._insert_rows(graph, state, range(graph.count, state.size))
+            graph.count = state.size
+        graph.state = state
+        self._graph = graph
+
+    def _remap(self, graph: _Graph, state: Any) -> _Graph:
+        """
+        Carry the graph over to a new base matrix (reload, compaction, snapshot).
+
+        Nodes are matched to new rows by project id and unchanged vector; edges to
+        dropped nodes are patched from the dropped nodes' own neighbours, and rows the
+        old graph did not cover are inserted. Nothing is visible until the swap.
+        """
+        old = graph.state
+        old_count = min(graph.count, old.size)
+        new_rows = np.full(old_count + 1, -1, dtype=np.int64)  # trailing slot maps -1 to -1
+        for row in range(old_count):
+            if old.live[row]:
+                new_rows[row] = state.row_by_id.get(old.ids[row], -1)
+        kept = np.flatnonzero(new_rows[:old_count] >= 0)
+        if kept.size:
+            same = np.all(
+                np.isclose(gather_rows(old, kept), gather_rows(state, new_rows[kept]), atol=1e-6),
+                axis=1,
+            )
+            new_rows[kept[~same]] = -1
+            kept = kept[same]
+
+        remapped = _Graph(state, state.size, graph.neighbors.shape[1])
+        remapped.built_at = graph.built_at
+        old_links = new_rows[graph.neighbors[:old_count]]
+        remapped.neighbors[new_rows[kept]] = old_links[kept]
+        remapped.levels[new_rows[kept]] = graph.levels[kept]
+        for layer in graph.upper:
+            remapped.upper.append(
+                {
+                    int(new_rows[node]): new_rows[links][new_rows[links] >= 0].astype(np.int32)
+                    for node, links in layer.items()
+                    if node < old_count and new_rows[node] >= 0
+                }
+            )
+
+        self._repair(remapped, state, graph, new_rows, kept)
+
+        if kept.size:
+            levels = remapped.levels[new_rows[kept]]
+            top = int(levels.max())
+            remapped.max_level = top
+            remapped.entry = int(new_rows[kept[np.argmax(levels)]])
+            del remapped.upper[top:]
+        else:
+            remapped.upper = []
+
+        covered = np.zeros(state.size, dtype=bool)
+        covered[new_rows[kept]] = True
+        self._insert_rows(remapped, state, np.flatnonzero(~covered))
+        remapped.count = state.size
+        logger.info(
+            "HNSW graph remapped: kept %s of %s nodes, inserted %s",
+            kept.size,
+            old_count,
+            int((~covered).sum()),
+        )
+        return remapped
+
+    def _repair(self, graph: _Graph, state: Any, old: _Graph, new_rows: np.ndarray, kept: np.ndarray) -> None:
+        """Reconnect layer-0 nodes that lost neighbours via their dropped neighbours' links."""
+        capacity = graph.neighbors.shape[1]
+        old_links = old.neighbors[: new_rows.size - 1]
+        lost = ((old_links >= 0) & (new_rows[old_links] < 0)).any(axis=1)
+        for old_node in kept[lost[kept]]:
+            node = int(new_rows[old_node])
+            links = graph.neighbors[node]
+            pool = set(links[links >= 0].tolist())
+            for dropped in old_links[old_node]:
+                if dropped >= 0 and new_rows[dropped] < 0:
+                    hops = new_rows[old_links[dropped]]
+                    pool.update(hops[hops >= 0].tolist())
+            pool.discard(node)
+            if not pool:
+                continue
+            nodes = np.fromiter(pool, dtype=np.int64)
+            sims = gather_rows(state, nodes) @ state.vector(node)
+            order = np.argsort(-sims, kind="stable")[: max(capacity, settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION)]
+            graph.set_links(
+                node,
+                0,
+                self._select(state, [(float(sims[i]), int(nodes[i])) for i in order], capacity),
+            )
+
+    # -- persistence ----------------------------------------------------------
+
+    def artifact(self) -> Optional[Artifact]:
+        graph = self._graph
+        if graph is None:
+            return None
+        # Only base rows exist in the snapshot; appended rows are re-inserted on load.
+        base_rows = min(graph.base.shape[0], graph.count)
+        neighbors = graph.neighbors[:base_rows].copy()
+        neighbors[neighbors >= base_rows] = -1
+
+        upper_nodes, upper_levels, upper_neighbors = [], [], []
+        for level, layer in enumerate(graph.upper, start=1):
+            for node, links in layer.items():
+                if node >= base_rows:
+                    continue
+                padded = np.full(self.m, -1, dtype=np.int32)
+                links = links[links < base_rows][: self.m]
+                padded[: links.size] = links
+                upper_nodes.append(node)
+                upper_levels.append(level)
+                upper_neighbors.append(padded)
+
+        entry = graph.entry
+        if entry >= base_rows:
+            below = np.flatnonzero(graph.levels[:base_rows] > 0)
+            entry = int(below[np.argmax(graph.levels[below])]) if below.size else 0
+        arrays = {
+            "neighbors": neighbors,
+            "levels": graph.levels[:base_rows].copy(),
+            "upper_nodes": np.asarray(upper_nodes, dtype=np.int32),
+            "upper_levels": np.asarray(upper_levels, dtype=np.int8),
+            "upper_neighbors": (
+                np.vstack(upper_neighbors) if upper_neighbors else np.empty((0, self.m), dtype=np.int32)
+            ),
+        }
+        meta = {
+            "m": self.m,
+            "entry": int(entry),
+            "max_level": int(graph.levels[entry]) if base_rows else -1,
+            "built_at": graph.built_at,
+        }
+        return arrays, meta
+
+    def restore(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], state: Any) -> bool:
+        neighbors = arrays["neighbors"]
+        base_rows = state.base.shape[0]
+        if meta.get("m") != self.m or neighbors.shape != (base_rows, 2 * self.m):
+            return False
+
+        graph = _Graph(state, state.size, 2 * self.m)
+        graph.neighbors[:base_rows] = neighbors
+        graph.levels[:base_rows] = arrays["levels"]
+        graph.upper = [{} for _ in range(max(0, int(meta.get("max_level", 0))))]
+        for node, level, links in zip(
+            arrays["upper_nodes"].tolist(),
+            arrays["upper_levels"].tolist(),
+            arrays["upper_neighbors"],
+        ):
+            graph.upper[level - 1][node] = links[links >= 0].astype(np.int32)
+        graph.entry = int(meta.get("entry", -1)) if base_rows else -1
+        graph.max_level = int(meta.get("max_level", -1))
+        graph.count = base_rows
+        graph.built_at = meta.get("built_at") or graph.built_at
+        self._catch_up(graph, state)
+        return True
+
+    def reset(self) -> None:
+        self._graph = None
+
+    def stats(self) -> Dict[str, Any]:
+        graph = self._graph
+        if graph is None:
+            return {"trained": False}
+        degrees = (graph.neighbors[: graph.count] >= 0).sum(axis=1) if graph.count else np.zeros(1)
+        upper_bytes = sum(links.nbytes for layer in graph.upper for links in layer.values())
+        return {
+            "trained": True,
+            "nodes": graph.count,
+            "m": self.m,
+            "ef_search": settings.VECTOR_INDEX_HNSW_EF_SEARCH,
+            "ef_construction": settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION,
+            "max_level": graph.max_level,
+            "upper_layer_nodes": graph.upper_nodes,
+            "mean_degree": round(float(degrees.mean()), 2),
+            "memory_bytes": int(graph.neighbors.nbytes + graph.levels.nbytes + upper_bytes),
+            "built_at": graph.built_at,
+            "train_seconds": self._train_seconds,
+        }
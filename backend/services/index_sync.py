@@ -0,0 +1,262 @@
+"""Background task that keeps the resident vector index in step with MongoDB writes."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from core.config import settings
+from services.mongodb import mongodb_client
+from services.vector_index import max_watermark, vector_index_service
+
+logger = logging.getLogger("DevFoolU.index_sync")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class IndexSyncService:
+    """
+    Replays project changes into the vector index.
+
+    ``poll`` mode pages through ``updatedAt > watermark`` (re-reading a short overlap
+    window so late commits of an in-flight batch are not skipped) and periodically
+    reconciles ids to catch deletes. ``change_stream`` mode tails the collection and
+    falls back to polling when the deployment does not support change streams.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._mode = settings.VECTOR_INDEX_SYNC_MODE
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._last_sync_at: Optional[datetime] = None
+        self._last_reconcile_monotonic = time.monotonic()
+        self._last_error: Optional[str] = None
+        self._totals = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def request_sync(self) -> None:
+        """Wake the poller early; registered as a MongoDB write listener."""
+        self._wake.set()
+
+    async def start(self) -> bool:
+        if not settings.VECTOR_INDEX_SYNC_ENABLED or self.is_running():
+            return False
+
+        self._stopping = False
+        self._mode = settings.VECTOR_INDEX_SYNC_MODE
+        mongodb_client.add_write_listener(self.request_sync)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Vector index sync started (mode=%s)", self._mode)
+        return True
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+        mongodb_client.remove_write_listener(self.request_sync)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                if self._mode == "change_stream":
+                    await self._run_change_stream()
+                else:
+                    await self._run_poll_loop()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                if self._mode == "change_stream":
+                    logger.warning("Change streams unavailable (%s); falling back to polling", exc)
+                    self._mode = "poll"
+                    continue
+                self._record_error(exc)
+            except Exception as exc:  # noqa: BLE001
+                self._record_error(exc)
+            await asyncio.sleep(max(1.0, settings.VECTOR_INDEX_SYNC_INTERVAL_SECONDS))
+
+    def _record_error(self, exc: Exception) -> None:
+        self._last_error = str(exc)
+        logger.error("Vector index sync failed: %s", exc, exc_info=True)
+
+    async def _run_poll_loop(self) -> None:
+        while not self._stopping:
+            await self.sync_once()
+            if (
+                time.monotonic() - self._last_reconcile_monotonic
+                >= settings.VECTOR_INDEX_RECONCILE_INTERVAL_SECONDS
+            ):
+                await self.reconcile_deletes()
+
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(),
+                    timeout=max(0.1, settings.VECTOR_INDEX_SYNC_INTERVAL_SECONDS),
+                )
+                # Let a burst of writes (one ingest batch) settle before reading it back.
+                await asyncio.sleep(0.2)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def sync_once(self) -> Dict[str, int]:
+        """Replay every change newer than the index watermark."""
+        await vector_index_service.ensure_loaded()
+        watermark = vector_index_service.watermark
+        if watermark is None:
+            cursor_time, cursor_id = _EPOCH, None
+        else:
+            overlap = timedelta(seconds=max(0.0, settings.VECTOR_INDEX_SYNC_OVERLAP_SECONDS))
+            cursor_time, cursor_id = watermark[0] - overlap, None
+
+        applied = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        batch_size = max(1, settings.VECTOR_INDEX_SYNC_BATCH_SIZE)
+
+        while True:
+            docs = await mongodb_client.get_project_changes_since(
+                cursor_time,
+                after_id=cursor_id,
+                limit=batch_size,
+            )
+            if not docs:
+                break
+
+            last = docs[-1]
+            cursor_time, cursor_id = last["updatedAt"], last["_id"]
+            counts = await vector_index_service.apply_changes(
+                upserts=docs,
+                watermark=(cursor_time, cursor_id),
+            )
+            self._add_counts(applied, counts)
+            self._add_counts(self._totals, counts)
+
+            if len(docs) < batch_size:
+                break
+
+        self._last_sync_at = datetime.utcnow()
+        if applied["added"] or applied["updated"] or applied["removed"]:
+            logger.info(
+                "Vector index synced: +%s ~%s -%s (version %s)",
+                applied["added"],
+                applied["updated"],
+                applied["removed"],
+                vector_index_service.version,
+            )
+        return applied
+
+    async def reconcile_deletes(self) -> int:
+        """Tombstone indexed projects that no longer exist (or lost their embedding)."""
+        self._last_reconcile_monotonic = time.monotonic()
+        indexed = vector_index_service.indexed_ids()
+        if not indexed:
+            return 0
+
+        present = await mongodb_client.get_embedded_project_ids()
+        missing = [project_id for project_id in indexed if project_id not in present]
+        if not missing:
+            return 0
+
+        counts = await vector_index_service.apply_changes(deletes=missing)
+        self._add_counts(self._totals, counts)
+        logger.info("Vector index reconcile removed %s stale rows", counts["removed"])
+        return counts["removed"]
+
+    async def _run_change_stream(self) -> None:
+        # Open the stream before catching up so nothing lands between the two.
+        async with mongodb_client.watch_project_changes(resume_after=self._resume_token) as stream:
+            await self.sync_once()
+            while not self._stopping:
+                upserts: List[Dict[str, Any]] = []
+                deletes: List[Any] = []
+                watermark = None
+
+                change = await stream.try_next()
+                while change is not None:
+                    self._resume_token = stream.resume_token
+                    operation = change.get("operationType")
+                    if operation == "delete":
+                        deletes.append(change["documentKey"]["_id"])
+                    else:
+                        document = change.get("fullDocument")
+                        if document is None:
+                            # Deleted before the update lookup ran.
+                            deletes.append(change["documentKey"]["_id"])
+                        else:
+                            upserts.append(document)
+                            if document.get("updatedAt"):
+                                watermark = max_watermark(watermark, (document["updatedAt"], document["_id"]))
+                    if len(upserts) + len(deletes) >= settings.VECTOR_INDEX_SYNC_BATCH_SIZE:
+                        break
+                    change = await stream.try_next()
+
+                if upserts or deletes:
+                    counts = await vector_index_service.apply_changes(
+                        upserts=upserts,
+                        deletes=deletes,
+                        watermark=watermark,
+                    )
+                    self._add_counts(self._totals, counts)
+                self._last_sync_at = datetime.utcnow()
+
+                if not upserts and not deletes:
+                    await asyncio.sleep(0.5)
+
+    @staticmethod
+    def _add_counts(target: Dict[str, int], counts: Dict[str, int]) -> None:
+        for key, value in counts.items():
+            target[key] = target.get(key, 0) + value
+
+    async def get_health(self) -> Dict[str, Any]:
+        """Index version, watermark and lag behind the newest project write."""
+        stats = vector_index_service.stats()
+        health: Dict[str, Any] = {
+            "ready": stats.get("ready", False),
+            "version": stats.get("version", 0),
+            "vectors": stats.get("vectors", 0),
+            "watermark": stats.get("watermark"),
+            "sync": {
+                "enabled": settings.VECTOR_INDEX_SYNC_ENABLED,
+                "running": self.is_running(),
+                "mode": self._mode,
+                "last_sync_at": self._last_sync_at.isoformat() if self._last_sync_at else None,
+                "last_error": self._last_error,
+                "applied": dict(self._totals),
+            },
+            "lag_seconds": None,
+            "lagging": False,
+        }
+
+        watermark = vector_index_service.watermark
+        try:
+            latest = await mongodb_client.get_latest_update_marker()
+        except PyMongoError as exc:
+            health["lag_error"] = str(exc)
+            return health
+
+        if latest is not None:
+            if watermark is None:
+                lag = (datetime.utcnow() - latest[0]).total_seconds()
+            else:
+                lag = (latest[0] - watermark[0]).total_seconds()
+            health["lag_seconds"] = round(max(0.0, lag), 3)
+            health["lagging"] = health["lag_seconds"] > settings.VECTOR_INDEX_MAX_LAG_SECONDS
+        else:
+            health["lag_seconds"] = 0.0
+        return health
+
+
+index_sync_service = IndexSyncService()
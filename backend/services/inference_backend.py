@@ -0,0 +1,311 @@
+"""Pluggable inference backends for EmbeddingService: PyTorch or an exported ONNX Runtime graph."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from core.config import settings
+
+logger = logging.getLogger("DevFoolU.inference_backend")
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+MANIFEST_FILE = "manifest.json"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+# Short project-like texts for the parity check when no sample is given
+PARITY_TEXTS = (
+    "Project: ChainVote | Description: Decentralized voting on Ethereum with zero-knowledge proofs | Technologies: Solidity, React",
+    "Project: MediScan | Description: Detects pneumonia from chest X-rays with a CNN | Technologies: PyTorch, FastAPI",
+    "Project: FarmLink | Problem: Farmers cannot reach buyers directly | Tags: agriculture, marketplace",
+    "AI study buddy that turns lecture notes into flashcards",
+    "Real-time sign language translation in the browser using MediaPipe hand landmarks",
+    "Carbon footprint tracker for college campuses",
+    "Project: PayPal clone | Technologies: Next.js, Stripe, PostgreSQL",
+    "A",
+)
+
+
+def onnx_dir(model_name: Optional[str] = None) -> Path:
+    """Export directory of a model under EMBEDDING_ONNX_DIR (``/`` in model names becomes ``__``)."""
+    name = (model_name or settings.EMBEDDING_MODEL_NAME).replace("/", "__")
+    return Path(settings.EMBEDDING_ONNX_DIR) / name
+
+
+def read_onnx_manifest(model_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    path = onnx_dir(model_name) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _load_sentence_transformer(model_name: str) -> Any:
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def export_onnx(model_name: Optional[str] = None, quantize: bool = True, opset: int = 14) -> Dict[str, Any]:
+    """
+    Export the transformer of a sentence-transformers model to ONNX (plus a dynamically
+    int8-quantized copy) with its tokenizer, pooling mode and normalization.
+
+    Needs torch, sentence-transformers and onnxruntime; the API only needs onnxruntime and
+    tokenizers afterwards. Files are written to a temporary directory and swapped in, the
+    manifest last, so a reader never sees a half-written export.
+    """
+    import torch
+
+    model_name = model_name or settings.EMBEDDING_MODEL_NAME
+    started = time.perf_counter()
+    st_model = _load_sentence_transformer(model_name)
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    hf_model = transformer.auto_model.eval()
+
+    pooling = next((module for module in st_model if type(module).__name__ == "Pooling"), None)
+    pooling_mode = "mean"
+    if pooling is not None and getattr(pooling, "pooling_mode_cls_token", False):
+        pooling_mode = "cls"
+    elif pooling is not None and getattr(pooling, "pooling_mode_max_tokens", False):
+        pooling_mode = "max"
+    normalize = any(type(module).__name__ == "Normalize" for module in st_model)
+
+    sample = tokenizer(["export sample", "a longer export sample text"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model: Any):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs: Any) -> Any:
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    target = onnx_dir(model_name)
+    staging = target.with_name(target.name + f".tmp-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    try:
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in (*input_names, "last_hidden_state")}
+        with torch.no_grad():
+            torch.onnx.export(
+                _Encoder(hf_model),
+                tuple(sample[name] for name in input_names),
+                str(staging / FP32_FILE),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+                do_constant_folding=True,
+            )
+        tokenizer.save_pretrained(str(staging))
+        if not (staging / TOKENIZER_FILE).exists():
+            raise RuntimeError(f"{model_name} has no fast tokenizer ({TOKENIZER_FILE}); it cannot run without transformers")
+
+        files = {"fp32": FP32_FILE}
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(str(staging / FP32_FILE), str(staging / INT8_FILE), weight_type=QuantType.QInt8)
+            files["int8"] = INT8_FILE
+
+        manifest = {
+            "model": model_name,
+            "dimension": int(st_model.get_sentence_embedding_dimension()),
+            "max_seq_length": int(st_model.max_seq_length),
+            "pooling": pooling_mode,
+            "normalize": normalize,
+            "do_lower_case": bool(getattr(tokenizer, "do_lower_case", False)),
+            "pad_token": tokenizer.pad_token,
+            "pad_token_id": int(tokenizer.pad_token_id),
+            "inputs": input_names,
+            "files": files,
+            "sizes": {kind: (staging / name).stat().st_size for kind, name in files.items()},
+            "opset": opset,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+
+        shutil.rmtree(target, ignore_errors=True)
+        manifest_text = json.dumps(manifest, indent=2)
+        staging.rename(target)
+        (target / MANIFEST_FILE).write_text(manifest_text, encoding="utf-8")
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    logger.info(f"Exported {model_name} to ONNX in {time.perf_counter() - started:.1f}s ({target})")
+    return dict(manifest, path=str(target))
+
+
+class OnnxBackend:
+    """
+    Sentence embeddings from an exported ONNX graph on CPU.
+
+    Mirrors the ``SentenceTransformer`` calls EmbeddingService makes (``encode`` on a
+    string or a list, ``get_sentence_embedding_dimension``) without importing torch.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, quantized: bool = False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        directory = onnx_dir(model_name)
+        manifest = read_onnx_manifest(model_name)
+        if manifest is None:
+            raise FileNotFoundError(f"No ONNX export at {directory}; run `python cli.py export-onnx`")
+        kind = "int8" if quantized else "fp32"
+        if kind not in manifest["files"]:
+            raise FileNotFoundError(f"The ONNX export at {directory} has no {kind} graph; re-export with quantization")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.EMBEDDING_ONNX_THREADS > 0:
+            options.intra_op_num_threads = settings.EMBEDDING_ONNX_THREADS
+        self.session = ort.InferenceSession(
+            str(directory / manifest["files"][kind]),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.tokenizer = Tokenizer.from_file(str(directory / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=manifest["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=manifest["pad_token_id"], pad_token=manifest["pad_token"])
+        self.manifest = manifest
+        self.name = "onnx-int8" if quantized else "onnx"
+        self.do_lower_case = bool(manifest.get("do_lower_case"))
+        self.max_seq_length = int(manifest["max_seq_length"])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.manifest["dimension"])
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.manifest["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        elif self.manifest["pooling"] == "max":
+            pooled = np.where(mask[:, :, None] > 0, hidden, -np.inf).max(axis=1)
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.manifest["normalize"]:
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32, copy=False)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, **_: Any) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+        out = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), max(1, batch_size)):
+            encodings = self.tokenizer.encode_batch(texts[start : start + batch_size])
+            mask = np.asarray([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.asarray([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": mask,
+            }
+            if "token_type_ids" in self.manifest["inputs"]:
+                feeds["token_type_ids"] = np.asarray([encoding.type_ids for encoding in encodings], dtype=np.int64)
+            hidden = self.session.run(None, feeds)[0]
+            out[start : start + len(encodings)] = self._pool(hidden, mask)
+        return out[0] if single else out
+
+
+def load_backend(name: Optional[str] = None) -> Any:
+    """
+    Model object for EmbeddingService: a ``SentenceTransformer`` for ``torch``, an
+    :class:`OnnxBackend` for ``onnx``/``onnx-int8`` (exported first when missing and
+    EMBEDDING_ONNX_AUTO_EXPORT is set).
+    """
+    name = name or settings.EMBEDDING_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'. Available: {', '.join(BACKENDS)}")
+    if name == "torch":
+        return _load_sentence_transformer(settings.EMBEDDING_MODEL_NAME)
+
+    quantized = name == "onnx-int8"
+    manifest = read_onnx_manifest()
+    if manifest is None or ("int8" if quantized else "fp32") not in manifest["files"]:
+        if not settings.EMBEDDING_ONNX_AUTO_EXPORT:
+            raise FileNotFoundError(f"No ONNX export at {onnx_dir()}; run `python cli.py export-onnx`")
+        logger.info("No ONNX export found; exporting now (needs torch once)")
+        export_onnx(quantize=True)
+    return OnnxBackend(quantized=quantized)
+
+
+def lowercases_input(model: Any) -> bool:
+    """Whether the model's tokenizer lowercases text, so queries differing in case embed the same."""
+    if isinstance(model, OnnxBackend):
+        return model.do_lower_case
+    return bool(getattr(getattr(model, "tokenizer", None), "do_lower_case", False))
+
+
+def counting_tokenizer(model: Any) -> Optional[Any]:
+    """
+    Copy of the model's fast tokenizer with truncation and padding off, for measuring
+    text in word pieces; None when the model has no ``tokenizers``-backed tokenizer.
+    """
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:  # pragma: no cover - installed with transformers and for ONNX
+        return None
+    if isinstance(model, OnnxBackend):
+        source = model.tokenizer
+    else:
+        source = getattr(getattr(model, "tokenizer", None), "backend_tokenizer", None)
+    if source is None:
+        return None
+    tokenizer = Tokenizer.from_str(source.to_str())
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+
+def token_budget(model: Any, tokenizer: Any) -> int:
+    """Word pieces of text the model reads per input: its sequence length minus special tokens."""
+    max_length = int(getattr(model, "max_seq_length", 0) or 0)
+    processor = getattr(tokenizer, "post_processor", None)
+    special = processor.num_special_tokens_to_add(False) if processor is not None else 0
+    return max(0, max_length - special)
+
+
+def parity_check(backend: str = "onnx-int8", texts: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Cosine agreement of ``backend`` with the PyTorch model on ``texts`` (default: built-in
+    samples), recorded in the export manifest. Passes when every text reaches
+    EMBEDDING_ONNX_PARITY_MIN_COSINE.
+    """
+    if backend == "torch":
+        raise ValueError("Compare an ONNX backend against torch")
+    texts = list(texts or PARITY_TEXTS)
+    reference = np.asarray(_load_sentence_transformer(settings.EMBEDDING_MODEL_NAME).encode(texts), dtype=np.float32)
+    candidate_model = load_backend(backend)
+    started = time.perf_counter()
+    candidate = np.asarray(candidate_model.encode(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - started
+
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    cosines = (reference * candidate).sum(axis=1) / np.maximum(norms, 1e-12)
+    result = {
+        "backend": backend,
+        "texts": len(texts),
+        "min_cosine": round(float(cosines.min()), 6),
+        "mean_cosine": round(float(cosines.mean()), 6),
+        "threshold": settings.EMBEDDING_ONNX_PARITY_MIN_COSINE,
+        "passed": bool(cosines.min() >= settings.EMBEDDING_ONNX_PARITY_MIN_COSINE),
+        "ms_per_text": round(1000.0 * elapsed / len(texts), 3),
+        "checked_at": datetime.utcnow().isoformat(),
+    }
+
+    manifest = read_onnx_manifest()
+    if manifest is not None:
+        manifest.setdefault("parity", {})[backend] = result
+        (onnx_dir() / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return result
@@ -0,0 +1,359 @@
+"""IVF-flat approximate index: mini-batch k-means lists stored as contiguous float32 blocks."""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from core.config import settings
+from services.ann_index import (
+    AnnBackend,
+    Artifact,
+    Candidates,
+    gather_rows,
+    iter_row_blocks,
+    select_top_k,
+    top_k_indices,
+)
+
+logger = logging.getLogger("DevFoolU.ivf_index")
+
+
+def default_nlist(count: int) -> int:
+    configured = settings.VECTOR_INDEX_IVF_NLIST
+    nlist = configured if configured > 0 else int(4 * math.sqrt(max(1, count)))
+    return max(1, min(nlist, count))
+
+
+def _normalize_rows(matrix: np.ndarray) -> None:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    matrix /= norms
+
+
+def mini_batch_kmeans(
+    state: Any,
+    rows: np.ndarray,
+    nlist: int,
+    iterations: int,
+    batch_size: int,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Spherical mini-batch k-means (Sculley, 2010) over the given index rows.
+
+    Each batch moves a centroid towards the mean of its assigned points with a
+    per-centroid learning rate of ``1 / points_seen``; centroids stay unit length so
+    assignment is a single matrix product. Only one batch is resident at a time.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = gather_rows(state, rng.choice(rows, size=nlist, replace=False))
+    _normalize_rows(centroids)
+    seen = np.zeros(nlist, dtype=np.float64)
+    batch_size = max(nlist, batch_size)
+
+    for _ in range(max(1, iterations)):
+        batch = gather_rows(state, rng.choice(rows, size=batch_size, replace=batch_size > rows.size))
+        assignment = np.argmax(batch @ centroids.T, axis=1)
+
+        order = np.argsort(assignment, kind="stable")
+        clusters, starts, counts = np.unique(assignment[order], return_index=True, return_counts=True)
+        sums = np.add.reduceat(batch[order], starts, axis=0)
+        seen[clusters] += counts
+        rate = (counts / seen[clusters]).astype(np.float32)[:, None]
+        centroids[clusters] += rate * (sums / counts[:, None].astype(np.float32) - centroids[clusters])
+        _normalize_rows(centroids)
+
+    empty = np.flatnonzero(seen == 0)
+    if empty.size:
+        # Reseed centroids that never won a point so every list can receive upserts.
+        centroids[empty] = gather_rows(state, rng.choice(rows, size=empty.size, replace=False))
+        _normalize_rows(centroids)
+    return centroids
+
+
+def assign_to_centroids(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid for every row, scanned in blocks."""
+    assignment = np.empty(matrix.shape[0], dtype=np.int32)
+    for start, block in iter_row_blocks(matrix):
+        assignment[start : start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+class _IvfLayout:
+    """
+    Inverted lists for one base matrix.
+
+    ``vectors[offsets[l]:offsets[l + 1]]`` holds the live base rows of list ``l`` and
+    ``rows`` maps each block row back to its index row. Rows appended after the layout
+    was built are tracked by ``tail_lists`` (list id per tail row), which grows by
+    replacement as deltas arrive. ``min_cos`` (per list, computed on first range search)
+    bounds how far a list's vectors stray from its centroid.
+    """
+
+    __slots__ = ("base", "centroids", "offsets", "rows", "vectors", "tail_lists", "min_cos", "built_at")
+
+    def __init__(
+        self,
+        base: np.ndarray,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        vectors: np.ndarray,
+        built_at: Optional[str] = None,
+    ):
+        self.base = base
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.vectors = vectors
+        self.tail_lists = np.empty(0, dtype=np.int32)
+        self.min_cos: Optional[np.ndarray] = None
+        self.built_at = built_at or datetime.utcnow().isoformat()
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+
+def build_layout(state: Any, centroids: np.ndarray) -> _IvfLayout:
+    """Assign every live base row to its nearest centroid and pack the lists contiguously."""
+    base = state.base
+    base_rows = base.shape[0]
+    assignment = assign_to_centroids(base, centroids)
+    if state.dead_count:
+        live_rows = np.flatnonzero(state.live[:base_rows])
+        assignment = assignment[live_rows]
+    else:
+        live_rows = np.arange(base_rows, dtype=np.int64)
+
+    order = np.argsort(assignment, kind="stable")
+    rows = live_rows[order].astype(np.int64)
+    offsets = np.zeros(centroids.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=centroids.shape[0]), out=offsets[1:])
+
+    vectors = np.empty((rows.size, base.shape[1]), dtype=np.float32)
+    for start in range(0, rows.size, 65536):
+        chunk = rows[start : start + 65536]
+        vectors[start : start + chunk.size] = base[chunk]
+
+    layout = _IvfLayout(base, centroids, offsets, rows, vectors)
+    _extend_tail(layout, state)
+    return layout
+
+
+def list_min_cosines(layout: _IvfLayout) -> np.ndarray:
+    """Smallest cosine between each list's centroid and its vectors (1.0 for empty lists)."""
+    sizes = np.diff(layout.offsets)
+    list_ids = np.repeat(np.arange(layout.nlist), sizes)
+    dots = np.empty(layout.rows.size, dtype=np.float32)
+    for start, block in iter_row_blocks(layout.vectors):
+        ids = list_ids[start : start + block.shape[0]]
+        dots[start : start + block.shape[0]] = np.einsum("ij,ij->i", block, layout.centroids[ids])
+    min_cos = np.ones(layout.nlist, dtype=np.float32)
+    filled = sizes > 0
+    if dots.size:
+        min_cos[filled] = np.minimum.reduceat(dots, layout.offsets[:-1][filled])
+    return min_cos
+
+
+def _extend_tail(layout: _IvfLayout, state: Any) -> None:
+    assigned = layout.tail_lists.size
+    if state.tail_count > assigned:
+        fresh = assign_to_centroids(state.tail[assigned : state.tail_count], layout.centroids)
+        layout.tail_lists = np.concatenate([layout.tail_lists, fresh])
+
+
+class IvfIndex(AnnBackend):
+    """Probes the ``nprobe`` lists whose centroids are closest to the query."""
+
+    name = "ivf"
+    artifact_keys = ("centroids", "offsets", "rows", "vectors")
+    mmap_keys = ("vectors",)
+
+    def __init__(self):
+        self._layout: Optional[_IvfLayout] = None
+        self._train_seconds: Optional[float] = None
+
+    def is_trained(self) -> bool:
+        return self._layout is not None
+
+    def is_ready(self, state: Any) -> bool:
+        layout = self._layout
+        return layout is not None and layout.base is state.base
+
+    def train(self, state: Any) -> None:
+        started = time.perf_counter()
+        rows = np.flatnonzero(state.live)
+        nlist = default_nlist(rows.size)
+        centroids = mini_batch_kmeans(
+            state,
+            rows,
+            nlist,
+            iterations=settings.VECTOR_INDEX_IVF_TRAIN_ITERATIONS,
+            batch_size=settings.VECTOR_INDEX_IVF_TRAIN_BATCH_SIZE,
+        )
+        self._layout = build_layout(state, centroids)
+        self._train_seconds = time.perf_counter() - started
+        logger.info(
+            "IVF index trained: %s lists over %s vectors in %.2fs",
+            nlist,
+            rows.size,
+            self._train_seconds,
+        )
+
+    def refresh(self, state: Any) -> None:
+        layout = self._layout
+        if layout is None:
+            return
+        if layout.base is not state.base:
+            # New base (load, compaction, snapshot): keep the centroids, reassign rows.
+            self._layout = build_layout(state, layout.centroids)
+            return
+        _extend_tail(layout, state)
+
+    def search(self, state: Any, query: np.ndarray, top_k: int, **params: Any) -> Optional[Candidates]:
+        layout = self._layout
+        if layout is None or layout.base is not state.base:
+            return None
+
+        nprobe = params.get("nprobe") or settings.VECTOR_INDEX_IVF_NPROBE
+        nprobe = max(1, min(int(nprobe), layout.nlist))
+        probe = top_k_indices(layout.centroids @ query, nprobe)
+
+        row_parts = []
+        score_parts = []
+        offsets = layout.offsets
+        for list_id in probe:
+            start, end = offsets[list_id], offsets[list_id + 1]
+            if start == end:
+                continue
+            row_parts.append(layout.rows[start:end])
+            score_parts.append(layout.vectors[start:end] @ query)
+
+        if state.tail_count:
+            tail_lists = layout.tail_lists[: state.tail_count]
+            # Rows not yet assigned (refresh still pending) are always scored.
+            selected = np.concatenate(
+                [
+                    np.flatnonzero(np.isin(tail_lists, probe)),
+                    np.arange(tail_lists.size, state.tail_count),
+                ]
+            )
+            if selected.size:
+                row_parts.append(selected + state.base.shape[0])
+                score_parts.append(state.tail[selected] @ query)
+
+        if not row_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return select_top_k(state, np.concatenate(row_parts), np.concatenate(score_parts), top_k)
+
+    def range_search(
+        self,
+        state: Any,
+        query: np.ndarray,
+        threshold: float,
+        limit: int,
+        **params: Any,
+    ) -> Optional[Candidates]:
+        """
+        Exact range search that skips lists which cannot reach ``threshold``.
+
+        On the unit sphere ``angle(q, x) >= angle(q, c) - angle(c, x)``, so a list whose
+        centroid is farther from the query than its widest member by more than
+        ``arccos(threshold)`` holds no match. Rows appended since the layout was built
+        are always scored.
+        """
+        layout = self._layout
+        if layout is None or layout.base is not state.base:
+            return None
+        if layout.min_cos is None:
+            layout.min_cos = list_min_cosines(layout)
+
+        centroid_angle = np.arccos(np.clip(layout.centroids @ query, -1.0, 1.0))
+        spread = np.arccos(np.clip(layout.min_cos, -1.0, 1.0))
+        bound = np.cos(np.maximum(0.0, centroid_angle - spread))
+        # Slack for float32 rounding in the stored vectors and centroids
+        probe = np.flatnonzero(bound >= threshold - 1e-4)
+
+        row_parts = []
+        score_parts = []
+        offsets = layout.offsets
+        for list_id in probe:
+            start, end = offsets[list_id], offsets[list_id + 1]
+            if start == end:
+                continue
+            row_parts.append(layout.rows[start:end])
+            score_parts.append(layout.vectors[start:end] @ query)
+        if state.tail_count:
+            row_parts.append(np.arange(state.base.shape[0], state.size, dtype=np.int64))
+            score_parts.append(state.tail[: state.tail_count] @ query)
+        if not row_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows, scores = np.concatenate(row_parts), np.concatenate(score_parts)
+        keep = scores >= threshold
+        return select_top_k(state, rows[keep], scores[keep], limit)
+
+    def artifact(self) -> Optional[Artifact]:
+        layout = self._layout
+        if layout is None:
+            return None
+        arrays = {
+            "centroids": layout.centroids,
+            "offsets": layout.offsets,
+            "rows": layout.rows,
+            "vectors": layout.vectors,
+        }
+        return arrays, {"nlist": layout.nlist, "built_at": layout.built_at}
+
+    def restore(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], state: Any) -> bool:
+        rows = arrays["rows"]
+        if rows.size and int(rows.max()) >= state.base.shape[0]:
+            return False
+        if arrays["vectors"].shape != (rows.size, state.base.shape[1]):
+            return False
+        layout = _IvfLayout(
+            state.base,
+            np.asarray(arrays["centroids"], dtype=np.float32),
+            arrays["offsets"],
+            rows,
+            arrays["vectors"],
+            built_at=meta.get("built_at"),
+        )
+        _extend_tail(layout, state)
+        self._layout = layout
+        return True
+
+    def reset(self) -> None:
+        self._layout = None
+
+    def stats(self) -> Dict[str, Any]:
+        layout = self._layout
+        if layout is None:
+            return {"trained": False}
+        sizes = np.diff(layout.offsets)
+        mapped = isinstance(layout.vectors, np.memmap)
+        return {
+            "trained": True,
+            "nlist": layout.nlist,
+            "nprobe": settings.VECTOR_INDEX_IVF_NPROBE,
+            "vectors": int(layout.rows.size + layout.tail_lists.size),
+            "list_size_min": int(sizes.min()) if sizes.size else 0,
+            "list_size_max": int(sizes.max()) if sizes.size else 0,
+            "list_size_mean": round(float(sizes.mean()), 1) if sizes.size else 0.0,
+            "memory_bytes": int(
+                layout.centroids.nbytes
+                + layout.rows.nbytes
+                + layout.tail_lists.nbytes
+                + (0 if mapped else layout.vectors.nbytes)
+            ),
+            "mapped_bytes": int(layout.vectors.nbytes) if mapped else 0,
+            "built_at": layout.built_at,
+            "train_seconds": self._train_seconds,
+        }
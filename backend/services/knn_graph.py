@@ -0,0 +1,374 @@
+"""Precomputed k-nearest-neighbour lists for every indexed project."""
+
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from services.ann_index import AnnBackend, Artifact, Candidates, gather_rows, top_k_rows
+
+logger = logging.getLogger("DevFoolU.knn_graph")
+
+# Upper bound on one (rows x corpus) float32 score block while computing lists
+_BLOCK_BYTES = 64 * 1024 * 1024
+# The patch overlay is folded back into the arrays once it covers this share of rows
+_FOLD_RATIO = 0.1
+
+_NEG_INF = np.float32(-np.inf)
+
+# (neighbour rows, float16 scores) for one row, best first
+KnnList = Tuple[np.ndarray, np.ndarray]
+
+
+def _iter_score_blocks(state: Any, rows: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield ``(rows, scores)`` blocks of exact scores against the whole index, self-matches masked."""
+    block = max(1, _BLOCK_BYTES // (4 * max(1, state.size)))
+    for start in range(0, rows.size, block):
+        block_rows = rows[start : start + block]
+        scores = state.score_batch(gather_rows(state, block_rows))
+        scores[np.arange(block_rows.size), block_rows] = _NEG_INF
+        yield block_rows, scores
+
+
+def _top_lists(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Best ``k`` entries per score row, padded with ``-1``/``-inf``, plus the best excluded score."""
+    width = min(k + 1, scores.shape[1])
+    order = top_k_rows(scores, width)
+    values = np.take_along_axis(scores, order, axis=1)
+    valid = np.isfinite(values)
+
+    neighbors = np.full((scores.shape[0], k), -1, dtype=np.int32)
+    kept = min(k, width)
+    neighbors[:, :kept] = np.where(valid[:, :kept], order[:, :kept], -1)
+    list_scores = np.full((scores.shape[0], k), _NEG_INF, dtype=np.float16)
+    list_scores[:, :kept] = np.where(valid[:, :kept], values[:, :kept], _NEG_INF)
+
+    thresholds = np.full(scores.shape[0], _NEG_INF, dtype=np.float32)
+    if width > k:
+        thresholds[:] = np.where(valid[:, k], values[:, k], _NEG_INF)
+    return neighbors, list_scores, thresholds
+
+
+def _grown(array: np.ndarray, size: int, fill: Any) -> np.ndarray:
+    """Heap copy of ``array`` extended to ``size`` entries."""
+    out = np.full(size, fill, dtype=array.dtype)
+    out[: min(size, array.size)] = array[:size]
+    return out
+
+
+class _KnnLayout:
+    """
+    Neighbour lists over one base matrix.
+
+    ``neighbors``/``scores`` hold one K-wide list per row (best first, padded with
+    ``-1``/``-inf``) and may be memory-mapped. Lists rewritten since the arrays were
+    built live in ``patched``, which is replaced rather than mutated so lookups on the
+    event loop always see a whole list. ``thresholds[row]`` bounds the score of every
+    project left out of the list: insertions must beat it, which keeps the live entries
+    an exact prefix of the ranking however many projects were added or removed since.
+    """
+
+    __slots__ = ("base", "state", "neighbors", "scores", "covered", "thresholds", "patched", "built_at")
+
+    def __init__(
+        self,
+        state: Any,
+        neighbors: np.ndarray,
+        scores: np.ndarray,
+        covered: np.ndarray,
+        thresholds: np.ndarray,
+        patched: Optional[Dict[int, KnnList]] = None,
+        built_at: Optional[str] = None,
+    ):
+        self.base = state.base
+        self.state = state
+        self.neighbors = neighbors
+        self.scores = scores
+        self.covered = covered
+        self.thresholds = thresholds
+        self.patched = patched if patched is not None else {}
+        self.built_at = built_at or datetime.utcnow().isoformat()
+
+    def list(self, row: int) -> KnnList:
+        patched = self.patched.get(row)
+        if patched is not None:
+            return patched
+        if row < self.neighbors.shape[0]:
+            return self.neighbors[row], self.scores[row]
+        return np.full(self.neighbors.shape[1], -1, dtype=np.int32), np.full(self.neighbors.shape[1], _NEG_INF, dtype=np.float16)
+
+    def materialized(self, rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Heap arrays for the first ``rows`` lists with the overlay applied."""
+        k = self.neighbors.shape[1]
+        neighbors = np.full((rows, k), -1, dtype=np.int32)
+        scores = np.full((rows, k), _NEG_INF, dtype=np.float16)
+        stored = min(rows, self.neighbors.shape[0])
+        neighbors[:stored] = self.neighbors[:stored]
+        scores[:stored] = self.scores[:stored]
+        for row, (row_neighbors, row_scores) in self.patched.items():
+            if row < rows:
+                neighbors[row] = row_neighbors
+                scores[row] = row_scores
+        return neighbors, scores
+
+
+class KnnGraph(AnnBackend):
+    """
+    Top-K neighbour list per indexed project, so "similar to this project" is a lookup.
+
+    Built offline with blocked matrix-matrix products; projects appended by deltas are
+    scored against the corpus and inserted into the lists they now belong to. Lookups
+    return None (callers fall back to live search) while a row is not covered yet.
+    Not a query backend: :meth:`search` always declines.
+    """
+
+    name = "knn"
+    artifact_keys = ("neighbors", "scores", "covered", "thresholds")
+    mmap_keys = ("neighbors", "scores")
+
+    def __init__(self):
+        self._layout: Optional[_KnnLayout] = None
+        self._train_seconds: Optional[float] = None
+
+    @property
+    def k(self) -> int:
+        return max(1, settings.VECTOR_INDEX_KNN_K)
+
+    def is_trained(self) -> bool:
+        return self._layout is not None
+
+    def is_ready(self, state: Any) -> bool:
+        layout = self._layout
+        return layout is not None and layout.base is state.base
+
+    def search(self, state: Any, query: np.ndarray, top_k: int, **params: Any) -> Optional[Candidates]:
+        return None
+
+    def neighbors(self, state: Any, row: int, top_k: int) -> Optional[Candidates]:
+        """Best ``top_k`` live neighbours of ``row``, or None when the list cannot answer exactly."""
+        layout = self._layout
+        if layout is None or layout.state.version != state.version:
+            # A delta is being folded in; the lists may miss its projects.
+            return None
+        if row >= layout.covered.size or not layout.covered[row]:
+            return None
+
+        rows, scores = layout.list(row)
+        keep = rows >= 0
+        rows, scores = rows[keep], scores[keep]
+        if state.dead_count and rows.size:
+            live = state.live[rows]
+            rows, scores = rows[live], scores[live]
+        if rows.size < min(top_k, state.live_count - 1):
+            return None
+        return rows[:top_k].astype(np.int64), scores[:top_k].astype(np.float32)
+
+    # -- construction ---------------------------------------------------------
+
+    def train(self, state: Any) -> None:
+        started = time.perf_counter()
+        k = self.k
+        neighbors = np.full((state.size, k), -1, dtype=np.int32)
+        scores = np.full((state.size, k), _NEG_INF, dtype=np.float16)
+        thresholds = np.full(state.size, _NEG_INF, dtype=np.float32)
+        rows = np.flatnonzero(state.live)
+        for block_rows, block_scores in _iter_score_blocks(state, rows):
+            neighbors[block_rows], scores[block_rows], thresholds[block_rows] = _top_lists(block_scores, k)
+        covered = np.zeros(state.size, dtype=bool)
+        covered[rows] = True
+
+        self._layout = _KnnLayout(state, neighbors, scores, covered, thresholds)
+        self._train_seconds = time.perf_counter() - started
+        logger.info("kNN graph built: %s lists of %s neighbours in %.1fs", rows.size, k, self._train_seconds)
+
+    def refresh(self, state: Any) -> None:
+        layout = self._layout
+        if layout is None:
+            return
+        if layout.base is not state.base:
+            layout = self._remap(layout, state)
+        self._layout = self._catch_up(layout, state)
+
+    def _catch_up(self, layout: _KnnLayout, state: Any) -> _KnnLayout:
+        """Compute lists for live rows that have none and insert those rows into existing lists."""
+        covered = _grown(layout.covered, state.size, False)
+        pending = np.flatnonzero(state.live & ~covered)
+        if pending.size == 0:
+            return _KnnLayout(
+                state,
+                layout.neighbors,
+                layout.scores,
+                covered,
+                _grown(layout.thresholds, state.size, _NEG_INF),
+                layout.patched,
+                layout.built_at,
+            )
+
+        k = self.k
+        eligible = covered.copy()
+        thresholds = _grown(layout.thresholds, state.size, _NEG_INF)
+        patched = dict(layout.patched)
+        current = _KnnLayout(state, layout.neighbors, layout.scores, covered, thresholds, patched, layout.built_at)
+
+        for block_rows, block_scores in _iter_score_blocks(state, pending):
+            block_neighbors, block_list_scores, block_thresholds = _top_lists(block_scores, k)
+            for offset, row in enumerate(block_rows.tolist()):
+                patched[row] = (block_neighbors[offset], block_list_scores[offset])
+            thresholds[block_rows] = block_thresholds
+
+            # Existing lists each new row now belongs to
+            beats = block_scores > thresholds[None, :]
+            beats[:, ~eligible] = False
+            for target in np.flatnonzero(beats.any(axis=0)).tolist():
+                candidates = np.flatnonzero(beats[:, target])
+                patched[target], thresholds[target] = self._merged(
+                    current, state, target, block_rows[candidates], block_scores[candidates, target], k
+                )
+        covered[pending] = True
+
+        if len(patched) > _FOLD_RATIO * max(1, state.size):
+            neighbors, scores = current.materialized(state.size)
+            return _KnnLayout(state, neighbors, scores, covered, thresholds, built_at=layout.built_at)
+        return current
+
+    @staticmethod
+    def _merged(
+        layout: _KnnLayout,
+        state: Any,
+        row: int,
+        new_rows: np.ndarray,
+        new_scores: np.ndarray,
+        k: int,
+    ) -> Tuple[KnnList, np.float32]:
+        """``row``'s list with ``new_rows`` inserted; entries pushed out raise its threshold."""
+        rows, scores = layout.list(row)
+        keep = rows >= 0
+        keep[keep] &= state.live[rows[keep]]
+        rows = np.concatenate([rows[keep].astype(np.int64), new_rows])
+        scores = np.concatenate([scores[keep].astype(np.float32), new_scores.astype(np.float32)])
+        order = np.argsort(-scores, kind="stable")
+
+        threshold = layout.thresholds[row]
+        if order.size > k:
+            threshold = max(threshold, np.float32(scores[order[k]]))
+            order = order[:k]
+        merged_rows = np.full(k, -1, dtype=np.int32)
+        merged_scores = np.full(k, _NEG_INF, dtype=np.float16)
+        merged_rows[: order.size] = rows[order]
+        merged_scores[: order.size] = scores[order]
+        return (merged_rows, merged_scores), threshold
+
+    def _remap(self, layout: _KnnLayout, state: Any) -> _KnnLayout:
+        """
+        Carry the lists over to a new base matrix (reload, compaction, snapshot).
+
+        Rows are matched by project id and unchanged vector; entries for dropped rows are
+        removed (thresholds stay, so the lists remain exact prefixes) and unmatched rows
+        are left uncovered for :meth:`_catch_up`.
+        """
+        old = layout.state
+        old_count = min(layout.covered.size, old.size)
+        new_rows = np.full(old_count + 1, -1, dtype=np.int64)  # trailing slot maps -1 to -1
+        for row in np.flatnonzero(layout.covered[:old_count] & old.live[:old_count]).tolist():
+            new_rows[row] = state.row_by_id.get(old.ids[row], -1)
+        kept = np.flatnonzero(new_rows[:old_count] >= 0)
+        if kept.size:
+            same = np.all(
+                np.isclose(gather_rows(old, kept), gather_rows(state, new_rows[kept]), atol=1e-6),
+                axis=1,
+            )
+            new_rows[kept[~same]] = -1
+            kept = kept[same]
+
+        old_neighbors, old_scores = layout.materialized(old_count)
+        mapped = new_rows[old_neighbors[kept]]
+        # Stable sort moves dropped entries to the end of each list without reordering the rest
+        order = np.argsort(mapped < 0, axis=1, kind="stable")
+        mapped = np.take_along_axis(mapped, order, axis=1)
+        mapped_scores = np.take_along_axis(old_scores[kept], order, axis=1)
+        mapped_scores[mapped < 0] = _NEG_INF
+
+        k = old_neighbors.shape[1]
+        neighbors = np.full((state.size, k), -1, dtype=np.int32)
+        scores = np.full((state.size, k), _NEG_INF, dtype=np.float16)
+        covered = np.zeros(state.size, dtype=bool)
+        thresholds = np.full(state.size, _NEG_INF, dtype=np.float32)
+        targets = new_rows[kept]
+        neighbors[targets] = mapped
+        scores[targets] = mapped_scores
+        covered[targets] = True
+        thresholds[targets] = layout.thresholds[kept]
+        logger.info("kNN graph remapped: kept %s of %s lists", kept.size, old_count)
+        return _KnnLayout(state, neighbors, scores, covered, thresholds, built_at=layout.built_at)
+
+    # -- persistence ----------------------------------------------------------
+
+    def artifact(self) -> Optional[Artifact]:
+        layout = self._layout
+        if layout is None:
+            return None
+        # Only base rows exist in the snapshot; appended rows are re-inserted on load.
+        base_rows = layout.base.shape[0]
+        neighbors, scores = layout.materialized(base_rows)
+        outside = neighbors >= base_rows
+        if outside.any():
+            order = np.argsort(outside, axis=1, kind="stable")
+            neighbors = np.take_along_axis(neighbors, order, axis=1)
+            scores = np.take_along_axis(scores, order, axis=1)
+            outside = np.take_along_axis(outside, order, axis=1)
+            neighbors[outside] = -1
+            scores[outside] = _NEG_INF
+        arrays = {
+            "neighbors": neighbors,
+            "scores": scores,
+            "covered": _grown(layout.covered, base_rows, False),
+            "thresholds": _grown(layout.thresholds, base_rows, _NEG_INF),
+        }
+        return arrays, {"k": int(neighbors.shape[1]), "built_at": layout.built_at}
+
+    def restore(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], state: Any) -> bool:
+        neighbors = arrays["neighbors"]
+        base_rows = state.base.shape[0]
+        if meta.get("k") != self.k or neighbors.shape != (base_rows, self.k):
+            return False
+        layout = _KnnLayout(
+            state,
+            neighbors,
+            arrays["scores"],
+            np.asarray(arrays["covered"], dtype=bool),
+            np.asarray(arrays["thresholds"], dtype=np.float32),
+            built_at=meta.get("built_at"),
+        )
+        self._layout = self._catch_up(layout, state)
+        return True
+
+    def reset(self) -> None:
+        self._layout = None
+
+    def stats(self) -> Dict[str, Any]:
+        layout = self._layout
+        if layout is None:
+            return {"trained": False}
+        state = layout.state
+        covered = layout.covered[: state.size] & state.live
+        mapped = isinstance(layout.neighbors, np.memmap)
+        array_bytes = int(layout.neighbors.nbytes + layout.scores.nbytes)
+        patched_bytes = sum(rows.nbytes + scores.nbytes for rows, scores in layout.patched.values())
+        return {
+            "trained": True,
+            "k": int(layout.neighbors.shape[1]),
+            "lists": int(covered.sum()),
+            "pending": int(state.live_count - covered.sum()),
+            "patched_lists": len(layout.patched),
+            "memory_bytes": int(
+                (0 if mapped else array_bytes) + layout.covered.nbytes + layout.thresholds.nbytes + patched_bytes
+            ),
+            "mapped_bytes": array_bytes if mapped else 0,
+            "built_at": layout.built_at,
+            "train_seconds": self._train_seconds,
+        }
@@ -0,0 +1,403 @@
+"""In-process BM25 inverted index over project text, for lexical and hybrid search."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import re
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from services.ann_index import AnnBackend, Artifact, Candidates, top_k_indices
+
+logger = logging.getLogger("DevFoolU.lexical_index")
+
+# Term frequencies count a match in the name three times as much as one in the description
+FIELD_WEIGHTS = {
+    "nameOfProject": 3,
+    "tagLine": 2,
+    "technologiesUsed": 2,
+    "tagsOfProject": 2,
+    "descriptionOfProject": 1,
+}
+
+_K1 = 1.2
+_B = 0.75
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.+#][a-z0-9+#]*)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was we with our you your".split()
+)
+# Appended postings are folded into the packed arrays once they reach this share of them
+_TAIL_MERGE_RATIO = 0.1
+
+TermCounts = Dict[str, int]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case terms; dotted names (``node.js``) also yield their parts."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        token = token.rstrip(".")
+        if not token or token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if "." in token:
+            tokens.extend(part for part in token.split(".") if part and part not in _STOPWORDS)
+    return tokens
+
+
+def _field_text(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value if item)
+    return str(value or "")
+
+
+def document_terms(doc: Mapping[str, Any]) -> TermCounts:
+    """Field-weighted term frequencies of a project document."""
+    counts: TermCounts = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(_field_text(doc.get(field))):
+            counts[token] = counts.get(token, 0) + weight
+    return counts
+
+
+def _terms_hash(terms: TermCounts) -> int:
+    payload = "\x1f".join(f"{term}\x1e{count}" for term, count in sorted(terms.items()))
+    return int.from_bytes(hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class PostingsBuilder:
+    """Collects ``(term, row, tf)`` triples in flat typed arrays while the index loads."""
+
+    def __init__(self):
+        self.vocabulary: Dict[str, int] = {}
+        self._terms = array("i")
+        self._rows = array("i")
+        self._tfs = array("H")
+        self.lengths: Dict[int, float] = {}
+        self.hashes: Dict[int, int] = {}
+
+    def add(self, row: int, terms: TermCounts) -> None:
+        for term, tf in terms.items():
+            self._terms.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+            self._rows.append(row)
+            self._tfs.append(min(tf, 0xFFFF))
+        self.lengths[row] = float(sum(terms.values()))
+        self.hashes[row] = _terms_hash(terms)
+
+    def packed(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """Vocabulary plus CSR postings (offsets, rows sorted within each term, tfs)."""
+        term_ids = np.frombuffer(self._terms, dtype=np.int32)
+        rows = np.frombuffer(self._rows, dtype=np.int32)
+        tfs = np.frombuffer(self._tfs, dtype=np.uint16)
+        order = np.lexsort((rows, term_ids))
+        offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocabulary)), out=offsets[1:])
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.__getitem__)
+        return vocabulary, offsets, rows[order].copy(), tfs[order].copy()
+
+
+class _PostingLayout:
+    """Packed postings for the base rows plus per-term postings of rows appended since."""
+
+    __slots__ = ("base", "state", "terms", "offsets", "rows", "tfs", "tail", "tail_postings", "lengths", "hashes", "built_at")
+
+    def __init__(
+        self,
+        state: Any,
+        terms: Dict[str, int],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray,
+        lengths: np.ndarray,
+        hashes: np.ndarray,
+        tail: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+        built_at: Optional[str] = None,
+    ):
+        self.base = state.base
+        self.state = state
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.lengths = lengths
+        self.hashes = hashes
+        self.tail = tail or {}
+        self.tail_postings = sum(tail_rows.size for tail_rows, _tfs in self.tail.values())
+        self.built_at = built_at or datetime.utcnow().isoformat()
+
+    @property
+    def size(self) -> int:
+        return int(self.lengths.size)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        term_id = self.terms.get(term)
+        tail = self.tail.get(term)
+        if term_id is None:
+            return tail if tail is not None else (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint16))
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        if tail is None:
+            return self.rows[start:end], self.tfs[start:end]
+        return np.concatenate([self.rows[start:end], tail[0]]), np.concatenate([self.tfs[start:end], tail[1]])
+
+    def triples(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """Every posting as parallel (term id, row, tf) arrays over a merged vocabulary."""
+        vocabulary = sorted(self.terms, key=self.terms.__getitem__)
+        vocabulary += [term for term in self.tail if term not in self.terms]
+        ids = {term: position for position, term in enumerate(vocabulary)}
+        term_ids = [np.repeat(np.arange(len(self.terms), dtype=np.int32), np.diff(self.offsets))]
+        rows, tfs = [self.rows], [self.tfs]
+        for term, (tail_rows, tail_tfs) in self.tail.items():
+            term_ids.append(np.full(tail_rows.size, ids[term], dtype=np.int32))
+            rows.append(tail_rows)
+            tfs.append(tail_tfs)
+        return vocabulary, np.concatenate(term_ids), np.concatenate(rows), np.concatenate(tfs)
+
+
+def _pack(vocabulary: List[str], term_ids: np.ndarray, rows: np.ndarray, tfs: np.ndarray) -> Tuple[Dict[str, int], np.ndarray, np.ndarray, np.ndarray]:
+    """CSR over ``vocabulary``, dropping terms left without postings."""
+    counts = np.bincount(term_ids, minlength=len(vocabulary))
+    used = np.flatnonzero(counts)
+    renumber = np.full(len(vocabulary), -1, dtype=np.int32)
+    renumber[used] = np.arange(used.size, dtype=np.int32)
+    term_ids = renumber[term_ids]
+    order = np.lexsort((rows, term_ids))
+    offsets = np.zeros(used.size + 1, dtype=np.int64)
+    np.cumsum(counts[used], out=offsets[1:])
+    terms = {vocabulary[term_id]: position for position, term_id in enumerate(used.tolist())}
+    return terms, offsets, rows[order].astype(np.int32), tfs[order].astype(np.uint16)
+
+
+class LexicalIndex(AnnBackend):
+    """
+    BM25 over project name, tagline, description, technologies and tags.
+
+    Postings for the base rows are packed CSR arrays (``int32`` rows, ``uint16`` field-
+    weighted term frequencies); rows appended by deltas go to small per-term tails that
+    are folded in on compaction, snapshot or once they grow past ``_TAIL_MERGE_RATIO``.
+    Removed rows stay in the postings and are masked with the index's live rows, so
+    document frequencies include them until the next compaction.
+    """
+
+    name = "bm25"
+    artifact_keys = ("terms", "offsets", "rows", "tfs", "lengths", "hashes")
+
+    def __init__(self):
+        self._layout: Optional[_PostingLayout] = None
+        self._staged: Dict[Any, TermCounts] = {}
+
+    def is_trained(self) -> bool:
+        return self._layout is not None
+
+    def is_ready(self, state: Any) -> bool:
+        layout = self._layout
+        return layout is not None and layout.base is state.base
+
+    def search(self, state: Any, query: np.ndarray, top_k: int, **params: Any) -> Optional[Candidates]:
+        return None
+
+    def train(self, state: Any) -> None:
+        raise ValueError("The lexical index is built from documents when the vector index loads")
+
+    # -- maintenance ----------------------------------------------------------
+
+    def build(self, state: Any, builder: PostingsBuilder) -> None:
+        """Index the rows collected by ``builder`` for a freshly loaded state."""
+        vocabulary, offsets, rows, tfs = builder.packed()
+        lengths = np.zeros(state.size, dtype=np.float32)
+        hashes = np.full(state.size, _terms_hash({}), dtype=np.int64)
+        if builder.lengths:
+            lengths[list(builder.lengths)] = list(builder.lengths.values())
+            hashes[list(builder.hashes)] = list(builder.hashes.values())
+        terms = {term: term_id for term_id, term in enumerate(vocabulary)}
+        self._layout = _PostingLayout(state, terms, offsets, rows, tfs, lengths, hashes)
+        self._staged = {}
+        logger.info("Lexical index built: %s terms, %s postings over %s rows", len(terms), rows.size, state.size)
+
+    def stage(self, project_id: Any, terms: TermCounts) -> None:
+        """Terms for a project about to be appended by a delta."""
+        self._staged[project_id] = terms
+
+    def text_changed(self, row: int, terms: TermCounts) -> bool:
+        layout = self._layout
+        if layout is None or row >= layout.size:
+            return False
+        return int(layout.hashes[row]) != _terms_hash(terms)
+
+    def refresh(self, state: Any) -> None:
+        layout = self._layout
+        if layout is None:
+            return
+        if layout.base is not state.base:
+            layout = self._remap(layout, state)
+        if state.size > layout.size:
+            layout = self._append(layout, state)
+            if layout.tail_postings > _TAIL_MERGE_RATIO * max(1, layout.rows.size):
+                layout = self._merged(layout, state)
+        elif layout.state is not state:
+            layout = _PostingLayout(
+                state, layout.terms, layout.offsets, layout.rows, layout.tfs,
+                layout.lengths, layout.hashes, layout.tail, layout.built_at,
+            )
+        self._layout = layout
+
+    def _append(self, layout: _PostingLayout, state: Any) -> _PostingLayout:
+        start, size = layout.size, state.size
+        lengths = np.zeros(size, dtype=np.float32)
+        lengths[:start] = layout.lengths
+        hashes = np.empty(size, dtype=np.int64)
+        hashes[:start] = layout.hashes
+        added: Dict[str, Tuple[List[int], List[int]]] = {}
+        for row in range(start, size):
+            terms = self._staged.pop(state.ids[row], {})
+            lengths[row] = sum(terms.values())
+            hashes[row] = _terms_hash(terms)
+            for term, tf in terms.items():
+                rows, tfs = added.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(min(tf, 0xFFFF))
+
+        tail = dict(layout.tail)
+        for term, (rows, tfs) in added.items():
+            new_rows, new_tfs = np.asarray(rows, dtype=np.int32), np.asarray(tfs, dtype=np.uint16)
+            if term in tail:
+                new_rows = np.concatenate([tail[term][0], new_rows])
+                new_tfs = np.concatenate([tail[term][1], new_tfs])
+            tail[term] = (new_rows, new_tfs)
+        return _PostingLayout(
+            state, layout.terms, layout.offsets, layout.rows, layout.tfs,
+            lengths, hashes, tail, layout.built_at,
+        )
+
+    def _merged(self, layout: _PostingLayout, state: Any) -> _PostingLayout:
+        terms, offsets, rows, tfs = _pack(*layout.triples())
+        return _PostingLayout(state, terms, offsets, rows, tfs, layout.lengths, layout.hashes, None, layout.built_at)
+
+    def _remap(self, layout: _PostingLayout, state: Any) -> _PostingLayout:
+        """Carry postings over to a new base (compaction, snapshot) by project id, folding in the tail."""
+        old = layout.state
+        old_count = min(layout.size, old.size)
+        new_rows = np.full(old_count, -1, dtype=np.int64)
+        for row in np.flatnonzero(old.live[:old_count]).tolist():
+            new_rows[row] = state.row_by_id.get(old.ids[row], -1)
+
+        kept = np.flatnonzero(new_rows >= 0)
+        lengths = np.zeros(state.size, dtype=np.float32)
+        lengths[new_rows[kept]] = layout.lengths[kept]
+        hashes = np.full(state.size, _terms_hash({}), dtype=np.int64)
+        hashes[new_rows[kept]] = layout.hashes[kept]
+
+        vocabulary, term_ids, rows, tfs = layout.triples()
+        inside = rows < old_count
+        term_ids, rows, tfs = term_ids[inside], new_rows[rows[inside]], tfs[inside]
+        alive = rows >= 0
+        terms, offsets, rows, tfs = _pack(vocabulary, term_ids[alive], rows[alive], tfs[alive])
+        return _PostingLayout(state, terms, offsets, rows, tfs, lengths, hashes, None, layout.built_at)
+
+    # -- queries --------------------------------------------------------------
+
+    def search_text(
+        self,
+        state: Any,
+        text: str,
+        top_k: int,
+        selection: Optional[np.ndarray] = None,
+    ) -> Optional[Candidates]:
+        """
+        BM25 top-k rows for ``text`` among live rows (and ``selection``, a row list or
+        boolean mask from the filter index). None when the index does not cover ``state``.
+        """
+        layout = self._layout
+        if layout is None or layout.state is not state:
+            return None
+        terms = list(dict.fromkeys(tokenize(text)))
+        size = state.size
+        document_count = max(1, state.live_count)
+        average_length = max(1.0, float(layout.lengths.sum()) / max(1, size))
+
+        all_rows, all_weights = [], []
+        for term in terms:
+            rows, tfs = layout.postings(term)
+            if not rows.size:
+                continue
+            idf = math.log(1.0 + (document_count - rows.size + 0.5) / (rows.size + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * layout.lengths[rows] / average_length))
+            all_rows.append(rows)
+            all_weights.append(idf * norm)
+        if not all_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = np.bincount(np.concatenate(all_rows), weights=np.concatenate(all_weights), minlength=size)
+        matched = np.flatnonzero(scores > 0)
+        keep = state.live[matched]
+        if selection is not None:
+            keep &= selection[matched] if selection.dtype == bool else np.isin(matched, selection)
+        matched = matched[keep]
+        order = top_k_indices(scores[matched], min(top_k, matched.size))
+        return matched[order], scores[matched[order]].astype(np.float32)
+
+    # -- persistence ----------------------------------------------------------
+
+    def artifact(self) -> Optional[Artifact]:
+        layout = self._layout
+        if layout is None:
+            return None
+        if layout.tail:
+            layout = self._merged(layout, layout.state)
+        base_rows = layout.base.shape[0]
+        vocabulary = sorted(layout.terms, key=layout.terms.__getitem__)
+        # Postings of rows past the base (not in the snapshot) are left out
+        term_ids = np.repeat(np.arange(len(vocabulary), dtype=np.int32), np.diff(layout.offsets))
+        inside = layout.rows < base_rows
+        terms, offsets, rows, tfs = _pack(vocabulary, term_ids[inside], layout.rows[inside], layout.tfs[inside])
+        arrays = {
+            "terms": np.asarray(sorted(terms, key=terms.__getitem__), dtype=str),
+            "offsets": offsets,
+            "rows": rows,
+            "tfs": tfs,
+            "lengths": layout.lengths[:base_rows],
+            "hashes": layout.hashes[:base_rows],
+        }
+        return arrays, {"built_at": layout.built_at}
+
+    def restore(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], state: Any) -> bool:
+        base_rows = state.base.shape[0]
+        vocabulary = arrays["terms"].tolist()
+        if arrays["lengths"].shape != (base_rows,) or arrays["offsets"].size != len(vocabulary) + 1:
+            return False
+        layout = _PostingLayout(
+            state,
+            {term: term_id for term_id, term in enumerate(vocabulary)},
+            np.asarray(arrays["offsets"]),
+            np.asarray(arrays["rows"]),
+            np.asarray(arrays["tfs"]),
+            np.asarray(arrays["lengths"], dtype=np.float32),
+            np.asarray(arrays["hashes"], dtype=np.int64),
+            None,
+            meta.get("built_at"),
+        )
+        self._layout = self._append(layout, state) if state.size > base_rows else layout
+        return True
+
+    def reset(self) -> None:
+        self._layout = None
+        self._staged = {}
+
+    def stats(self) -> Dict[str, Any]:
+        layout = self._layout
+        if layout is None:
+            return {"trained": False}
+        return {
+            "trained": True,
+            "terms": len(layout.terms),
+            "postings": int(layout.rows.size),
+            "tail_postings": layout.tail_postings,
+            "rows": layout.size,
+            "memory_bytes": int(layout.rows.nbytes + layout.tfs.nbytes + layout.offsets.nbytes + layout.lengths.nbytes + layout.hashes.nbytes),
+            "built_at": layout.built_at,
+        }
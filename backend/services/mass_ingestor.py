@@ -12,6 +12,7 @@ from playwright.async_api import async_playwright
 
 from core.config import settings
 from services.embedding import embedding_service
+from services.embedding_scheduler import BULK
 from services.mongodb import mongodb_client
 from services.scraper import scraper_service
 
@@ -507,22 +508,32 @@ class MassIngestorService:
                         project["scrapeMetadata"] = metadata
 
                     embeddings_generated = 0
-                    if settings.MASS_INGEST_GENERATE_EMBEDDINGS and projects:
+                    stale: List[Dict[str, Any]] = []
+                    if projects and (settings.EMBEDDING_WORKER_ENABLED or settings.MASS_INGEST_GENERATE_EMBEDDINGS):
+                        # Unchanged combined text keeps its stored vector; only new or edited projects are encoded
+                        stale, _ = await mongodb_client.split_by_embedding_freshness(projects)
+                    if stale and not settings.EMBEDDING_WORKER_ENABLED:
                         try:
-                            vectors = await embedding_service.generate_embeddings_for_projects(projects)
-                            for project, vector in zip(projects, vectors):
+                            vectors = await embedding_service.generate_embeddings_for_projects(stale)
+                            for project, vector in zip(stale, vectors):
                                 project["embeddingsOfData"] = vector
                             embeddings_generated = len(vectors)
                         except Exception as exc:  # noqa: BLE001
                             logger.warning("Batch embedding failed for job %s, falling back per-project: %s", job_id, exc)
-                            for project in projects:
+                            for project in stale:
                                 try:
-                                    project["embeddingsOfData"] = await embedding_service.generate_project_embedding(project)
+                                    project["embeddingsOfData"] = await embedding_service.generate_project_embedding(project, lane=BULK)
                                     embeddings_generated += 1
                                 except Exception:
-                                    project["embeddingsOfData"] = []
+                                    # Left without a vector: the upsert marks it pending
+                                    project.pop("embeddingsOfData", None)
 
                     upsert_result = await mongodb_client.bulk_upsert_projects(projects)
+                    embeddings_queued = 0
+                    if settings.EMBEDDING_WORKER_ENABLED and stale:
+                        # Embedding workers pick these up; this process never runs the model for them
+                        await mongodb_client.enqueue_embeddings([p["urlOfProject"] for p in stale])
+                        embeddings_queued = len(stale)
 
                     problem_captured = sum(1 for p in projects if str(p.get("problemSolved", "")).strip())
                     challenges_captured = sum(1 for p in projects if str(p.get("challengesFaced", "")).strip())
@@ -547,6 +558,8 @@ class MassIngestorService:
                         "stats.upserted": upsert_result.get("upserted", 0),
                         "stats.modified": upsert_result.get("modified", 0),
                         "stats.embeddingsGenerated": embeddings_generated,
+                        "stats.embeddingsReused": upsert_result.get("embeddingsReused", 0),
+                        "stats.embeddingsQueued": embeddings_queued,
                         "stats.problemCaptured": problem_captured,
                         "stats.challengesCaptured": challenges_captured,
                     }
@@ -580,6 +593,10 @@ class MassIngestorService:
                 },
             )
             logger.info("Mass ingest job %s finished with status %s", job_id, final_status)
+            if final_status == "completed" and settings.DUPLICATE_SCAN_AFTER_INGEST:
+                from services.duplicate_clusters import duplicate_cluster_service
+
+                duplicate_cluster_service.schedule()
 
         except Exception as exc:  # noqa: BLE001
             logger.error("Mass ingest job %s failed: %s", job_id, exc, exc_info=True)
@@ -3,14 +3,49 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
 from pymongo.server_api import ServerApi
 from pymongo import UpdateOne
-from typing import List, Dict, Optional, Any
+from typing import AsyncIterator, Callable, List, Dict, Optional, Any, Tuple
 import logging
+import uuid
 from datetime import datetime, timedelta
 
+import numpy as np
+
 from core.config import settings
+from services.vector_codec import (
+    EMBEDDING_PENDING,
+    EMBEDDING_READY,
+    decode_embedding,
+    embedding_fields,
+    embedding_is_current,
+)
 
 logger = logging.getLogger("DevFoolU.mongodb")
 
+# Tags the ingestor compares against to decide whether a stored vector is still current
+EMBEDDING_MARKER_PROJECTION = {
+    "urlOfProject": 1,
+    "embeddingState": 1,
+    "embeddingTextHash": 1,
+    "embeddingModel": 1,
+    "embeddingModelVersion": 1,
+}
+
+# Projects that need a vector, served by the partial embeddingState index; documents written
+# before embeddingState existed get it from backfill_embedding_states (cli.py migrate-embeddings)
+NEEDS_EMBEDDING_FILTER = {"embeddingState": EMBEDDING_PENDING}
+
+# Display fields only: search responses never need the vector or the scraped page text
+SLIM_PROJECT_PROJECTION = {"embeddingsOfData": 0, "rawContentOfProject": 0}
+
+# Fields the vector index keeps facet bitmaps over for filtered search
+FACET_FIELDS = ("technologiesUsed", "tagsOfProject", "githubUrl", "demoUrl", "liveUrl")
+
+# Fields the BM25 index is built over for lexical and hybrid search
+TEXT_FIELDS = ("nameOfProject", "tagLine", "descriptionOfProject", "technologiesUsed", "tagsOfProject")
+
+# Everything besides the vector that the in-process indexes read from a project
+INDEXED_FIELDS = tuple(dict.fromkeys(FACET_FIELDS + TEXT_FIELDS))
+
 
 class MongoDBClient:
     """MongoDB client for async operations"""
@@ -21,7 +56,9 @@ class MongoDBClient:
         self.collection: Optional[AsyncIOMotorCollection] = None
         self.ingest_jobs_collection: Optional[AsyncIOMotorCollection] = None
         self.ingest_urls_collection: Optional[AsyncIOMotorCollection] = None
+        self.embedding_queue_collection: Optional[AsyncIOMotorCollection] = None
         self._connected = False
+        self._write_listeners: List[Callable[[], None]] = []
     
     async def connect(self):
         """Connect to MongoDB"""
@@ -45,6 +82,7 @@ class MongoDBClient:
             self.collection = self.db[settings.MONGODB_COLLECTION]
             self.ingest_jobs_collection = self.db[settings.MONGODB_INGEST_JOBS_COLLECTION]
             self.ingest_urls_collection = self.db[settings.MONGODB_INGEST_URLS_COLLECTION]
+            self.embedding_queue_collection = self.db[settings.MONGODB_EMBEDDING_QUEUE_COLLECTION]
 
             await self._ensure_indexes()
             
@@ -72,6 +110,22 @@ class MongoDBClient:
         """Check if connected to MongoDB"""
         return self._connected
 
+    def add_write_listener(self, callback: Callable[[], None]) -> None:
+        """Register a callback invoked after project writes (e.g. to wake index sync)."""
+        if callback not in self._write_listeners:
+            self._write_listeners.append(callback)
+
+    def remove_write_listener(self, callback: Callable[[], None]) -> None:
+        if callback in self._write_listeners:
+            self._write_listeners.remove(callback)
+
+    def _notify_write(self) -> None:
+        for callback in list(self._write_listeners):
+            try:
+                callback()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Project write listener failed: %s", exc)
+
     @staticmethod
     def _canonicalize_url(url: str) -> str:
         """Normalize URL representation for stable identity checks."""
@@ -92,8 +146,26 @@ class MongoDBClient:
             return [item.strip() for item in value.split(",") if item.strip()]
         return []
 
+    @staticmethod
+    def _has_embedding(project_data: Dict[str, Any]) -> bool:
+        try:
+            return decode_embedding(project_data.get("embeddingsOfData")) is not None
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def _embedding_text_hash(project_data: Dict[str, Any]) -> str:
+        from services.embedding import embedding_service
+
+        return embedding_service.embedding_text_hash(project_data)
+
     def _normalize_project_document(self, project_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Normalize project document shape for strict schema collections."""
+        """
+        Normalize project document shape for strict schema collections.
+
+        Embedding fields are only written when ``embeddingsOfData`` is present, so a
+        refresh without a new vector keeps the stored one.
+        """
         normalized = {k: v for k, v in project_data.items() if k != "_id"}
 
         normalized["urlOfProject"] = self._canonicalize_url(normalized.get("urlOfProject", ""))
@@ -103,9 +175,16 @@ class MongoDBClient:
         normalized["challengesFaced"] = str(normalized.get("challengesFaced", "")).strip()
         normalized["technologiesUsed"] = self._normalize_technologies(normalized.get("technologiesUsed"))
 
-        embeddings = normalized.get("embeddingsOfData")
-        if not isinstance(embeddings, list):
-            normalized["embeddingsOfData"] = []
+        if "embeddingsOfData" in normalized:
+            try:
+                vector = normalized.get("embeddingsOfData")
+                text_hash = None
+                if decode_embedding(vector) is not None:
+                    # Hash the caller's fields: they are what the vector was computed from
+                    text_hash = normalized.get("embeddingTextHash") or self._embedding_text_hash(project_data)
+                normalized.update(embedding_fields(vector, text_hash))
+            except (TypeError, ValueError):
+                normalized.update(embedding_fields(None))
 
         return normalized
 
@@ -149,6 +228,7 @@ class MongoDBClient:
             self.collection is None
             or self.ingest_jobs_collection is None
             or self.ingest_urls_collection is None
+            or self.embedding_queue_collection is None
         ):
             return
 
@@ -158,6 +238,12 @@ class MongoDBClient:
             logger.warning("Could not create unique index on urlOfProject: %s", exc)
         await self.collection.create_index("updatedAt")
         await self.collection.create_index("embeddingsOfData")
+        await self.collection.create_index(
+            "embeddingState",
+            name="embeddingState_pending",
+            partialFilterExpression={"embeddingState": EMBEDDING_PENDING},
+        )
+        await self.collection.create_index("duplicateClusterId", sparse=True)
 
         await self.ingest_jobs_collection.create_index("createdAt")
         await self.ingest_jobs_collection.create_index("status")
@@ -169,6 +255,10 @@ class MongoDBClient:
         await self.ingest_urls_collection.create_index(
             [("jobId", 1), ("state", 1), ("nextRetryAt", 1)]
         )
+
+        await self.embedding_queue_collection.create_index([("state", 1), ("availableAt", 1)])
+        await self.embedding_queue_collection.create_index([("state", 1), ("leaseUntil", 1)])
+        await self.embedding_queue_collection.create_index("leaseToken", sparse=True)
     
     async def project_exists(self, url: str) -> bool:
         """Check if a project with the given URL already exists"""
@@ -180,11 +270,11 @@ class MongoDBClient:
             logger.error(f"Error checking project existence: {e}")
             return False
     
-    async def get_project_by_url(self, url: str) -> Optional[Dict]:
-        """Get a project by its URL"""
+    async def get_project_by_url(self, url: str, projection: Optional[Dict[str, int]] = None) -> Optional[Dict]:
+        """Get a project by its URL (optionally only the fields in ``projection``)"""
         try:
             canonical_url = self._canonicalize_url(url)
-            project = await self.collection.find_one({"urlOfProject": canonical_url})
+            project = await self.collection.find_one({"urlOfProject": canonical_url}, projection)
             if project:
                 # Convert ObjectId to string for JSON serialization
                 project["_id"] = str(project["_id"])
@@ -204,10 +294,12 @@ class MongoDBClient:
                 return None
             
             # Add metadata
+            project_data.setdefault("embeddingState", EMBEDDING_PENDING)
             project_data["createdAt"] = datetime.utcnow()
             project_data["updatedAt"] = datetime.utcnow()
             
             result = await self.collection.insert_one(project_data)
+            self._notify_write()
             logger.info(f"✅ Inserted project: {project_data['nameOfProject']}")
             return str(result.inserted_id)
             
@@ -215,20 +307,21 @@ class MongoDBClient:
             logger.error(f"Error inserting project: {e}")
             raise
     
-    async def update_project_embeddings(self, url: str, embeddings: List[float]) -> bool:
-        """Update embeddings for a project"""
+    async def update_project_embeddings(self, url: str, embeddings: Any, text_hash: Optional[str] = None) -> bool:
+        """Update embeddings for a project (stored as a packed float32 vector, tagged with ``text_hash``)"""
         try:
             result = await self.collection.update_one(
                 {"urlOfProject": url},
                 {
                     "$set": {
-                        "embeddingsOfData": embeddings,
+                        **embedding_fields(embeddings, text_hash),
                         "updatedAt": datetime.utcnow()
                     }
                 }
             )
             
             if result.modified_count > 0:
+                self._notify_write()
                 logger.info(f"✅ Updated embeddings for: {url}")
                 return True
             else:
@@ -240,17 +333,9 @@ class MongoDBClient:
             return False
     
     async def get_projects_without_embeddings(self, limit: Optional[int] = None) -> List[Dict]:
-        """Get projects that don't have embeddings"""
+        """Get projects whose embedding is missing or stale (``embeddingState`` pending, partial index)"""
         try:
-            query = {
-                "$or": [
-                    {"embeddingsOfData": {"$exists": False}},
-                    {"embeddingsOfData": []},
-                    {"embeddingsOfData": None}
-                ]
-            }
-            
-            cursor = self.collection.find(query)
+            cursor = self.collection.find(NEEDS_EMBEDDING_FILTER)
             if limit:
                 cursor = cursor.limit(limit)
             
@@ -265,46 +350,690 @@ class MongoDBClient:
         except Exception as e:
             logger.error(f"Error fetching projects without embeddings: {e}")
             return []
+
+    async def get_embedding_markers(self, urls: List[str], chunk_size: int = 1000) -> Dict[str, Dict[str, Any]]:
+        """Embedding state, text hash and model tags of the stored projects among ``urls``, by canonical URL."""
+        canonical_urls = list(dict.fromkeys(filter(None, (self._canonicalize_url(url) for url in urls))))
+        markers: Dict[str, Dict[str, Any]] = {}
+        for idx in range(0, len(canonical_urls), chunk_size):
+            chunk = canonical_urls[idx : idx + chunk_size]
+            rows = await self.collection.find(
+                {"urlOfProject": {"$in": chunk}},
+                EMBEDDING_MARKER_PROJECTION,
+            ).to_list(length=None)
+            for row in rows:
+                markers[self._canonicalize_url(row.get("urlOfProject", ""))] = row
+        return markers
+
+    async def split_by_embedding_freshness(self, projects: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Split scraped projects into ``(stale, current)``.
+
+        A project is current when its stored vector was computed by this model and version
+        from the same combined text, so it can keep that vector instead of being re-embedded.
+        """
+        markers = await self.get_embedding_markers([p.get("urlOfProject", "") for p in projects])
+        stale: List[Dict] = []
+        current: List[Dict] = []
+        for project in projects:
+            marker = markers.get(self._canonicalize_url(project.get("urlOfProject", "")))
+            if embedding_is_current(marker, self._embedding_text_hash(project)):
+                current.append(project)
+            else:
+                stale.append(project)
+        return stale, current
+
+    async def backfill_embedding_states(self) -> int:
+        """Set ``embeddingState`` on documents written before it existed; returns documents updated."""
+        ready = await self.collection.update_many(
+            {"embeddingState": {"$exists": False}, "embeddingsOfData": {"$exists": True, "$nin": [[], None]}},
+            {"$set": {"embeddingState": EMBEDDING_READY}},
+        )
+        pending = await self.collection.update_many(
+            {"embeddingState": {"$exists": False}},
+            {"$set": {"embeddingState": EMBEDDING_PENDING}},
+        )
+        return ready.modified_count + pending.modified_count
     
-    async def vector_search(self, query_embedding: List[float], top_k: int = 5) -> List[Dict]:
+    async def enqueue_embeddings(self, urls: List[str], requeue_leased: bool = True) -> int:
+        """
+        Queue projects for the embedding worker; returns how many were newly queued.
+
+        Queue documents are keyed by canonical URL, so enqueueing is idempotent. A project
+        already leased by a worker is flagged ``requeued`` (unless ``requeue_leased`` is
+        False) so it is processed again after the running batch, which read older text.
+        Failed entries, and leases that expired after their last attempt, are queued again
+        with a fresh attempt count.
+        """
+        canonical_urls = list(dict.fromkeys(filter(None, (self._canonicalize_url(url) for url in urls))))
+        if not canonical_urls:
+            return 0
+        now = datetime.utcnow()
+        result = await self.embedding_queue_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": url},
+                    {"$setOnInsert": {"state": "queued", "attempts": 0, "enqueuedAt": now, "availableAt": now}},
+                    upsert=True,
+                )
+                for url in canonical_urls
+            ],
+            ordered=False,
+        )
+        reset = await self.embedding_queue_collection.update_many(
+            {
+                "_id": {"$in": canonical_urls},
+                "$or": [{"state": "failed"}, {"state": "leased", "leaseUntil": {"$lt": now}}],
+            },
+            {
+                "$set": {"state": "queued", "attempts": 0, "enqueuedAt": now, "availableAt": now},
+                "$unset": {"leaseOwner": "", "leaseToken": "", "leaseUntil": "", "requeued": ""},
+            },
+        )
+        if requeue_leased:
+            await self.embedding_queue_collection.update_many(
+                {"_id": {"$in": canonical_urls}, "state": "leased"},
+                {"$set": {"requeued": True}},
+            )
+        return result.upserted_count + reset.modified_count
+
+    async def enqueue_pending_embeddings(self, limit: Optional[int] = None) -> int:
+        """Queue every project that needs a vector (see :data:`NEEDS_EMBEDDING_FILTER`); returns newly queued."""
+        cursor = self.collection.find(NEEDS_EMBEDDING_FILTER, {"urlOfProject": 1})
+        if limit:
+            cursor = cursor.limit(limit)
+        urls = [doc.get("urlOfProject", "") async for doc in cursor]
+        return await self.enqueue_embeddings(urls, requeue_leased=False)
+
+    async def claim_embedding_work(
+        self,
+        owner: str,
+        limit: int,
+        lease_seconds: float,
+        max_attempts: int,
+    ) -> Tuple[str, List[str]]:
+        """
+        Lease up to ``limit`` queued projects to ``owner``; returns ``(lease token, URLs)``.
+
+        Candidates are read first and then leased with one ``update_many`` that repeats the
+        claimable condition, so each document goes to exactly one worker even when several
+        claim at once; reading back by the fresh token yields the ones this call won.
+        Leases of crashed workers expire after ``lease_seconds`` and become claimable again,
+        or failed once the entry is out of attempts.
+        """
+        now = datetime.utcnow()
+        await self.embedding_queue_collection.update_many(
+            {"state": "leased", "leaseUntil": {"$lt": now}, "attempts": {"$gte": max_attempts}},
+            {
+                "$set": {"state": "failed", "lastError": "lease expired"},
+                "$unset": {"leaseOwner": "", "leaseUntil": "", "requeued": ""},
+            },
+        )
+        claimable = {
+            "attempts": {"$lt": max_attempts},
+            "$or": [
+                {"state": "queued", "availableAt": {"$lte": now}},
+                {"state": "leased", "leaseUntil": {"$lt": now}},
+            ],
+        }
+        candidates = await self.embedding_queue_collection.find(claimable, {"_id": 1}).sort(
+            "enqueuedAt", 1
+        ).limit(limit).to_list(length=limit)
+        token = uuid.uuid4().hex
+        if not candidates:
+            return token, []
+
+        await self.embedding_queue_collection.update_many(
+            {"_id": {"$in": [doc["_id"] for doc in candidates]}, **claimable},
+            {
+                "$set": {
+                    "state": "leased",
+                    "leaseOwner": owner,
+                    "leaseToken": token,
+                    "leaseUntil": now + timedelta(seconds=lease_seconds),
+                    "requeued": False,
+                },
+                "$inc": {"attempts": 1},
+            },
+        )
+        claimed = await self.embedding_queue_collection.find({"leaseToken": token}, {"_id": 1}).to_list(length=None)
+        return token, [doc["_id"] for doc in claimed]
+
+    async def complete_embedding_work(self, token: str, urls: List[str]) -> int:
+        """Drop finished queue entries of lease ``token``; entries re-enqueued meanwhile are queued again."""
+        if not urls:
+            return 0
+        result = await self.embedding_queue_collection.delete_many(
+            {"_id": {"$in": urls}, "leaseToken": token, "requeued": {"$ne": True}}
+        )
+        now = datetime.utcnow()
+        await self.embedding_queue_collection.update_many(
+            {"_id": {"$in": urls}, "leaseToken": token},
+            {
+                "$set": {"state": "queued", "attempts": 0, "enqueuedAt": now, "availableAt": now},
+                "$unset": {"leaseOwner": "", "leaseToken": "", "leaseUntil": "", "requeued": ""},
+            },
+        )
+        return result.deleted_count
+
+    async def release_embedding_work(
+        self,
+        token: str,
+        urls: List[str],
+        error: str,
+        retry_seconds: float,
+        max_attempts: int,
+    ) -> None:
+        """Return a failed batch to the queue after ``retry_seconds``; entries out of attempts become failed."""
+        if not urls:
+            return
+        now = datetime.utcnow()
+        await self.embedding_queue_collection.update_many(
+            {"_id": {"$in": urls}, "leaseToken": token},
+            {
+                "$set": {
+                    "state": "queued",
+                    "availableAt": now + timedelta(seconds=retry_seconds),
+                    "lastError": error[:240],
+                },
+                "$unset": {"leaseOwner": "", "leaseUntil": "", "requeued": ""},
+            },
+        )
+        await self.embedding_queue_collection.update_many(
+            {"_id": {"$in": urls}, "leaseToken": token, "attempts": {"$gte": max_attempts}},
+            {"$set": {"state": "failed"}},
+        )
+
+    async def get_embedding_queue_counts(self) -> Dict[str, int]:
+        """Embedding queue entries per state (queued, leased, failed)."""
+        counts = {"queued": 0, "leased": 0, "failed": 0}
+        rows = await self.embedding_queue_collection.aggregate(
+            [{"$group": {"_id": "$state", "count": {"$sum": 1}}}]
+        ).to_list(length=None)
+        for row in rows:
+            counts[str(row["_id"])] = int(row["count"])
+        return counts
+
+    async def get_projects_for_embedding(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Stored projects among ``urls`` with every field but the vector, for re-embedding."""
+        if not urls:
+            return []
+        return await self.collection.find(
+            {"urlOfProject": {"$in": urls}},
+            {"embeddingsOfData": 0},
+        ).to_list(length=None)
+
+    async def write_project_embeddings(self, items: List[Tuple[Dict[str, Any], Any, str]]) -> int:
+        """
+        Store ``(document, vector, text hash)`` results in one ``bulk_write``; returns documents written.
+
+        Each write is conditional on the ``updatedAt`` the document was read with, so a
+        project refreshed meanwhile keeps its pending state (and its new queue entry) instead
+        of getting a vector of its old text. ``updatedAt`` is bumped so the index picks it up.
+        """
+        if not items:
+            return 0
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"_id": doc["_id"], "updatedAt": doc.get("updatedAt")},
+                {"$set": {**embedding_fields(vector, text_hash), "updatedAt": now}},
+            )
+            for doc, vector, text_hash in items
+        ]
+        result = await self.collection.bulk_write(operations, ordered=False)
+        if result.modified_count:
+            self._notify_write()
+        return result.modified_count
+
+    async def iter_project_embeddings(self, batch_size: int = 2000) -> AsyncIterator[Dict[str, Any]]:
+        """Stream ``_id``/URL/embedding (plus ``INDEXED_FIELDS``) for every project that has an embedding."""
+        cursor = self.collection.find(
+            {"embeddingsOfData": {"$exists": True, "$ne": []}},
+            {"urlOfProject": 1, "embeddingsOfData": 1, **{field: 1 for field in INDEXED_FIELDS}},
+            batch_size=batch_size,
+        )
+        async for doc in cursor:
+            yield doc
+
+    async def iter_project_fields(self, fields: Tuple[str, ...], batch_size: int = 5000) -> AsyncIterator[Dict[str, Any]]:
+        """Stream ``_id`` and ``fields`` of every project that has an embedding."""
+        cursor = self.collection.find(
+            {"embeddingsOfData": {"$exists": True, "$ne": []}},
+            {field: 1 for field in fields},
+            batch_size=batch_size,
+        )
+        async for doc in cursor:
+            yield doc
+
+    async def count_legacy_embeddings(self) -> int:
+        """Count projects whose embedding is still stored as an array of doubles."""
+        return await self.collection.count_documents({"embeddingsOfData.0": {"$exists": True}})
+
+    async def get_legacy_embedding_batch(self, after_id: Any = None, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Next page, in ``_id`` order, of projects whose embedding is still an array of doubles
+        (whole documents: the migration hashes their text to tag the converted vector).
+        """
+        query: Dict[str, Any] = {"embeddingsOfData.0": {"$exists": True}}
+        if after_id is not None:
+            query["_id"] = {"$gt": after_id}
+        return await self.collection.find(query).sort("_id", 1).limit(limit).to_list(length=limit)
+
+    async def replace_embedding_encodings(self, updates: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> int:
+        """
+        Rewrite stored embeddings in place from ``(document, fields)`` pairs.
+
+        Each write is conditional on the document's ``updatedAt`` so a project re-embedded
+        meanwhile is left alone; ``updatedAt`` itself is not bumped because the vectors
+        are unchanged and the index does not need to re-read them.
+        """
+        if not updates:
+            return 0
+        operations = [
+            UpdateOne(
+                {"_id": doc["_id"], "updatedAt": doc.get("updatedAt")},
+                {"$set": fields},
+            )
+            for doc, fields in updates
+        ]
+        result = await self.collection.bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    async def get_unchecked_duplicate_ids(self) -> set:
+        """``_id`` of embedded projects never compared for duplicates, or changed since their last check."""
+        ids: set = set()
+        cursor = self.collection.find(
+            {
+                "embeddingsOfData": {"$exists": True, "$ne": []},
+                "$or": [
+                    {"duplicateCheckedAt": {"$exists": False}},
+                    {"$expr": {"$gt": ["$updatedAt", "$duplicateCheckedAt"]}},
+                ],
+            },
+            {"_id": 1},
+            batch_size=10000,
+        )
+        async for doc in cursor:
+            ids.add(doc["_id"])
+        return ids
+
+    async def get_duplicate_assignments(self) -> Dict[Any, Tuple[str, int]]:
+        """Stored ``(duplicateClusterId, duplicateClusterSize)`` of every project in a cluster."""
+        assignments: Dict[Any, Tuple[str, int]] = {}
+        cursor = self.collection.find(
+            {"duplicateClusterId": {"$exists": True}},
+            {"duplicateClusterId": 1, "duplicateClusterSize": 1},
+            batch_size=10000,
+        )
+        async for doc in cursor:
+            assignments[doc["_id"]] = (doc["duplicateClusterId"], doc.get("duplicateClusterSize", 0))
+        return assignments
+
+    async def write_duplicate_clusters(
+        self,
+        assignments: Dict[Any, Tuple[str, int]],
+        cleared: List[Any],
+        checked: List[Any],
+        checked_at: datetime,
+        batch_size: int = 1000,
+    ) -> int:
+        """
+        Store cluster membership and the duplicate-check marker.
+
+        ``updatedAt`` is not bumped: cluster fields are derived data and must not make
+        the vector index re-read the projects.
+        """
+        checked_set = set(checked)
+        operations = [
+            UpdateOne(
+                {"_id": project_id},
+                {
+                    "$set": {
+                        "duplicateClusterId": cluster_id,
+                        "duplicateClusterSize": size,
+                        **({"duplicateCheckedAt": checked_at} if project_id in checked_set else {}),
+                    }
+                },
+            )
+            for project_id, (cluster_id, size) in assignments.items()
+        ]
+        operations += [
+            UpdateOne(
+                {"_id": project_id},
+                {
+                    "$unset": {"duplicateClusterId": "", "duplicateClusterSize": ""},
+                    **({"$set": {"duplicateCheckedAt": checked_at}} if project_id in checked_set else {}),
+                },
+            )
+            for project_id in cleared
+        ]
+        remaining = checked_set - set(assignments) - set(cleared)
+        operations += [UpdateOne({"_id": project_id}, {"$set": {"duplicateCheckedAt": checked_at}}) for project_id in remaining]
+
+        modified = 0
+        for start in range(0, len(operations), batch_size):
+            result = await self.collection.bulk_write(operations[start : start + batch_size], ordered=False)
+            modified += result.modified_count
+        return modified
+
+    async def list_duplicate_clusters(self, min_size: int = 2, limit: int = 50, skip: int = 0) -> Dict[str, Any]:
+        """Duplicate clusters, largest first, with the display fields of their members."""
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": {"duplicateClusterId": {"$exists": True}, "duplicateClusterSize": {"$gte": min_size}}},
+            {"$sort": {"createdAt": 1}},
+            {
+                "$group": {
+                    "_id": "$duplicateClusterId",
+                    "size": {"$first": "$duplicateClusterSize"},
+                    "projects": {
+                        "$push": {
+                            "_id": {"$toString": "$_id"},
+                            "nameOfProject": "$nameOfProject",
+                            "urlOfProject": "$urlOfProject",
+                            "createdAt": "$createdAt",
+                        }
+                    },
+                }
+            },
+            {"$sort": {"size": -1, "_id": 1}},
+            {
+                "$facet": {
+                    "clusters": [{"$skip": skip}, {"$limit": limit}],
+                    "total": [{"$count": "count"}],
+                }
+            },
+        ]
+        result = await self.collection.aggregate(pipeline).to_list(length=1)
+        page = result[0] if result else {"clusters": [], "total": []}
+        clusters = [
+            {"clusterId": cluster["_id"], "size": cluster["size"], "projects": cluster["projects"]}
+            for cluster in page["clusters"]
+        ]
+        return {"total": page["total"][0]["count"] if page["total"] else 0, "clusters": clusters}
+
+    async def get_latest_update_marker(self) -> Optional[Tuple[datetime, Any]]:
+        """Return ``(updatedAt, _id)`` of the most recently written project."""
+        doc = await self.collection.find_one(
+            {"updatedAt": {"$type": "date"}},
+            projection={"updatedAt": 1},
+            sort=[("updatedAt", -1), ("_id", -1)],
+        )
+        if not doc:
+            return None
+        return doc["updatedAt"], doc["_id"]
+
+    async def get_project_changes_since(
+        self,
+        updated_at: datetime,
+        after_id: Any = None,
+        limit: int = 1000,
+    ) -> List[Dict[str, Any]]:
+        """
+        Page through projects changed at or after ``updated_at`` in ``(updatedAt, _id)`` order.
+
+        Pass the last seen ``_id`` as ``after_id`` to continue a page at the same timestamp.
+        """
+        if after_id is None:
+            query: Dict[str, Any] = {"updatedAt": {"$gte": updated_at}}
+        else:
+            query = {
+                "$or": [
+                    {"updatedAt": {"$gt": updated_at}},
+                    {"updatedAt": updated_at, "_id": {"$gt": after_id}},
+                ]
+            }
+        return await self.collection.find(
+            query,
+            {"urlOfProject": 1, "embeddingsOfData": 1, "updatedAt": 1, **{field: 1 for field in INDEXED_FIELDS}},
+        ).sort([("updatedAt", 1), ("_id", 1)]).limit(limit).to_list(length=limit)
+
+    async def get_embedded_project_ids(self) -> set:
+        """Return ``_id`` values of every project that currently has an embedding."""
+        ids: set = set()
+        cursor = self.collection.find(
+            {"embeddingsOfData": {"$exists": True, "$ne": []}},
+            {"_id": 1},
+            batch_size=10000,
+        )
+        async for doc in cursor:
+            ids.add(doc["_id"])
+        return ids
+
+    def watch_project_changes(self, resume_after: Optional[Dict[str, Any]] = None):
+        """Open a change stream limited to the fields the vector index needs."""
+        pipeline = [
+            {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+            {
+                "$project": {
+                    "operationType": 1,
+                    "documentKey": 1,
+                    "fullDocument._id": 1,
+                    "fullDocument.urlOfProject": 1,
+                    "fullDocument.embeddingsOfData": 1,
+                    "fullDocument.updatedAt": 1,
+                    **{f"fullDocument.{field}": 1 for field in INDEXED_FIELDS},
+                }
+            },
+        ]
+        return self.collection.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=resume_after,
+        )
+
+    async def get_projects_by_ids(
+        self,
+        project_ids: List[Any],
+        projection: Optional[Dict[str, int]] = None,
+    ) -> Dict[Any, Dict]:
+        """Fetch several projects with one ``$in`` query, keyed by their ``_id``."""
+        if not project_ids:
+            return {}
+        docs = await self.collection.find(
+            {"_id": {"$in": list(project_ids)}},
+            projection,
+        ).to_list(length=None)
+        return {doc["_id"]: doc for doc in docs}
+
+    async def get_project_vector(self, url: str) -> Optional[np.ndarray]:
+        """
+        Embedding of a stored project, for "find similar to this project" searches.
+        Served from the resident vector index when present; otherwise only the embedding field is read.
+        """
+        from services.vector_index import vector_index_service
+
+        vector = vector_index_service.get_vector(url)
+        if vector is not None:
+            return vector
+        doc = await self.collection.find_one(
+            {"urlOfProject": self._canonicalize_url(url)},
+            {"embeddingsOfData": 1},
+        )
+        if not doc:
+            return None
+        return decode_embedding(doc.get("embeddingsOfData"))
+
+    async def vector_search(
+        self,
+        query_embedding: Any,
+        top_k: int = 5,
+        index: Optional[str] = None,
+        **search_params: Any,
+    ) -> List[Dict]:
         """
         Perform vector similarity search
-        Note: This is a basic implementation. For production, use MongoDB Atlas Vector Search
+        Scores against the resident vector index, then hydrates only the top-k documents
+        (display fields only: no embeddings or raw page content).
+        ``index`` selects the search backend (exact, ivf, hnsw, sq8, pq); ``search_params`` tune it (nprobe, ef_search, rerank)
         """
         try:
-            # Get all projects with embeddings
-            projects = await self.collection.find({
-                "embeddingsOfData": {"$exists": True, "$ne": []}
-            }).to_list(length=None)
-            
-            if not projects:
+            from services.vector_index import vector_index_service
+
+            await vector_index_service.ensure_loaded()
+            hits = vector_index_service.search(query_embedding, top_k, index=index, **search_params)
+            if not hits:
                 return []
-            
-            # Calculate cosine similarity for each project
-            from numpy import dot
-            from numpy.linalg import norm
-            
-            similarities = []
-            for project in projects:
-                if "embeddingsOfData" in project and project["embeddingsOfData"]:
-                    # Cosine similarity
-                    similarity = dot(query_embedding, project["embeddingsOfData"]) / (
-                        norm(query_embedding) * norm(project["embeddingsOfData"])
-                    )
-                    
-                    project["_id"] = str(project["_id"])
-                    project["similarity_score"] = float(similarity)
-                    similarities.append(project)
-            
-            # Sort by similarity score
-            similarities.sort(key=lambda x: x["similarity_score"], reverse=True)
-            
-            # Return top K
-            return similarities[:top_k]
+            return (await self._hydrate_hits([hits]))[0]
             
         except Exception as e:
             logger.error(f"Error performing vector search: {e}")
             return []
+
+    async def iter_vector_range_search(
+        self,
+        query_embedding: Any,
+        threshold: float,
+        limit: int,
+        page_size: int = 50,
+        offset: int = 0,
+        exclude_url: Optional[str] = None,
+        index: Optional[str] = None,
+        **search_params: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Range search (every project with similarity >= ``threshold``, at most ``limit``),
+        hydrated one page at a time from ``offset``.
+
+        The index is scanned once; each yielded page carries ``results``, ``offset``,
+        ``total`` and ``truncated``. ``exclude_url`` drops the query project itself.
+        """
+        from services.vector_index import vector_index_service
+
+        await vector_index_service.ensure_loaded()
+        excluded = self._canonicalize_url(exclude_url) if exclude_url else None
+        hits, truncated = vector_index_service.range_search(
+            query_embedding,
+            threshold,
+            limit + (1 if excluded else 0),
+            index=index,
+            **search_params,
+        )
+        if excluded:
+            hits = [hit for hit in hits if hit[1] != excluded]
+            if len(hits) > limit:
+                hits, truncated = hits[:limit], True
+
+        page_size = max(1, page_size)
+        for start in range(offset, max(offset + 1, len(hits)), page_size):
+            page = hits[start : start + page_size]
+            results = (await self._hydrate_hits([page]))[0] if page else []
+            yield {"results": results, "offset": start, "total": len(hits), "truncated": truncated}
+
+    async def vector_range_search(
+        self,
+        query_embedding: Any,
+        threshold: float,
+        limit: int,
+        page_size: int = 50,
+        offset: int = 0,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """One page of :meth:`iter_vector_range_search`."""
+        pages = self.iter_vector_range_search(query_embedding, threshold, limit, page_size, offset, **kwargs)
+        try:
+            return await pages.__anext__()
+        finally:
+            await pages.aclose()
+
+    async def hybrid_search(
+        self,
+        query_text: str,
+        query_embedding: Any,
+        top_k: int = 5,
+        index: Optional[str] = None,
+        **search_params: Any,
+    ) -> List[Dict]:
+        """
+        Vector search fused with BM25 over project text (reciprocal rank fusion).
+
+        Results carry ``similarity_score`` (cosine), ``hybrid_score`` (fused rank score) and
+        ``match_type`` (``semantic``, ``lexical`` or ``both``).
+        """
+        try:
+            from services.vector_index import vector_index_service
+
+            await vector_index_service.ensure_loaded()
+            hits = vector_index_service.hybrid_search(query_text, query_embedding, top_k, index=index, **search_params)
+            if not hits:
+                return []
+            projects = (await self._hydrate_hits([[hit[:3] for hit in hits]]))[0]
+            extras = {str(project_id): (fused, match) for project_id, _url, _score, fused, match in hits}
+            for project in projects:
+                fused, match = extras[project["_id"]]
+                project["hybrid_score"] = fused
+                project["match_type"] = match
+            return projects
+
+        except Exception as e:
+            logger.error(f"Error performing hybrid search: {e}")
+            return []
+
+    async def find_similar_to_project(
+        self,
+        url: str,
+        top_k: int = 5,
+        index: Optional[str] = None,
+        **search_params: Any,
+    ) -> Optional[List[Dict]]:
+        """
+        Projects most similar to a stored project, excluding the project itself.
+
+        Read from the precomputed kNN graph when it covers the project and no specific
+        index was requested; otherwise a live vector search with the project's embedding.
+        Returns None when the project has no embedding.
+        """
+        from services.vector_index import vector_index_service
+
+        await vector_index_service.ensure_loaded()
+        if index is None and not search_params:
+            hits = vector_index_service.similar_to(url, top_k)
+            if hits is not None:
+                return (await self._hydrate_hits([hits]))[0]
+
+        embedding = await self.get_project_vector(url)
+        if embedding is None:
+            return None
+        own_url = self._canonicalize_url(url)
+        results = await self.vector_search(embedding, top_k=top_k + 1, index=index, **search_params)
+        return [r for r in results if r["urlOfProject"] != own_url][:top_k]
+
+    async def vector_search_batch(
+        self,
+        query_embeddings: List[Any],
+        top_k: int = 5,
+        index: Optional[str] = None,
+        **search_params: Any,
+    ) -> List[List[Dict]]:
+        """
+        :meth:`vector_search` for many embeddings: one batched scoring pass and one ``$in``
+        hydration query for the union of all hits. Returns one result list per embedding.
+        """
+        from services.vector_index import vector_index_service
+
+        await vector_index_service.ensure_loaded()
+        hits = vector_index_service.search_batch(query_embeddings, top_k, index=index, **search_params)
+        return await self._hydrate_hits(hits)
+
+    async def _hydrate_hits(self, hit_lists: List[List[Tuple[Any, str, float]]]) -> List[List[Dict]]:
+        """Fetch slim documents for index hits, keeping hit order and attaching ``similarity_score``."""
+        project_ids = {project_id for hits in hit_lists for project_id, _url, _score in hits}
+        if not project_ids:
+            return [[] for _ in hit_lists]
+        docs = await self.get_projects_by_ids(list(project_ids), projection=SLIM_PROJECT_PROJECTION)
+
+        results = []
+        for hits in hit_lists:
+            projects = []
+            for project_id, _url, score in hits:
+                doc = docs.get(project_id)
+                if doc is None:
+                    # Removed since the index was built
+                    continue
+                project = dict(doc, _id=str(doc["_id"]), similarity_score=score)
+                projects.append(project)
+            results.append(projects)
+        return results
     
     async def bulk_insert_projects(self, projects: List[Dict]) -> Dict[str, int]:
         """Bulk insert projects, skipping duplicates"""
@@ -324,6 +1053,7 @@ class MongoDBClient:
                         continue
                     
                     # Add metadata
+                    project.setdefault("embeddingState", EMBEDDING_PENDING)
                     project["createdAt"] = datetime.utcnow()
                     project["updatedAt"] = datetime.utcnow()
                     
@@ -334,6 +1064,9 @@ class MongoDBClient:
                     logger.error(f"Error inserting project {project.get('urlOfProject')}: {e}")
                     failed_count += 1
             
+            if inserted_count:
+                self._notify_write()
+
             return {
                 "inserted": inserted_count,
                 "duplicates": duplicate_count,
@@ -359,13 +1092,26 @@ class MongoDBClient:
             operations = []
             failed = 0
 
+            # Projects arriving without a vector keep the stored one while their text is unchanged
+            vectorless = [p for p in projects if not self._has_embedding(p)]
+            _, current = await self.split_by_embedding_freshness(vectorless) if vectorless else ([], [])
+            current_ids = {id(p) for p in current}
+
             for project in projects:
                 url = project.get("urlOfProject")
                 if not url:
                     failed += 1
                     continue
 
-                project_data = self._normalize_project_document(project)
+                if self._has_embedding(project):
+                    project_data = self._normalize_project_document(project)
+                else:
+                    project_data = self._normalize_project_document(
+                        {k: v for k, v in project.items() if k != "embeddingsOfData"}
+                    )
+                    if id(project) not in current_ids:
+                        # New or changed text: the old vector still serves searches until re-embedded
+                        project_data["embeddingState"] = EMBEDDING_PENDING
                 project_data["updatedAt"] = now
 
                 operations.append(
@@ -388,11 +1134,13 @@ class MongoDBClient:
                 }
 
             result = await self.collection.bulk_write(operations, ordered=False)
+            self._notify_write()
             return {
                 "upserted": len(result.upserted_ids) if result.upserted_ids else 0,
                 "modified": result.modified_count,
                 "matched": result.matched_count,
                 "failed": failed,
+                "embeddingsReused": len(current_ids),
             }
 
         except Exception as e:
@@ -421,6 +1169,8 @@ class MongoDBClient:
                 "upserted": 0,
                 "modified": 0,
                 "embeddingsGenerated": 0,
+                "embeddingsReused": 0,
+                "embeddingsQueued": 0,
                 "qosSlowdowns": 0,
                 "skippedExisting": 0,
                 "problemCaptured": 0,
@@ -0,0 +1,347 @@
+"""Compressed index modes (int8 scalar, product quantization, PCA) with exact re-ranking."""
+
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from services.ann_index import (
+    AnnBackend,
+    Artifact,
+    Candidates,
+    gather_rows,
+    iter_row_blocks,
+    select_top_k,
+    top_k_indices,
+)
+
+logger = logging.getLogger("DevFoolU.quantized_index")
+
+_SCORE_BLOCK_ROWS = 16384
+
+
+def _training_sample(state: Any, limit: int, seed: int = 0) -> np.ndarray:
+    rows = np.flatnonzero(state.live)
+    if rows.size > limit:
+        rows = np.sort(np.random.default_rng(seed).choice(rows, size=limit, replace=False))
+    return gather_rows(state, rows)
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd's k-means (squared Euclidean) for one PQ subspace."""
+    k = min(k, data.shape[0])
+    centroids = data[rng.choice(data.shape[0], size=k, replace=False)].copy()
+    for _ in range(max(1, iterations)):
+        assignment = np.argmax(data @ centroids.T * 2 - (centroids**2).sum(axis=1), axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.stack(
+            [np.bincount(assignment, weights=data[:, dim], minlength=k) for dim in range(data.shape[1])],
+            axis=1,
+        ).astype(np.float32)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        if empty.size:
+            centroids[empty] = data[rng.choice(data.shape[0], size=empty.size, replace=False)]
+    return centroids
+
+
+class _Encoded:
+    """Codes for one base matrix plus codes for rows appended since (grown by replacement)."""
+
+    __slots__ = ("base", "codebook", "base_codes", "tail_codes", "built_at")
+
+    def __init__(self, base: np.ndarray, codebook: Dict[str, np.ndarray], base_codes: np.ndarray, built_at: Optional[str] = None):
+        self.base = base
+        self.codebook = codebook
+        self.base_codes = base_codes
+        self.tail_codes = np.empty((0, base_codes.shape[1]), dtype=base_codes.dtype)
+        self.built_at = built_at or datetime.utcnow().isoformat()
+
+
+class _QuantizedIndex(AnnBackend):
+    """
+    Scans compact codes with asymmetric scoring (float query against decoded codes)
+    and re-ranks the best ``rerank`` candidates exactly against the float32 rows,
+    which live in the memory-mapped snapshot when one is loaded.
+    """
+
+    codebook_keys: Tuple[str, ...] = ()
+    mmap_keys = ("codes",)
+    code_dtype = np.uint8
+
+    def __init__(self):
+        self._encoded: Optional[_Encoded] = None
+        self._train_seconds: Optional[float] = None
+
+    @property
+    def artifact_keys(self) -> Tuple[str, ...]:  # type: ignore[override]
+        return (*self.codebook_keys, "codes")
+
+    def _fit(self, state: Any) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+    def _encode(self, codebook: Dict[str, np.ndarray], vectors: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _prepare(self, codebook: Dict[str, np.ndarray], query: np.ndarray) -> Any:
+        raise NotImplementedError
+
+    def _score(self, prepared: Any, codes: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    @property
+    def default_rerank(self) -> int:
+        return settings.VECTOR_INDEX_QUANT_RERANK
+
+    def _encode_matrix(self, codebook: Dict[str, np.ndarray], matrix: np.ndarray, width: int) -> np.ndarray:
+        codes = np.empty((matrix.shape[0], width), dtype=self.code_dtype)
+        for start, block in iter_row_blocks(matrix):
+            codes[start : start + block.shape[0]] = self._encode(codebook, np.asarray(block, dtype=np.float32))
+        return codes
+
+    def _encode_state(self, state: Any, codebook: Dict[str, np.ndarray], built_at: Optional[str] = None) -> _Encoded:
+        width = self._encode(codebook, np.zeros((1, state.dimension), dtype=np.float32)).shape[1]
+        encoded = _Encoded(state.base, codebook, self._encode_matrix(codebook, state.base, width), built_at)
+        self._extend_tail(encoded, state)
+        return encoded
+
+    def _extend_tail(self, encoded: _Encoded, state: Any) -> None:
+        done = encoded.tail_codes.shape[0]
+        if state.tail_count > done:
+            fresh = self._encode(encoded.codebook, state.tail[done : state.tail_count])
+            encoded.tail_codes = np.concatenate([encoded.tail_codes, fresh])
+
+    def is_trained(self) -> bool:
+        return self._encoded is not None
+
+    def is_ready(self, state: Any) -> bool:
+        encoded = self._encoded
+        return encoded is not None and encoded.base is state.base
+
+    def train(self, state: Any) -> None:
+        started = time.perf_counter()
+        codebook = self._fit(state)
+        self._encoded = self._encode_state(state, codebook)
+        self._train_seconds = time.perf_counter() - started
+        logger.info(
+            "%s index trained: %s vectors at %s bytes each in %.2fs",
+            self.name,
+            state.live_count,
+            self._encoded.base_codes.shape[1] * self._encoded.base_codes.itemsize,
+            self._train_seconds,
+        )
+
+    def refresh(self, state: Any) -> None:
+        encoded = self._encoded
+        if encoded is None:
+            return
+        if encoded.base is not state.base:
+            # New base matrix: keep the codebook, re-encode the rows.
+            self._encoded = self._encode_state(state, encoded.codebook, encoded.built_at)
+            return
+        self._extend_tail(encoded, state)
+
+    def search(self, state: Any, query: np.ndarray, top_k: int, **params: Any) -> Optional[Candidates]:
+        encoded = self._encoded
+        if encoded is None or encoded.base is not state.base:
+            return None
+
+        prepared = self._prepare(encoded.codebook, query)
+        scores = np.empty(state.size, dtype=np.float32)
+        for start, block in iter_row_blocks(encoded.base_codes, _SCORE_BLOCK_ROWS):
+            scores[start : start + block.shape[0]] = self._score(prepared, block)
+
+        base_rows = encoded.base_codes.shape[0]
+        if state.tail_count:
+            tail_codes = encoded.tail_codes[: state.tail_count]
+            scores[base_rows : base_rows + tail_codes.shape[0]] = self._score(prepared, tail_codes)
+            if tail_codes.shape[0] < state.tail_count:
+                # Rows appended since the last refresh are scored exactly.
+                scores[base_rows + tail_codes.shape[0] :] = state.tail[tail_codes.shape[0] : state.tail_count] @ query
+        if state.dead_count:
+            scores[~state.live] = -np.inf
+
+        rerank = max(top_k, int(params.get("rerank") or self.default_rerank))
+        rows = top_k_indices(scores, min(rerank, state.live_count))
+        return select_top_k(state, rows, gather_rows(state, rows) @ query, top_k)
+
+    def artifact(self) -> Optional[Artifact]:
+        encoded = self._encoded
+        if encoded is None:
+            return None
+        arrays = dict(encoded.codebook, codes=encoded.base_codes)
+        return arrays, {"built_at": encoded.built_at}
+
+    def restore(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], state: Any) -> bool:
+        codes = arrays["codes"]
+        if codes.shape[0] != state.base.shape[0]:
+            return False
+        codebook = {key: np.asarray(arrays[key]) for key in self.codebook_keys}
+        encoded = _Encoded(state.base, codebook, codes, meta.get("built_at"))
+        self._extend_tail(encoded, state)
+        self._encoded = encoded
+        return True
+
+    def reset(self) -> None:
+        self._encoded = None
+
+    def stats(self) -> Dict[str, Any]:
+        encoded = self._encoded
+        if encoded is None:
+            return {"trained": False}
+        mapped = isinstance(encoded.base_codes, np.memmap)
+        codebook_bytes = sum(array.nbytes for array in encoded.codebook.values())
+        code_bytes = int(encoded.base_codes.nbytes + encoded.tail_codes.nbytes)
+        vectors = int(encoded.base_codes.shape[0] + encoded.tail_codes.shape[0])
+        bytes_per_vector = int(encoded.base_codes.shape[1] * encoded.base_codes.itemsize)
+        return {
+            "trained": True,
+            "vectors": vectors,
+            "bytes_per_vector": bytes_per_vector,
+            "compression_ratio": round(4 * encoded.base.shape[1] / max(1, bytes_per_vector), 1),
+            "rerank": self.default_rerank,
+            "memory_bytes": int(codebook_bytes + encoded.tail_codes.nbytes + (0 if mapped else encoded.base_codes.nbytes)),
+            "mapped_bytes": int(encoded.base_codes.nbytes) if mapped else 0,
+            "code_bytes": code_bytes,
+            "built_at": encoded.built_at,
+            "train_seconds": self._train_seconds,
+        }
+
+
+class ScalarQuantizedIndex(_QuantizedIndex):
+    """One byte per dimension: ``x ~ offset + scale * code`` with per-dimension ranges (4x smaller)."""
+
+    name = "sq8"
+    codebook_keys = ("offset", "scale")
+
+    def _fit(self, state: Any) -> Dict[str, np.ndarray]:
+        sample = _training_sample(state, settings.VECTOR_INDEX_QUANT_TRAIN_SAMPLE)
+        low = np.percentile(sample, 0.1, axis=0).astype(np.float32)
+        high = np.percentile(sample, 99.9, axis=0).astype(np.float32)
+        scale = np.maximum(high - low, 1e-6) / 255.0
+        return {"offset": low, "scale": scale.astype(np.float32)}
+
+    def _encode(self, codebook: Dict[str, np.ndarray], vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - codebook["offset"]) / codebook["scale"])
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def _prepare(self, codebook: Dict[str, np.ndarray], query: np.ndarray) -> Tuple[np.ndarray, float]:
+        # q . (offset + scale * c) = q . offset + (q * scale) . c
+        return (query * codebook["scale"]).astype(np.float32), float(query @ codebook["offset"])
+
+    def _score(self, prepared: Tuple[np.ndarray, float], codes: np.ndarray) -> np.ndarray:
+        weights, bias = prepared
+        return codes.astype(np.float32) @ weights + bias
+
+
+class ProductQuantizedIndex(_QuantizedIndex):
+    """
+    ``VECTOR_INDEX_PQ_SUBVECTORS`` sub-spaces with 256 centroids each: one byte per
+    sub-space (32x smaller at 384/48). Queries build a per-sub-space lookup table once
+    and score every code with table lookups.
+    """
+
+    name = "pq"
+    codebook_keys = ("centroids",)
+
+    @staticmethod
+    def subvectors(dimension: int) -> int:
+        configured = max(1, min(settings.VECTOR_INDEX_PQ_SUBVECTORS, dimension))
+        while dimension % configured:
+            configured -= 1
+        return configured
+
+    def _fit(self, state: Any) -> Dict[str, np.ndarray]:
+        sample = _training_sample(state, settings.VECTOR_INDEX_QUANT_TRAIN_SAMPLE)
+        parts = self.subvectors(sample.shape[1])
+        width = sample.shape[1] // parts
+        rng = np.random.default_rng(0)
+        centroids = np.zeros((parts, 256, width), dtype=np.float32)
+        for part in range(parts):
+            trained = _kmeans(
+                sample[:, part * width : (part + 1) * width],
+                256,
+                settings.VECTOR_INDEX_PQ_TRAIN_ITERATIONS,
+                rng,
+            )
+            centroids[part, : trained.shape[0]] = trained
+            if trained.shape[0] < 256:
+                # Tiny corpora: unused codes repeat the first centroid so they never win.
+                centroids[part, trained.shape[0] :] = trained[0]
+        return {"centroids": centroids}
+
+    def _encode(self, codebook: Dict[str, np.ndarray], vectors: np.ndarray) -> np.ndarray:
+        centroids = codebook["centroids"]
+        parts, _, width = centroids.shape
+        codes = np.empty((vectors.shape[0], parts), dtype=np.uint8)
+        norms = (centroids**2).sum(axis=2)
+        for part in range(parts):
+            chunk = vectors[:, part * width : (part + 1) * width]
+            codes[:, part] = np.argmax(chunk @ centroids[part].T * 2 - norms[part], axis=1)
+        return codes
+
+    def _prepare(self, codebook: Dict[str, np.ndarray], query: np.ndarray) -> np.ndarray:
+        centroids = codebook["centroids"]
+        parts, _, width = centroids.shape
+        table = np.einsum("pd,pkd->pk", query.reshape(parts, width), centroids).astype(np.float32)
+        return table.reshape(-1)
+
+    def _score(self, prepared: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        offsets = np.arange(codes.shape[1], dtype=np.intp) * 256
+        return prepared[codes.astype(np.intp) + offsets].sum(axis=1, dtype=np.float32)
+
+
+class PcaIndex(_QuantizedIndex):
+    """
+    Two-stage retrieval: every row is scored in a ``VECTOR_INDEX_PCA_DIMENSIONS``-d PCA
+    space (``x ~ mean + components @ z``, so ``q . x ~ q . mean + (q @ components) . z``)
+    and the best ``VECTOR_INDEX_PCA_RERANK`` are re-scored at full dimension.
+    """
+
+    name = "pca"
+    codebook_keys = ("mean", "components", "explained_variance")
+    code_dtype = np.float32
+
+    @property
+    def default_rerank(self) -> int:
+        return settings.VECTOR_INDEX_PCA_RERANK
+
+    def _fit(self, state: Any) -> Dict[str, np.ndarray]:
+        sample = _training_sample(state, settings.VECTOR_INDEX_QUANT_TRAIN_SAMPLE).astype(np.float64)
+        mean = sample.mean(axis=0)
+        centered = sample - mean
+        covariance = centered.T @ centered / max(1, sample.shape[0] - 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        keep = max(1, min(settings.VECTOR_INDEX_PCA_DIMENSIONS, sample.shape[1]))
+        order = np.argsort(eigenvalues)[::-1][:keep]
+        explained = float(eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12))
+        logger.info("PCA projection %s -> %s keeps %.1f%% of the variance", sample.shape[1], keep, explained * 100)
+        return {
+            "mean": mean.astype(np.float32),
+            "components": np.ascontiguousarray(eigenvectors[:, order], dtype=np.float32),
+            "explained_variance": np.asarray([explained], dtype=np.float32),
+        }
+
+    def _encode(self, codebook: Dict[str, np.ndarray], vectors: np.ndarray) -> np.ndarray:
+        return ((vectors - codebook["mean"]) @ codebook["components"]).astype(np.float32)
+
+    def _prepare(self, codebook: Dict[str, np.ndarray], query: np.ndarray) -> Tuple[np.ndarray, float]:
+        return query @ codebook["components"], float(query @ codebook["mean"])
+
+    def _score(self, prepared: Tuple[np.ndarray, float], codes: np.ndarray) -> np.ndarray:
+        weights, bias = prepared
+        return codes @ weights + bias
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        if self._encoded is not None:
+            explained = self._encoded.codebook.get("explained_variance")
+            stats["dimensions"] = int(self._encoded.base_codes.shape[1])
+            stats["explained_variance"] = round(float(explained[0]), 4) if explained is not None else None
+        return stats
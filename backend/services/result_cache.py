@@ -0,0 +1,295 @@
+"""Versioned cache of search responses with single-flight de-duplication."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from core.config import settings
+from services.mongodb import mongodb_client
+from services.vector_index import vector_index_service
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - the shared tier is optional
+    redis_asyncio = None
+
+logger = logging.getLogger("DevFoolU.result_cache")
+
+_MEMORY_URL = "memory://"
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the handful of Redis commands the shared tier uses.
+
+    Selected with ``SEARCH_CACHE_SHARED_URL=memory://`` for tests and single-process
+    development; it is not shared between workers.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    def _live(self, name: str) -> Optional[bytes]:
+        entry = self._values.get(name)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[name]
+            return None
+        return entry[0]
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, name: str) -> Optional[bytes]:
+        return self._live(name)
+
+    async def set(self, name: str, value: Any, ex: Optional[float] = None) -> bool:
+        data = value if isinstance(value, bytes) else str(value).encode("utf-8")
+        self._values[name] = (data, time.monotonic() + ex if ex else None)
+        return True
+
+    async def incr(self, name: str) -> int:
+        value = int(self._live(name) or 0) + 1
+        expires = self._values.get(name, (b"", None))[1]
+        self._values[name] = (str(value).encode("utf-8"), expires)
+        return value
+
+    async def delete(self, *names: str) -> int:
+        return sum(1 for name in names if self._values.pop(name, None) is not None)
+
+    async def aclose(self) -> None:
+        self._values.clear()
+
+
+class SearchResultCache:
+    """
+    Search responses keyed by endpoint, request parameters and data version.
+
+    The data version combines the vector index watermark (newest ``updatedAt`` applied)
+    with a write generation that every project write bumps through a MongoDB write
+    listener; with a shared tier the generation is a shared counter, so a write on one
+    worker invalidates every worker's entries. Old entries are never deleted, they just
+    stop matching and age out of the LRU (or expire in the shared tier).
+
+    Concurrent identical requests in one process share a single computation.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._shared: Any = None
+        self._generation = 0
+        self._pending_bumps: Set[asyncio.Task] = set()
+        self._started = False
+        self._counters = {"hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SEARCH_CACHE_ENABLED
+
+    async def start(self) -> None:
+        """Register the write listener and connect the shared tier, if configured."""
+        if self._started:
+            return
+        mongodb_client.add_write_listener(self.bump_version)
+        self._started = True
+
+        url = settings.SEARCH_CACHE_SHARED_URL
+        if not url:
+            return
+        if url == _MEMORY_URL:
+            self._shared = LocalRedis()
+        elif redis_asyncio is None:
+            logger.warning("SEARCH_CACHE_SHARED_URL is set but the redis package is not installed; using the local tier only")
+            return
+        else:
+            self._shared = redis_asyncio.from_url(url)
+        try:
+            await self._shared.ping()
+            logger.info("Search result cache shared tier connected (%s)", url.split("@")[-1])
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Search result cache shared tier unavailable (%s); using the local tier only", exc)
+            self._shared = None
+
+    async def stop(self) -> None:
+        mongodb_client.remove_write_listener(self.bump_version)
+        self._started = False
+        if self._pending_bumps:
+            await asyncio.gather(*self._pending_bumps, return_exceptions=True)
+        if self._shared is not None:
+            await self._shared.aclose()
+            self._shared = None
+
+    def bump_version(self) -> None:
+        """Invalidate every cached response; registered as a MongoDB write listener."""
+        self._generation += 1
+        if self._shared is None:
+            return
+        task = asyncio.get_event_loop().create_task(self._shared.incr(self._generation_key()))
+        self._pending_bumps.add(task)
+        task.add_done_callback(self._pending_bumps.discard)
+
+    def _generation_key(self) -> str:
+        return f"{settings.SEARCH_CACHE_KEY_PREFIX}:generation"
+
+    async def _version(self) -> Optional[str]:
+        """Data version shared by workers holding the same index state, or None when not cacheable."""
+        if not vector_index_service.is_ready():
+            return None
+        watermark = vector_index_service.watermark
+        marker = f"{watermark[0].isoformat()}/{watermark[1]}" if watermark and watermark[0] else "-"
+        if self._shared is None:
+            return f"{marker}|{self._generation}"
+        if self._pending_bumps:
+            # A local write must be visible in the shared counter before we read it back
+            await asyncio.gather(*self._pending_bumps, return_exceptions=True)
+        generation = await self._shared.get(self._generation_key())
+        return f"{marker}|{int(generation or 0)}"
+
+    @staticmethod
+    def _request_key(namespace: str, params: Dict[str, Any]) -> str:
+        encoded = json.dumps(jsonable_encoder(params), sort_keys=True, separators=(",", ":"))
+        return f"{namespace}:{hashlib.sha1(encoded.encode('utf-8')).hexdigest()}"
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Cached JSON-compatible result of ``compute()`` for ``params`` at the current data version.
+
+        A None result and exceptions from ``compute`` (including HTTP errors) are passed
+        to every waiter but never cached.
+        """
+        if not self.enabled:
+            return jsonable_encoder(await compute())
+        try:
+            version = await self._version()
+        except Exception as exc:  # noqa: BLE001
+            self._counters["errors"] += 1
+            logger.warning("Search result cache version lookup failed: %s", exc)
+            version = None
+        if version is None:
+            return jsonable_encoder(await compute())
+
+        request_key = self._request_key(namespace, params)
+        shared_key = f"{settings.SEARCH_CACHE_KEY_PREFIX}:{version}:{request_key}"
+        # The local tier also tracks the index version, which changes on deletes the watermark misses
+        local_key = f"{vector_index_service.version}:{shared_key}"
+
+        cached = self._local_get(local_key)
+        if cached is not None:
+            self._counters["hits"] += 1
+            return cached
+
+        inflight = self._inflight.get(local_key)
+        if inflight is not None:
+            self._counters["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_event_loop().create_future()
+        self._inflight[local_key] = future
+        try:
+            value = await self._shared_get(shared_key)
+            if value is not None:
+                self._counters["shared_hits"] += 1
+            else:
+                self._counters["misses"] += 1
+                value = jsonable_encoder(await compute())
+                if value is not None:
+                    await self._shared_set(shared_key, value)
+            if value is not None:
+                self._local_set(local_key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            self._inflight.pop(local_key, None)
+
+    def _local_get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _local_set(self, key: str, value: Any) -> None:
+        self._entries[key] = (value, time.monotonic() + settings.SEARCH_CACHE_TTL_SECONDS)
+        self._entries.move_to_end(key)
+        while len(self._entries) > max(0, settings.SEARCH_CACHE_MAX_ENTRIES):
+            self._entries.popitem(last=False)
+
+    async def _shared_get(self, key: str) -> Any:
+        if self._shared is None:
+            return None
+        try:
+            raw = await self._shared.get(key)
+        except Exception as exc:  # noqa: BLE001
+            self._counters["errors"] += 1
+            logger.warning("Search result cache shared read failed: %s", exc)
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def _shared_set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        if self._shared is None:
+            return
+        ttl = ttl_seconds if ttl_seconds is not None else settings.SEARCH_CACHE_TTL_SECONDS
+        try:
+            await self._shared.set(key, json.dumps(value, separators=(",", ":")), ex=max(1, int(ttl)))
+        except Exception as exc:  # noqa: BLE001
+            self._counters["errors"] += 1
+            logger.warning("Search result cache shared write failed: %s", exc)
+
+    @property
+    def has_shared_tier(self) -> bool:
+        return self._shared is not None
+
+    async def get_shared(self, name: str) -> Any:
+        """Unversioned value other workers published under ``name`` (None without a shared tier)."""
+        return await self._shared_get(f"{settings.SEARCH_CACHE_KEY_PREFIX}:{name}")
+
+    async def set_shared(self, name: str, value: Any, ttl_seconds: float) -> None:
+        """Publish a JSON-compatible value to every worker, outside the data version."""
+        await self._shared_set(f"{settings.SEARCH_CACHE_KEY_PREFIX}:{name}", jsonable_encoder(value), ttl_seconds)
+
+    def clear(self) -> None:
+        """Drop the local tier and move every worker to a fresh version."""
+        self._entries.clear()
+        self.bump_version()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters["hits"] + self._counters["shared_hits"] + self._counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": settings.SEARCH_CACHE_MAX_ENTRIES,
+            "generation": self._generation,
+            "shared": type(self._shared).__name__ if self._shared is not None else None,
+            "inflight": len(self._inflight),
+            **self._counters,
+            "hit_rate": round((self._counters["hits"] + self._counters["shared_hits"]) / lookups, 4) if lookups else None,
+        }
+
+
+# Global search result cache instance
+search_result_cache = SearchResultCache()
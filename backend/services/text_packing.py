@@ -0,0 +1,105 @@
+"""Token-budgeted packing of project fields and token counts for length-bucketed encoding."""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Separator between the labelled fields of a project's combined text
+FIELD_SEPARATOR = " | "
+
+# Heuristic characters per word piece for the first probe; text with longer pieces is re-probed
+_PROBE_CHARS_PER_TOKEN = 12
+
+
+class TokenPacker:
+    """
+    Measures and packs text in the model's own word pieces.
+
+    The model reads at most ``budget`` word pieces per input and silently drops the rest,
+    so text is only tokenized up to what can still fit: each piece is first cut at
+    ``remaining * _PROBE_CHARS_PER_TOKEN`` characters, and a probe that comes back within
+    the budget while the piece goes on is retried with twice the characters.
+    """
+
+    def __init__(self, tokenizer: Any, budget: int):
+        self._tokenizer = tokenizer
+        self.budget = max(1, int(budget))
+        self._counters = {"packed": 0, "tokens": 0, "truncated": 0, "fields_dropped": 0}
+
+    def count(self, texts: Sequence[str]) -> List[int]:
+        """Word pieces of each text the model will read (capped at the budget)."""
+        probed = self._probe(texts, [self.budget] * len(texts))
+        return [min(len(encoding.ids), self.budget) for _, encoding in probed]
+
+    def _probe(self, texts: Sequence[str], limits: Sequence[int]) -> List[Tuple[str, Any]]:
+        """
+        Tokenize a prefix of each text long enough to hold more than ``limit`` word pieces
+        (or the whole text); returns ``(prefix, encoding)`` per text. Each retry round is
+        one batched tokenizer call over the texts still short of their limit.
+        """
+        chars = [limit * _PROBE_CHARS_PER_TOKEN for limit in limits]
+        probed: List[Tuple[str, Any]] = [("", None)] * len(texts)
+        pending = list(range(len(texts)))
+        while pending:
+            probes = [texts[i][: chars[i]] for i in pending]
+            encodings = self._tokenizer.encode_batch(probes, add_special_tokens=False)
+            retry = []
+            for i, probe, encoding in zip(pending, probes, encodings):
+                probed[i] = (probe, encoding)
+                if len(encoding.ids) <= limits[i] and len(probe) < len(texts[i]):
+                    chars[i] *= 2
+                    retry.append(i)
+            pending = retry
+        return probed
+
+    def pack(self, parts_per_text: Sequence[Sequence[str]]) -> List[Tuple[str, int]]:
+        """
+        Join each text's parts with :data:`FIELD_SEPARATOR`, in order, until the budget is
+        spent; the part that overflows is cut at a word-piece boundary and later parts are
+        dropped. Returns ``(text, word pieces)`` per input.
+
+        Parts are tokenized round by round (every text's first part, then every second
+        part, ...) so each round is one batched tokenizer call, plus retries for the few
+        probes that were too short.
+        """
+        texts = [""] * len(parts_per_text)
+        used = [0] * len(parts_per_text)
+        open_ = [bool(parts) for parts in parts_per_text]
+        rounds = max((len(parts) for parts in parts_per_text), default=0)
+
+        for position in range(rounds):
+            active = [i for i, parts in enumerate(parts_per_text) if open_[i] and position < len(parts)]
+            if not active:
+                break
+            pieces = []
+            for i in active:
+                part = parts_per_text[i][position]
+                pieces.append(FIELD_SEPARATOR + part if texts[i] else part)
+            probed = self._probe(pieces, [self.budget - used[i] for i in active])
+
+            for i, piece, (probe, encoding) in zip(active, pieces, probed):
+                remaining = self.budget - used[i]
+                offsets = encoding.offsets
+                cut = len(offsets) > remaining or len(probe) < len(piece)
+                if len(offsets) > remaining:
+                    texts[i] += probe[: offsets[remaining - 1][1]]
+                    used[i] = self.budget
+                else:
+                    texts[i] += probe
+                    used[i] += len(offsets)
+                if cut or used[i] >= self.budget:
+                    open_[i] = False
+                    self._counters["truncated"] += int(cut)
+                    self._counters["fields_dropped"] += len(parts_per_text[i]) - position - 1
+
+        self._counters["packed"] += len(texts)
+        self._counters["tokens"] += sum(used)
+        return list(zip(texts, used))
+
+    def stats(self) -> Dict[str, Any]:
+        packed = self._counters["packed"]
+        return {
+            "budget": self.budget,
+            **self._counters,
+            "mean_tokens": round(self._counters["tokens"] / packed, 1) if packed else None,
+        }
@@ -0,0 +1,92 @@
+"""Packed float32 storage for ``embeddingsOfData`` (BSON binary, Atlas vector format)."""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+from bson.binary import Binary
+
+from core.config import settings
+
+# BSON binary subtype 9 ("vector"): a dtype byte and a padding byte, then the packed values
+VECTOR_SUBTYPE = 9
+FLOAT32_HEADER = b"\x27\x00"
+_FLOAT32_LE = np.dtype("<f4")
+
+# ``embeddingState`` values: "pending" rows (no vector, or one computed from older text)
+# are what the re-embedding jobs pick up through a partial index
+EMBEDDING_READY = "ready"
+EMBEDDING_PENDING = "pending"
+
+
+def encode_embedding(vector: Any) -> Binary:
+    """Pack an embedding as little-endian float32 behind the vector header."""
+    array = np.ascontiguousarray(np.asarray(vector, dtype=_FLOAT32_LE).reshape(-1))
+    return Binary(FLOAT32_HEADER + array.tobytes(), VECTOR_SUBTYPE)
+
+
+def decode_embedding(value: Any) -> Optional[np.ndarray]:
+    """
+    float32 view of a stored embedding, or None when it is missing or empty.
+
+    Binary vectors are read in place with ``np.frombuffer`` (the result is read-only);
+    legacy arrays of doubles are converted so both forms can coexist during migration.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raw = memoryview(value)
+        if raw.nbytes <= len(FLOAT32_HEADER) or bytes(raw[: len(FLOAT32_HEADER)]) != FLOAT32_HEADER:
+            return None
+        if (raw.nbytes - len(FLOAT32_HEADER)) % _FLOAT32_LE.itemsize:
+            return None
+        return np.frombuffer(raw, dtype=_FLOAT32_LE, offset=len(FLOAT32_HEADER))
+    array = np.asarray(value, dtype=np.float32).reshape(-1)
+    return array if array.size else None
+
+
+def is_binary_embedding(value: Any) -> bool:
+    return isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE
+
+
+def embedding_text_hash(text: str) -> str:
+    """Fingerprint of the combined text an embedding was computed from."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embedding_is_current(doc: Optional[Dict[str, Any]], text_hash: str) -> bool:
+    """True when ``doc`` holds a ready vector of this model and version for text with ``text_hash``."""
+    return bool(doc) and (
+        doc.get("embeddingState") == EMBEDDING_READY
+        and doc.get("embeddingTextHash") == text_hash
+        and doc.get("embeddingModel") == settings.EMBEDDING_MODEL_NAME
+        and doc.get("embeddingModelVersion") == settings.EMBEDDING_MODEL_VERSION
+    )
+
+
+def embedding_fields(vector: Any, text_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    ``$set`` fields for a project embedding: the stored vector plus its model, version,
+    dimension and text-hash tags.
+
+    Empty vectors stay ``[]`` and are marked pending so the re-embedding jobs pick them up.
+    """
+    array = decode_embedding(vector)
+    if array is None:
+        return {"embeddingsOfData": [], "embeddingState": EMBEDDING_PENDING}
+    if settings.EMBEDDING_STORAGE_FORMAT == "array":
+        stored: Any = array.astype(np.float64).tolist()
+    else:
+        stored = vector if is_binary_embedding(vector) else encode_embedding(array)
+    fields = {
+        "embeddingsOfData": stored,
+        "embeddingModel": settings.EMBEDDING_MODEL_NAME,
+        "embeddingModelVersion": settings.EMBEDDING_MODEL_VERSION,
+        "embeddingDim": int(array.size),
+        "embeddingState": EMBEDDING_READY,
+    }
+    if text_hash:
+        fields["embeddingTextHash"] = text_hash
+    return fields
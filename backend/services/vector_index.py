@@ -0,0 +1,1173 @@
+"""Resident float32 vector index used by similarity search."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from services import vector_snapshot
+from services.ann_index import AnnBackend, evaluate_backend, gather_rows, sample_queries, top_k_indices, top_k_rows
+from services.filter_index import FilterIndex, facet_keys
+from services.lexical_index import LexicalIndex, PostingsBuilder, document_terms
+from services.hnsw_index import HnswIndex
+from services.ivf_index import IvfIndex
+from services.knn_graph import KnnGraph
+from services.quantized_index import PcaIndex, ProductQuantizedIndex, ScalarQuantizedIndex
+from services.mongodb import INDEXED_FIELDS, mongodb_client
+from services.vector_codec import decode_embedding
+
+logger = logging.getLogger("DevFoolU.vector_index")
+
+# (project _id, urlOfProject, cosine similarity)
+SearchHit = Tuple[Any, str, float]
+
+# (project _id, urlOfProject, cosine similarity, fused RRF score, "semantic" | "lexical" | "both")
+HybridHit = Tuple[Any, str, float, float, str]
+
+# (updatedAt, _id) of the newest change reflected in the index
+Watermark = Tuple[datetime, Any]
+
+# Upper bound on the (queries x rows) float32 score matrix of one search_batch block
+_BATCH_SCORE_BYTES = 64 * 1024 * 1024
+
+
+def normalize_vector(vector: Any) -> Optional[np.ndarray]:
+    """Return a unit-length float32 copy of ``vector`` (list or packed binary) or None if it cannot be scored."""
+    try:
+        array = decode_embedding(vector)
+    except (TypeError, ValueError):
+        return None
+    if array is None or array.size != settings.EMBEDDING_DIMENSION:
+        return None
+    norm = float(np.linalg.norm(array))
+    if not np.isfinite(norm) or norm == 0.0:
+        return None
+    return array / norm
+
+
+def max_watermark(current: Optional[Watermark], candidate: Optional[Watermark]) -> Optional[Watermark]:
+    """Return the later of two ``(updatedAt, _id)`` markers."""
+    if candidate is None or candidate[0] is None:
+        return current
+    if current is None or current[0] is None:
+        return candidate
+    if (candidate[0], str(candidate[1])) > (current[0], str(current[1])):
+        return candidate
+    return current
+
+
+class _IndexState:
+    """
+    Immutable view of the index.
+
+    Rows ``[0, len(base))`` live in the base matrix and the remainder in the shared,
+    append-only ``tail`` buffer. Deltas never touch rows an existing state can see:
+    they append past ``tail_count`` and tombstone replaced rows in a copied ``live``
+    mask, then the service swaps in the new state with a single assignment.
+    """
+
+    __slots__ = (
+        "base",
+        "tail",
+        "tail_count",
+        "live",
+        "dead_count",
+        "ids",
+        "urls",
+        "row_by_id",
+        "row_by_url",
+        "version",
+        "watermark",
+        "built_at",
+    )
+
+    def __init__(
+        self,
+        base: np.ndarray,
+        tail: np.ndarray,
+        tail_count: int,
+        live: np.ndarray,
+        ids: List[Any],
+        urls: List[str],
+        row_by_id: Dict[Any, int],
+        row_by_url: Dict[str, int],
+        version: int,
+        watermark: Optional[Watermark],
+    ):
+        self.base = base
+        self.tail = tail
+        self.tail_count = tail_count
+        self.live = live
+        self.dead_count = int(live.size - np.count_nonzero(live))
+        self.ids = ids
+        self.urls = urls
+        self.row_by_id = row_by_id
+        self.row_by_url = row_by_url
+        self.version = version
+        self.watermark = watermark
+        self.built_at = datetime.utcnow()
+
+    @property
+    def size(self) -> int:
+        """Total rows, including tombstoned ones."""
+        return len(self.ids)
+
+    @property
+    def live_count(self) -> int:
+        return self.size - self.dead_count
+
+    @property
+    def dimension(self) -> int:
+        return int(self.base.shape[1])
+
+    @property
+    def memory_bytes(self) -> int:
+        """Private heap bytes; a memory-mapped base is shared through the page cache."""
+        base_bytes = 0 if isinstance(self.base, np.memmap) else self.base.nbytes
+        return int(base_bytes + self.tail.nbytes + self.live.nbytes)
+
+    @property
+    def mapped_bytes(self) -> int:
+        return int(self.base.nbytes) if isinstance(self.base, np.memmap) else 0
+
+    def vector(self, row: int) -> np.ndarray:
+        base_rows = self.base.shape[0]
+        if row < base_rows:
+            return self.base[row]
+        return self.tail[row - base_rows]
+
+    def score(self, query: np.ndarray) -> np.ndarray:
+        """Cosine scores for every row; tombstoned rows score ``-inf``."""
+        base_rows = self.base.shape[0]
+        if self.tail_count:
+            scores = np.empty(self.size, dtype=np.float32)
+            np.matmul(self.base, query, out=scores[:base_rows])
+            np.matmul(self.tail[: self.tail_count], query, out=scores[base_rows:])
+        else:
+            scores = self.base @ query
+        if self.dead_count:
+            scores[~self.live] = -np.inf
+        return scores
+
+    def score_batch(self, queries: np.ndarray) -> np.ndarray:
+        """``(queries, rows)`` cosine scores from one matrix-matrix product; tombstoned rows score ``-inf``."""
+        base_rows = self.base.shape[0]
+        scores = np.empty((queries.shape[0], self.size), dtype=np.float32)
+        np.matmul(queries, self.base.T, out=scores[:, :base_rows])
+        if self.tail_count:
+            np.matmul(queries, self.tail[: self.tail_count].T, out=scores[:, base_rows:])
+        if self.dead_count:
+            scores[:, ~self.live] = -np.inf
+        return scores
+
+    def with_watermark(self, watermark: Optional[Watermark]) -> "_IndexState":
+        return _IndexState(
+            self.base,
+            self.tail,
+            self.tail_count,
+            self.live,
+            self.ids,
+            self.urls,
+            self.row_by_id,
+            self.row_by_url,
+            self.version,
+            watermark,
+        )
+
+
+class _MatrixBuilder:
+    """Accumulates normalized rows into a preallocated float32 buffer."""
+
+    def __init__(self, dimension: int, expected_rows: int = 0):
+        self.dimension = dimension
+        self._buffer = np.empty((max(1024, expected_rows), dimension), dtype=np.float32)
+        self._count = 0
+        self.ids: List[Any] = []
+        self.urls: List[str] = []
+        self.skipped = 0
+
+    def add(self, project_id: Any, url: str, embedding: Any) -> bool:
+        vector = normalize_vector(embedding)
+        if vector is None:
+            self.skipped += 1
+            return False
+
+        if self._count == self._buffer.shape[0]:
+            grown = np.empty((self._buffer.shape[0] * 2, self.dimension), dtype=np.float32)
+            grown[: self._count] = self._buffer[: self._count]
+            self._buffer = grown
+
+        self._buffer[self._count] = vector
+        self._count += 1
+        self.ids.append(project_id)
+        self.urls.append(mongodb_client._canonicalize_url(url))
+        return True
+
+    def build(self, version: int, watermark: Optional[Watermark]) -> _IndexState:
+        matrix = self._buffer[: self._count]
+        if self._count < self._buffer.shape[0]:
+            # Drop the unused tail so the resident matrix is exactly N x d.
+            matrix = np.ascontiguousarray(matrix.copy())
+        self._buffer = np.empty((0, self.dimension), dtype=np.float32)
+        return _build_state(matrix, self.ids, self.urls, version, watermark)
+
+
+def _build_state(
+    base: np.ndarray,
+    ids: List[Any],
+    urls: List[str],
+    version: int,
+    watermark: Optional[Watermark],
+) -> _IndexState:
+    """Wrap a freshly built base matrix with an empty tail."""
+    tail = np.empty((max(1, settings.VECTOR_INDEX_TAIL_CAPACITY), base.shape[1]), dtype=np.float32)
+    row_by_url = {url: row for row, url in enumerate(urls) if url}
+    row_by_id = {project_id: row for row, project_id in enumerate(ids)}
+    live = np.ones(len(ids), dtype=bool)
+    return _IndexState(base, tail, 0, live, ids, urls, row_by_id, row_by_url, version, watermark)
+
+
+class _Delta:
+    """Copy-on-write scratch space used while applying one batch of changes."""
+
+    def __init__(self, state: _IndexState):
+        self.state = state
+        self.live: Optional[np.ndarray] = None
+        self.ids: List[Any] = state.ids
+        self.urls: List[str] = state.urls
+        self.row_by_id: Dict[Any, int] = state.row_by_id
+        self.row_by_url: Dict[str, int] = state.row_by_url
+        self.appended: List[np.ndarray] = []
+        self.appended_live: List[bool] = []
+
+    @property
+    def touched(self) -> bool:
+        return self.live is not None
+
+    def _copy(self) -> None:
+        if self.live is None:
+            self.live = self.state.live.copy()
+            self.ids = list(self.state.ids)
+            self.urls = list(self.state.urls)
+            self.row_by_id = dict(self.state.row_by_id)
+            self.row_by_url = dict(self.state.row_by_url)
+
+    def vector(self, row: int) -> np.ndarray:
+        if row < self.state.size:
+            return self.state.vector(row)
+        return self.appended[row - self.state.size]
+
+    def tombstone(self, row: int) -> None:
+        self._copy()
+        if row < self.state.size:
+            self.live[row] = False
+        else:
+            self.appended_live[row - self.state.size] = False
+        del self.row_by_id[self.ids[row]]
+        if self.row_by_url.get(self.urls[row]) == row:
+            del self.row_by_url[self.urls[row]]
+
+    def append(self, project_id: Any, url: str, vector: np.ndarray) -> None:
+        self._copy()
+        row = len(self.ids)
+        self.ids.append(project_id)
+        self.urls.append(url)
+        self.row_by_id[project_id] = row
+        if url:
+            self.row_by_url[url] = row
+        self.appended.append(vector)
+        self.appended_live.append(True)
+
+    def finish(self, version: int, watermark: Optional[Watermark]) -> _IndexState:
+        state = self.state
+        tail = state.tail
+        tail_count = state.tail_count
+        live = self.live
+
+        if self.appended:
+            needed = tail_count + len(self.appended)
+            if needed > tail.shape[0]:
+                grown = np.empty((max(needed, tail.shape[0] * 2), tail.shape[1]), dtype=np.float32)
+                grown[:tail_count] = tail[:tail_count]
+                tail = grown
+            # Rows past ``state.tail_count`` are invisible to the current state,
+            # so writing them in place is safe for concurrent readers.
+            tail[tail_count:needed] = np.vstack(self.appended)
+            tail_count = needed
+            live = np.concatenate([live, np.asarray(self.appended_live, dtype=bool)])
+
+        return _IndexState(
+            state.base,
+            tail,
+            tail_count,
+            live,
+            self.ids,
+            self.urls,
+            self.row_by_id,
+            self.row_by_url,
+            version,
+            watermark,
+        )
+
+
+class VectorIndexService:
+    """Keeps a pre-normalized embedding matrix in memory and answers top-k queries."""
+
+    def __init__(self):
+        self._state: Optional[_IndexState] = None
+        self._write_lock = asyncio.Lock()
+        self._version = 0
+        self._last_load_seconds: Optional[float] = None
+        self._last_load_skipped = 0
+        self._last_delta_at: Optional[datetime] = None
+        self._compactions = 0
+        self._source: Optional[str] = None
+        self._snapshot_manifest: Optional[Dict[str, Any]] = None
+        self._snapshot_path: Optional[Path] = None
+        self._backends: Dict[str, AnnBackend] = {
+            backend.name: backend
+            for backend in (
+                IvfIndex(),
+                HnswIndex(),
+                ScalarQuantizedIndex(),
+                ProductQuantizedIndex(),
+                PcaIndex(),
+            )
+        }
+        # Not a query backend, but shares the build, refresh and persistence lifecycle
+        self._knn_graph = KnnGraph()
+        # Facet bitmaps for filtered search; built with the rows rather than trained
+        self._filter_index = FilterIndex()
+        self._lexical_index = LexicalIndex()
+        self._build_tasks: Dict[str, asyncio.Task] = {}
+        self._recall: Dict[str, Optional[float]] = {}
+        self._fallbacks = 0
+        self._knn_hits = 0
+        self._knn_misses = 0
+
+    def is_ready(self) -> bool:
+        return self._state is not None
+
+    @property
+    def version(self) -> int:
+        return self._state.version if self._state else 0
+
+    @property
+    def size(self) -> int:
+        return self._state.live_count if self._state else 0
+
+    @property
+    def watermark(self) -> Optional[Watermark]:
+        return self._state.watermark if self._state else None
+
+    def _next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    def available_indexes(self) -> List[str]:
+        return ["exact", *self._backends]
+
+    def _backend(self, name: str) -> Optional[AnnBackend]:
+        if name not in self.available_indexes():
+            raise ValueError(f"Unknown vector index: {name}")
+        return self._backends.get(name)
+
+    def _structures(self) -> List[AnnBackend]:
+        """Every structure layered over the index rows: query backends, the kNN graph, filters and BM25."""
+        return [*self._backends.values(), self._knn_graph, self._filter_index, self._lexical_index]
+
+    async def load(self, source: str = "auto", persist: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        (Re)build the index.
+
+        ``auto`` maps the on-disk snapshot when one matches the configured model and
+        falls back to MongoDB; ``snapshot`` and ``mongo`` force one source. After a
+        MongoDB load the result is persisted as a snapshot when ``persist`` (default:
+        ``VECTOR_INDEX_SNAPSHOT_WRITE_ON_LOAD``) is set.
+        """
+        if source not in {"auto", "snapshot", "mongo"}:
+            raise ValueError(f"Unknown vector index source: {source}")
+        if persist is None:
+            persist = settings.VECTOR_INDEX_SNAPSHOT_ENABLED and settings.VECTOR_INDEX_SNAPSHOT_WRITE_ON_LOAD
+
+        async with self._write_lock:
+            use_snapshot = source == "snapshot" or (source == "auto" and settings.VECTOR_INDEX_SNAPSHOT_ENABLED)
+            if use_snapshot:
+                started = time.perf_counter()
+                snapshot = await asyncio.to_thread(vector_snapshot.load_snapshot)
+                if snapshot is not None:
+                    self._adopt_snapshot(snapshot)
+                    await self._restore_backends()
+                    await self._load_documents_from_mongo()
+                    self._last_load_seconds = time.perf_counter() - started
+                    self._last_load_skipped = 0
+                    logger.info(
+                        "Vector index mapped from snapshot %s: %s vectors in %.3fs",
+                        snapshot.path.name,
+                        self._state.size,
+                        self._last_load_seconds,
+                    )
+                    self._schedule_default_build()
+                    return self.stats()
+                if source == "snapshot":
+                    raise RuntimeError("No compatible vector snapshot found")
+
+            await self._load_from_mongo()
+            await self._refresh_backends()
+
+        if persist:
+            try:
+                await self.write_snapshot(only_if_unlocked=True)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Could not write vector snapshot after load: %s", exc)
+        self._schedule_default_build()
+        return self.stats()
+
+    async def _load_from_mongo(self) -> None:
+        started = time.perf_counter()
+        # Take the watermark before scanning: anything written during the scan is
+        # replayed by the sync task, and replays of unchanged vectors are no-ops.
+        watermark = await mongodb_client.get_latest_update_marker()
+        expected = await mongodb_client.get_projects_with_embeddings_count()
+        builder = _MatrixBuilder(settings.EMBEDDING_DIMENSION, expected_rows=expected)
+        row_facets = []
+        postings = PostingsBuilder()
+
+        async for doc in mongodb_client.iter_project_embeddings(
+            batch_size=settings.VECTOR_INDEX_LOAD_BATCH_SIZE,
+        ):
+            if builder.add(doc["_id"], doc.get("urlOfProject", ""), doc.get("embeddingsOfData")):
+                row_facets.append(facet_keys(doc))
+                postings.add(len(row_facets) - 1, document_terms(doc))
+
+        state = builder.build(self._next_version(), watermark)
+        self._filter_index.build(state, row_facets)
+        self._lexical_index.build(state, postings)
+        self._state = state
+        self._source = "mongo"
+        self._snapshot_manifest = None
+        self._snapshot_path = None
+        self._last_load_seconds = time.perf_counter() - started
+        self._last_load_skipped = builder.skipped
+
+        logger.info(
+            "Vector index loaded: %s vectors (%s skipped) in %.2fs, %.1f MB",
+            self._state.size,
+            builder.skipped,
+            self._last_load_seconds,
+            self._state.memory_bytes / (1024 * 1024),
+        )
+
+    async def _load_documents_from_mongo(self) -> None:
+        """Rebuild the facet bitmaps and BM25 postings when the snapshot was stored without them."""
+        state = self._state
+        rebuild_filters = not self._filter_index.is_ready(state)
+        rebuild_lexical = not self._lexical_index.is_ready(state)
+        if not rebuild_filters and not rebuild_lexical:
+            return
+
+        started = time.perf_counter()
+        row_facets = [()] * state.size
+        postings = PostingsBuilder()
+        async for doc in mongodb_client.iter_project_fields(INDEXED_FIELDS):
+            row = state.row_by_id.get(doc["_id"])
+            if row is None:
+                continue
+            row_facets[row] = facet_keys(doc)
+            postings.add(row, document_terms(doc))
+        if rebuild_filters:
+            self._filter_index.build(state, row_facets)
+        if rebuild_lexical:
+            self._lexical_index.build(state, postings)
+        logger.info("Document indexes rebuilt from MongoDB in %.2fs", time.perf_counter() - started)
+
+    def _adopt_snapshot(self, snapshot: vector_snapshot.LoadedSnapshot) -> None:
+        self._state = _build_state(
+            snapshot.embeddings,
+            snapshot.ids,
+            snapshot.urls,
+            self._next_version(),
+            snapshot.watermark,
+        )
+        # Filters and postings must follow the new rows before any query sees them
+        self._filter_index.refresh(self._state)
+        self._lexical_index.refresh(self._state)
+        self._source = "snapshot"
+        self._snapshot_manifest = snapshot.manifest
+        self._snapshot_path = snapshot.path
+
+    async def _restore_backends(self) -> None:
+        """Map approximate indexes stored with the adopted snapshot, or reassign trained ones."""
+        state = self._state
+        for backend in self._structures():
+            loaded = await asyncio.to_thread(
+                vector_snapshot.load_artifact,
+                self._snapshot_path,
+                backend.name,
+                backend.artifact_keys,
+                backend.mmap_keys,
+            )
+            if loaded is not None and backend.restore(loaded[0], loaded[1], state):
+                logger.info("Restored %s index from snapshot %s", backend.name, self._snapshot_path.name)
+            elif backend.is_trained():
+                await asyncio.to_thread(backend.refresh, state)
+
+    async def _refresh_backends(self) -> None:
+        state = self._state
+        for backend in self._structures():
+            if backend.is_trained():
+                await asyncio.to_thread(backend.refresh, state)
+
+    async def _persist_backend(self, backend: AnnBackend) -> bool:
+        """Store a backend next to the snapshot this worker maps, then map it back read-only."""
+        path = self._snapshot_path
+        artifact = backend.artifact()
+        if not settings.VECTOR_INDEX_SNAPSHOT_ENABLED or path is None or artifact is None:
+            return False
+        if not backend.is_ready(self._state):
+            return False
+
+        with vector_snapshot.writer_lock() as acquired:
+            if not acquired:
+                logger.info("Another worker is writing the vector snapshot; not persisting %s", backend.name)
+                return False
+            await asyncio.to_thread(vector_snapshot.write_artifact, path, backend.name, artifact[0], artifact[1])
+
+        loaded = await asyncio.to_thread(
+            vector_snapshot.load_artifact,
+            path,
+            backend.name,
+            backend.artifact_keys,
+            backend.mmap_keys,
+        )
+        if loaded is not None:
+            backend.restore(loaded[0], loaded[1], self._state)
+        return True
+
+    async def build_backend(self, name: str, persist: bool = True) -> Dict[str, Any]:
+        """
+        Train an approximate backend over the current index (offline job).
+
+        Training runs in a worker thread against an immutable state; deltas that land
+        meanwhile are folded in afterwards by assigning them to the trained structure.
+        """
+        await self.ensure_loaded()
+        backend = self._buildable_backend(name)
+        running = self._build_tasks.get(name)
+        if running is not None and not running.done() and running is not asyncio.current_task():
+            await running
+            return self._backend_stats(name)
+
+        state = self._state
+        await asyncio.to_thread(backend.train, state)
+        async with self._write_lock:
+            await asyncio.to_thread(backend.refresh, self._state)
+            if backend is not self._knn_graph:
+                queries = sample_queries(self._state, settings.VECTOR_INDEX_RECALL_QUERIES)
+                evaluation = await asyncio.to_thread(evaluate_backend, self._state, backend, queries)
+                self._recall[name] = evaluation["recall"] if evaluation else None
+            if persist:
+                await self._persist_backend(backend)
+        return self._backend_stats(name)
+
+    def _backend_stats(self, name: str) -> Dict[str, Any]:
+        if name == self._knn_graph.name:
+            return dict(self._knn_graph.stats(), hits=self._knn_hits, misses=self._knn_misses)
+        stats = self._backends[name].stats()
+        if stats.get("trained"):
+            stats["recall_at_10"] = self._recall.get(name)
+        return stats
+
+    def _schedule_default_build(self) -> None:
+        if settings.VECTOR_INDEX_KNN_BUILD_ON_LOAD and not self._knn_graph.is_trained() and self.size > 1:
+            self.schedule_build(self._knn_graph.name)
+        name = settings.VECTOR_INDEX_BACKEND
+        backend = self._backends.get(name)
+        if backend is None or backend.is_trained() or not settings.VECTOR_INDEX_ANN_BUILD_ON_LOAD:
+            return
+        if self.size >= max(1, settings.VECTOR_INDEX_ANN_MIN_VECTORS):
+            self.schedule_build(name)
+
+    def _buildable_backend(self, name: str) -> AnnBackend:
+        if name == self._knn_graph.name:
+            return self._knn_graph
+        backend = self._backend(name)
+        if backend is None:
+            raise ValueError("The exact index needs no build")
+        if self.size < max(1, settings.VECTOR_INDEX_ANN_MIN_VECTORS):
+            raise ValueError(
+                f"{self.size} vectors indexed; {name} needs at least "
+                f"{settings.VECTOR_INDEX_ANN_MIN_VECTORS} (VECTOR_INDEX_ANN_MIN_VECTORS)"
+            )
+        return backend
+
+    def schedule_build(self, name: str) -> bool:
+        """Start :meth:`build_backend` as a background task unless one is already running."""
+        self._buildable_backend(name)
+        task = self._build_tasks.get(name)
+        if task is not None and not task.done():
+            return False
+        self._build_tasks[name] = asyncio.create_task(self._build_in_background(name))
+        return True
+
+    async def _build_in_background(self, name: str) -> None:
+        try:
+            await self.build_backend(name)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Background %s index build failed: %s", name, exc, exc_info=True)
+
+    async def write_snapshot(self, only_if_unlocked: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Persist live rows as a new snapshot and switch this worker onto the mapped copy.
+
+        With ``only_if_unlocked`` the call is skipped when another worker is already writing.
+        """
+        async with self._write_lock:
+            state = self._state
+            if state is None:
+                raise RuntimeError("Vector index is not loaded")
+
+            with vector_snapshot.writer_lock() as acquired:
+                if not acquired:
+                    if only_if_unlocked:
+                        logger.info("Another worker is writing the vector snapshot; skipping")
+                        return None
+                    raise RuntimeError("Another process is writing a vector snapshot")
+
+                base_rows = state.base.shape[0]
+                segments = [(state.base, state.live[:base_rows])]
+                if state.tail_count:
+                    segments.append((state.tail[: state.tail_count], state.live[base_rows:]))
+                keep = np.flatnonzero(state.live)
+                manifest = await asyncio.to_thread(
+                    vector_snapshot.write_snapshot,
+                    segments,
+                    [state.ids[row] for row in keep],
+                    [state.urls[row] for row in keep],
+                    state.watermark,
+                    state.version,
+                )
+
+            snapshot = await asyncio.to_thread(vector_snapshot.load_snapshot)
+            if snapshot is not None:
+                # Drop the private heap copy in favour of pages shared through the OS cache.
+                self._adopt_snapshot(snapshot)
+                await self._refresh_backends()
+                for backend in self._structures():
+                    if backend.is_trained():
+                        await self._persist_backend(backend)
+            return manifest
+
+    async def ensure_loaded(self) -> None:
+        if not self.is_ready():
+            await self.load()
+
+    async def apply_changes(
+        self,
+        upserts: Iterable[Dict[str, Any]] = (),
+        deletes: Iterable[Any] = (),
+        watermark: Optional[Watermark] = None,
+    ) -> Dict[str, int]:
+        """
+        Apply a delta of changed/removed projects without rebuilding the index.
+
+        ``upserts`` are documents with ``_id``, ``urlOfProject`` and ``embeddingsOfData``;
+        documents whose embedding is missing or invalid are treated as removals. Facet
+        and text fields (``INDEXED_FIELDS``) feed the filter and BM25 indexes; an edit to
+        them alone counts as an update.
+        """
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        async with self._write_lock:
+            state = self._state
+            if state is None:
+                return counts
+
+            delta = _Delta(state)
+            for project_id in deletes:
+                row = delta.row_by_id.get(project_id)
+                if row is not None:
+                    delta.tombstone(row)
+                    counts["removed"] += 1
+
+            for doc in upserts:
+                project_id = doc.get("_id")
+                if project_id is None:
+                    continue
+                url = mongodb_client._canonicalize_url(doc.get("urlOfProject", ""))
+                vector = normalize_vector(doc.get("embeddingsOfData"))
+                facets = facet_keys(doc)
+                terms = document_terms(doc)
+                row = delta.row_by_id.get(project_id)
+
+                if row is not None:
+                    if (
+                        vector is not None
+                        and delta.urls[row] == url
+                        and not self._filter_index.facets_changed(row, facets)
+                        and not self._lexical_index.text_changed(row, terms)
+                        and np.array_equal(delta.vector(row), vector)
+                    ):
+                        counts["unchanged"] += 1
+                        continue
+                    delta.tombstone(row)
+                    if vector is None:
+                        counts["removed"] += 1
+                        continue
+                    counts["updated"] += 1
+                elif vector is None:
+                    continue
+                else:
+                    counts["added"] += 1
+                self._filter_index.stage(project_id, facets)
+                self._lexical_index.stage(project_id, terms)
+                delta.append(project_id, url, vector)
+
+            new_watermark = max_watermark(state.watermark, watermark)
+            if delta.touched:
+                new_state = delta.finish(self._next_version(), new_watermark)
+                # Appends only touch the new rows' bitmaps and postings, so this stays on the
+                # loop and queries never see rows the filters or BM25 do not know yet
+                self._filter_index.refresh(new_state)
+                self._lexical_index.refresh(new_state)
+                self._state = new_state
+                self._last_delta_at = datetime.utcnow()
+                await self._refresh_backends()
+            elif new_watermark != state.watermark:
+                self._state = state.with_watermark(new_watermark)
+
+            if self._needs_compaction(self._state):
+                compacted = await asyncio.to_thread(self._compacted, self._state)
+                self._filter_index.refresh(compacted)
+                self._lexical_index.refresh(compacted)
+                self._state = compacted
+                self._source = "compaction"
+                self._snapshot_path = None
+                self._compactions += 1
+                logger.info("Vector index compacted to %s rows (version %s)", compacted.size, compacted.version)
+                await self._refresh_backends()
+
+            return counts
+
+    @staticmethod
+    def _needs_compaction(state: _IndexState) -> bool:
+        if state.dead_count == 0:
+            return False
+        return state.dead_count > settings.VECTOR_INDEX_COMPACT_DEAD_RATIO * max(1, state.size)
+
+    def _compacted(self, state: _IndexState) -> _IndexState:
+        """Rewrite live rows into a fresh contiguous base matrix."""
+        base_rows = state.base.shape[0]
+        parts = [state.base[state.live[:base_rows]]]
+        if state.tail_count:
+            parts.append(state.tail[: state.tail_count][state.live[base_rows:]])
+        base = np.ascontiguousarray(np.vstack(parts), dtype=np.float32)
+        keep = np.flatnonzero(state.live)
+        ids = [state.ids[row] for row in keep]
+        urls = [state.urls[row] for row in keep]
+        return _build_state(base, ids, urls, self._next_version(), state.watermark)
+
+    def _filtered_hits(
+        self,
+        state: _IndexState,
+        queries: np.ndarray,
+        selection: np.ndarray,
+        top_k: int,
+    ) -> List[List[SearchHit]]:
+        """
+        Exact top-k restricted to the rows a filter selected.
+
+        A row list (selective filter) is gathered and scored on its own; a boolean mask
+        (broad filter) masks the full score matrix before top-k selection.
+        """
+        if selection.dtype == bool:
+            count = int(np.count_nonzero(selection))
+            candidates = None
+            excluded = ~selection
+        else:
+            count = int(selection.size)
+            candidates = gather_rows(state, selection)
+        if count == 0:
+            return [[] for _ in range(queries.shape[0])]
+
+        k = min(top_k, count)
+        results: List[List[SearchHit]] = []
+        block = max(1, _BATCH_SCORE_BYTES // (4 * (count if candidates is not None else state.size)))
+        for start in range(0, queries.shape[0], block):
+            chunk = queries[start : start + block]
+            if candidates is None:
+                scores = state.score_batch(chunk)
+                np.putmask(scores, np.broadcast_to(excluded, scores.shape), -np.inf)
+                rows_by_query = top_k_rows(scores, k)
+                for offset, rows in enumerate(rows_by_query):
+                    results.append([(state.ids[row], state.urls[row], float(scores[offset, row])) for row in rows])
+            else:
+                scores = chunk @ candidates.T
+                for offset, picks in enumerate(top_k_rows(scores, k)):
+                    results.append(
+                        [
+                            (state.ids[row], state.urls[row], float(score))
+                            for row, score in zip(selection[picks].tolist(), scores[offset, picks])
+                        ]
+                    )
+        return results
+
+    def search(
+        self,
+        query_embedding: Any,
+        top_k: int,
+        index: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        **params: Any,
+    ) -> List[SearchHit]:
+        """
+        Return the best ``top_k`` projects for a query embedding.
+
+        ``index`` picks the backend (default ``VECTOR_INDEX_BACKEND``); ``exact`` scores every
+        row with one matrix-vector product. Approximate backends take their own tuning
+        parameters (e.g. ``nprobe``) and fall back to exact search until they are built.
+        ``filters`` (``technologies``, ``tags``, ``has_github``, ``has_demo``) restrict the
+        candidates through the facet bitmaps; filtered queries are always answered exactly.
+        """
+        backend = self._backend(index or settings.VECTOR_INDEX_BACKEND)
+        state = self._state
+        if state is None or state.live_count == 0 or top_k <= 0:
+            return []
+
+        query = normalize_vector(query_embedding)
+        if query is None:
+            logger.warning("Query embedding has unexpected shape or zero norm; skipping search")
+            return []
+
+        selection = self._filter_index.select(state, filters) if filters else None
+        if selection is not None:
+            return self._filtered_hits(state, query[None, :], selection, top_k)[0]
+
+        if backend is not None:
+            candidates = backend.search(state, query, top_k, **params)
+            if candidates is not None:
+                rows, scores = candidates
+                return [(state.ids[row], state.urls[row], float(score)) for row, score in zip(rows, scores)]
+            self._fallbacks += 1
+
+        scores = state.score(query)
+        rows = top_k_indices(scores, min(top_k, state.live_count))
+        return [(state.ids[row], state.urls[row], float(scores[row])) for row in rows]
+
+    def search_batch(
+        self,
+        query_embeddings: List[Any],
+        top_k: int,
+        index: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        **params: Any,
+    ) -> List[List[SearchHit]]:
+        """
+        :meth:`search` for many queries at once, one hit list per query (empty for invalid queries).
+
+        Exact search scores a block of queries with one matrix-matrix product, so throughput
+        follows BLAS rather than per-query overhead; blocks are sized to keep the score
+        matrix under ``_BATCH_SCORE_BYTES``. Approximate backends answer query by query.
+        ``filters`` apply to every query of the batch.
+        """
+        backend = self._backend(index or settings.VECTOR_INDEX_BACKEND)
+        state = self._state
+        results: List[List[SearchHit]] = [[] for _ in query_embeddings]
+        if state is None or state.live_count == 0 or top_k <= 0:
+            return results
+
+        positions = []
+        vectors = []
+        for position, embedding in enumerate(query_embeddings):
+            vector = normalize_vector(embedding)
+            if vector is not None:
+                positions.append(position)
+                vectors.append(vector)
+        if not vectors:
+            return results
+
+        selection = self._filter_index.select(state, filters) if filters else None
+        if selection is not None:
+            for position, hits in zip(positions, self._filtered_hits(state, np.vstack(vectors), selection, top_k)):
+                results[position] = hits
+            return results
+
+        if backend is not None:
+            pending = []
+            for position, vector in zip(positions, vectors):
+                candidates = backend.search(state, vector, top_k, **params)
+                if candidates is None:
+                    pending.append((position, vector))
+                    continue
+                rows, scores = candidates
+                results[position] = [(state.ids[row], state.urls[row], float(score)) for row, score in zip(rows, scores)]
+            if not pending:
+                return results
+            self._fallbacks += len(pending)
+            positions = [position for position, _vector in pending]
+            vectors = [vector for _position, vector in pending]
+
+        queries = np.vstack(vectors)
+        k = min(top_k, state.live_count)
+        block = max(1, _BATCH_SCORE_BYTES // (4 * state.size))
+        for start in range(0, queries.shape[0], block):
+            scores = state.score_batch(queries[start : start + block])
+            for offset, rows in enumerate(top_k_rows(scores, k)):
+                results[positions[start + offset]] = [
+                    (state.ids[row], state.urls[row], float(scores[offset, row])) for row in rows
+                ]
+        return results
+
+    def range_search(
+        self,
+        query_embedding: Any,
+        threshold: float,
+        limit: int,
+        index: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        **params: Any,
+    ) -> Tuple[List[SearchHit], bool]:
+        """
+        Every project scoring at least ``threshold``, best first, capped at ``limit``.
+
+        Returns the hits and whether the cap cut matches off (for approximate backends:
+        whether the cap was reached). Exact search is a single thresholded pass over the
+        scores; only the matches are sorted. Backends prune with their own bounds (IVF
+        skips lists that cannot reach the threshold) and fall back to exact search until
+        they are built.
+        """
+        backend = self._backend(index or settings.VECTOR_INDEX_BACKEND)
+        state = self._state
+        if state is None or state.live_count == 0 or limit <= 0:
+            return [], False
+
+        query = normalize_vector(query_embedding)
+        if query is None:
+            logger.warning("Query embedding has unexpected shape or zero norm; skipping range search")
+            return [], False
+
+        selection = self._filter_index.select(state, filters) if filters else None
+        if selection is None and backend is not None:
+            candidates = backend.range_search(state, query, threshold, limit, **params)
+            if candidates is not None:
+                rows, scores = candidates
+                hits = [(state.ids[row], state.urls[row], float(score)) for row, score in zip(rows, scores)]
+                return hits, len(hits) >= limit
+            self._fallbacks += 1
+
+        if selection is not None and selection.dtype != bool:
+            rows = selection
+            scores = gather_rows(state, rows) @ query if rows.size else np.empty(0, dtype=np.float32)
+        else:
+            scores = state.score(query)
+            if selection is not None:
+                np.putmask(scores, ~selection, -np.inf)
+            rows = None
+        matched = np.flatnonzero(scores >= threshold)
+        truncated = matched.size > limit
+        order = matched[top_k_indices(scores[matched], min(limit, matched.size))]
+        rows = order if rows is None else rows[order]
+        return [(state.ids[row], state.urls[row], float(score)) for row, score in zip(rows.tolist(), scores[order])], truncated
+
+    def lexical_search(
+        self,
+        query_text: str,
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Optional[List[SearchHit]]:
+        """BM25 top-k for a text query; the score is BM25, not cosine. None while the index is not built."""
+        state = self._state
+        if state is None or top_k <= 0:
+            return []
+        selection = self._filter_index.select(state, filters) if filters else None
+        found = self._lexical_index.search_text(state, query_text, top_k, selection)
+        if found is None:
+            return None
+        rows, scores = found
+        return [(state.ids[row], state.urls[row], float(score)) for row, score in zip(rows.tolist(), scores)]
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_embedding: Any,
+        top_k: int,
+        index: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        **params: Any,
+    ) -> List[HybridHit]:
+        """
+        Fuse vector and BM25 results with reciprocal rank fusion.
+
+        Each side contributes its best ``HYBRID_SEARCH_CANDIDATES`` rows, scored
+        ``1 / (HYBRID_RRF_K + rank)``; rows found by both sides add up. Hits carry the cosine
+        similarity to the query (computed for lexical-only rows) so they stay comparable
+        with plain vector search. Without a usable BM25 index this is vector search.
+        """
+        state = self._state
+        if state is None or state.live_count == 0 or top_k <= 0:
+            return []
+        depth = max(top_k, settings.HYBRID_SEARCH_CANDIDATES)
+        query = normalize_vector(query_embedding) if query_embedding is not None else None
+
+        semantic = self.search(query, depth, index=index, filters=filters, **params) if query is not None else []
+        lexical = self.lexical_search(query_text, depth, filters=filters) or []
+
+        fused: Dict[Any, List[Any]] = {}
+        for source, hits in (("semantic", semantic), ("lexical", lexical)):
+            for rank, (project_id, url, score) in enumerate(hits):
+                entry = fused.get(project_id)
+                if entry is None:
+                    cosine = score if source == "semantic" else None
+                    fused[project_id] = [project_id, url, cosine, 0.0, source]
+                    entry = fused[project_id]
+                elif entry[4] != source:
+                    entry[4] = "both"
+                entry[3] += 1.0 / (settings.HYBRID_RRF_K + rank + 1)
+
+        ranked = sorted(fused.values(), key=lambda entry: -entry[3])[:top_k]
+        for entry in ranked:
+            if entry[2] is None:
+                row = state.row_by_id.get(entry[0])
+                entry[2] = float(state.vector(row) @ query) if row is not None and query is not None else 0.0
+        return [tuple(entry) for entry in ranked]
+
+    async def benchmark(
+        self,
+        names: Optional[List[str]] = None,
+        queries: Optional[List[Any]] = None,
+        sample: int = 200,
+        k: int = 10,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """
+        recall@k and latency of each built backend against exact search.
+
+        ``queries`` are embeddings (e.g. of real search texts); without them a sample
+        of indexed vectors is used. Raises ValueError if none of ``queries`` is a valid
+        vector.
+        """
+        await self.ensure_loaded()
+        state = self._state
+        if queries:
+            vectors = [vector for vector in map(normalize_vector, queries) if vector is not None]
+            if not vectors:
+                raise ValueError("no valid query vectors")
+            matrix = np.vstack(vectors)
+        else:
+            matrix = sample_queries(state, sample)
+
+        results: Dict[str, Any] = {
+            "exact": await asyncio.to_thread(evaluate_backend, state, None, matrix, k),
+        }
+        for name in names or list(self._backends):
+            backend = self._backend(name)
+            if backend is None:
+                continue
+            evaluation = await asyncio.to_thread(evaluate_backend, state, backend, matrix, k, **params)
+            stats = backend.stats()
+            results[name] = (
+                dict(
+                    evaluation,
+                    memory_bytes=stats.get("memory_bytes"),
+                    mapped_bytes=stats.get("mapped_bytes"),
+                )
+                if evaluation
+                else {"error": "not built"}
+            )
+        return {
+            "vectors": state.live_count,
+            "dimension": state.dimension,
+            "query_source": "embeddings" if queries else "indexed_vectors",
+            "results": results,
+        }
+
+    def similar_to(self, url: str, top_k: int) -> Optional[List[SearchHit]]:
+        """
+        Nearest projects to an indexed project from the precomputed kNN graph.
+
+        Returns None when the graph cannot answer exactly (not built, project not covered
+        yet, a delta still being folded in, or too few live neighbours left); callers then
+        fall back to a live search with the project's vector.
+        """
+        state = self._state
+        if state is None or not self._knn_graph.is_trained():
+            return None
+        row = state.row_by_url.get(mongodb_client._canonicalize_url(url))
+        found = None if row is None else self._knn_graph.neighbors(state, row, top_k)
+        if found is None:
+            self._knn_misses += 1
+            return None
+        self._knn_hits += 1
+        rows, scores = found
+        return [(state.ids[row], state.urls[row], float(score)) for row, score in zip(rows, scores)]
+
+    def get_vector(self, url: str) -> Optional[np.ndarray]:
+        """Return the indexed (normalized) vector for a project URL, if present."""
+        state = self._state
+        if state is None:
+            return None
+        row = state.row_by_url.get(mongodb_client._canonicalize_url(url))
+        if row is None:
+            return None
+        return state.vector(row)
+
+    def indexed_ids(self) -> set:
+        state = self._state
+        if state is None:
+            return set()
+        return set(state.row_by_id.keys())
+
+    def stats(self) -> Dict[str, Any]:
+        state = self._state
+        if state is None:
+            return {"ready": False}
+        watermark = state.watermark
+        return {
+            "ready": True,
+            "version": state.version,
+            "vectors": state.live_count,
+            "rows": state.size,
+            "tombstoned_rows": state.dead_count,
+            "tail_rows": state.tail_count,
+            "dimension": state.dimension,
+            "memory_bytes": state.memory_bytes,
+            "mapped_bytes": state.mapped_bytes,
+            "built_at": state.built_at.isoformat(),
+            "watermark": watermark[0].isoformat() if watermark and watermark[0] else None,
+            "last_load_seconds": self._last_load_seconds,
+            "last_delta_at": self._last_delta_at.isoformat() if self._last_delta_at else None,
+            "skipped_on_load": self._last_load_skipped,
+            "compactions": self._compactions,
+            "source": self._source,
+            "snapshot": (
+                {
+                    "path": str(vector_snapshot.current_snapshot_path() or ""),
+                    "created_at": self._snapshot_manifest.get("created_at"),
+                    "count": self._snapshot_manifest.get("count"),
+                }
+                if self._snapshot_manifest
+                else None
+            ),
+            "backend": settings.VECTOR_INDEX_BACKEND,
+            "ann_fallbacks": self._fallbacks,
+            "ann": {name: self._backend_stats(name) for name in self._backends},
+            "knn": self._backend_stats(self._knn_graph.name),
+            "filters": self._filter_index.stats(),
+            "lexical": self._lexical_index.stats(),
+        }
+
+    def facet_values(self, limit: int = 50) -> Dict[str, List[Dict[str, Any]]]:
+        """Most common technologies and tags among indexed projects, for building filters."""
+        return {
+            facet: [{"value": value, "count": count} for value, count in self._filter_index.top_values(prefix, limit)]
+            for facet, prefix in (("technologies", "tech"), ("tags", "tag"))
+        }
+
+
+vector_index_service = VectorIndexService()
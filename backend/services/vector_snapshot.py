@@ -0,0 +1,345 @@
+"""On-disk embedding snapshots that API workers open read-only via mmap."""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger("DevFoolU.vector_snapshot")
+
+FORMAT_VERSION = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE = "ids.npy"
+URL_OFFSETS_FILE = "url_offsets.npy"
+URLS_FILE = "urls.bin"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+_COPY_CHUNK_ROWS = 8192
+
+
+class LoadedSnapshot:
+    """Read-only view over one snapshot directory."""
+
+    __slots__ = ("path", "manifest", "embeddings", "ids", "urls", "watermark")
+
+    def __init__(
+        self,
+        path: Path,
+        manifest: Dict[str, Any],
+        embeddings: np.ndarray,
+        ids: List[Any],
+        urls: List[str],
+        watermark: Optional[Tuple[datetime, Any]],
+    ):
+        self.path = path
+        self.manifest = manifest
+        self.embeddings = embeddings
+        self.ids = ids
+        self.urls = urls
+        self.watermark = watermark
+
+
+def snapshot_root(directory: Optional[Path] = None) -> Path:
+    return Path(directory or settings.VECTOR_INDEX_SNAPSHOT_DIR)
+
+
+def current_snapshot_path(directory: Optional[Path] = None) -> Optional[Path]:
+    """Resolve the snapshot directory named by ``CURRENT``, if any."""
+    root = snapshot_root(directory)
+    pointer = root / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    name = pointer.read_text(encoding="utf-8").strip()
+    path = root / "snapshots" / name
+    return path if path.is_dir() else None
+
+
+def read_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    manifest_path = path / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+    return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+
+@contextlib.contextmanager
+def writer_lock(directory: Optional[Path] = None) -> Iterator[bool]:
+    """Non-blocking inter-process lock so only one worker writes a snapshot at a time."""
+    root = snapshot_root(directory)
+    root.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield True
+        return
+
+    with open(root / ".lock", "w", encoding="utf-8") as handle:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _encode_ids(ids: Sequence[Any]) -> Tuple[np.ndarray, str]:
+    if all(isinstance(project_id, ObjectId) for project_id in ids):
+        raw = b"".join(project_id.binary for project_id in ids)
+        return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 12), "objectid"
+    return np.asarray([str(project_id) for project_id in ids], dtype=np.str_), "str"
+
+
+def _decode_ids(array: np.ndarray, id_format: str) -> List[Any]:
+    if id_format == "objectid":
+        raw = array.tobytes()
+        return [ObjectId(raw[offset : offset + 12]) for offset in range(0, len(raw), 12)]
+    return [str(value) for value in array.tolist()]
+
+
+def _encode_urls(urls: Sequence[str]) -> Tuple[np.ndarray, bytes]:
+    encoded = [url.encode("utf-8") for url in urls]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def _decode_urls(offsets: np.ndarray, blob: bytes) -> List[str]:
+    bounds = offsets.tolist()
+    return [blob[start:end].decode("utf-8") for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _encode_watermark(watermark: Optional[Tuple[datetime, Any]]) -> Optional[Dict[str, Any]]:
+    if not watermark or watermark[0] is None:
+        return None
+    return {"updatedAt": watermark[0].isoformat(), "_id": str(watermark[1])}
+
+
+def _decode_watermark(payload: Optional[Dict[str, Any]]) -> Optional[Tuple[datetime, Any]]:
+    if not payload or not payload.get("updatedAt"):
+        return None
+    project_id: Any = payload.get("_id")
+    if isinstance(project_id, str) and ObjectId.is_valid(project_id):
+        project_id = ObjectId(project_id)
+    return datetime.fromisoformat(payload["updatedAt"]), project_id
+
+
+def _fsync_dir(path: Path) -> None:
+    with contextlib.suppress(OSError):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def write_snapshot(
+    segments: Sequence[Tuple[np.ndarray, np.ndarray]],
+    ids: Sequence[Any],
+    urls: Sequence[str],
+    watermark: Optional[Tuple[datetime, Any]],
+    index_version: int,
+    directory: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """
+    Write a new snapshot and atomically point ``CURRENT`` at it.
+
+    ``segments`` are ``(matrix, row_mask)`` pairs whose selected rows, concatenated,
+    line up with ``ids``/``urls``; they are streamed into the ``.npy`` file in chunks
+    so no second full copy of the matrix is materialized in memory.
+    """
+    root = snapshot_root(directory)
+    snapshots_dir = root / "snapshots"
+    snapshots_dir.mkdir(parents=True, exist_ok=True)
+
+    name = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    staging = snapshots_dir / f".{name}.tmp"
+    final = snapshots_dir / name
+    staging.mkdir()
+
+    try:
+        count = len(ids)
+        dimension = settings.EMBEDDING_DIMENSION
+        embeddings = np.lib.format.open_memmap(
+            staging / EMBEDDINGS_FILE,
+            mode="w+",
+            dtype=np.float32,
+            shape=(count, dimension),
+        )
+        cursor = 0
+        for matrix, mask in segments:
+            for start in range(0, matrix.shape[0], _COPY_CHUNK_ROWS):
+                block = matrix[start : start + _COPY_CHUNK_ROWS][mask[start : start + _COPY_CHUNK_ROWS]]
+                embeddings[cursor : cursor + block.shape[0]] = block
+                cursor += block.shape[0]
+        if cursor != count:
+            raise ValueError(f"Snapshot row mismatch: wrote {cursor} vectors for {count} ids")
+        embeddings.flush()
+        del embeddings
+
+        id_array, id_format = _encode_ids(ids)
+        np.save(staging / IDS_FILE, id_array)
+        offsets, blob = _encode_urls(urls)
+        np.save(staging / URL_OFFSETS_FILE, offsets)
+        (staging / URLS_FILE).write_bytes(blob)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "model": settings.EMBEDDING_MODEL_NAME,
+            "dimension": dimension,
+            "count": count,
+            "id_format": id_format,
+            "watermark": _encode_watermark(watermark),
+            "index_version": index_version,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        _fsync_dir(staging)
+
+        os.replace(staging, final)
+        pointer_tmp = root / f"{CURRENT_FILE}.tmp"
+        pointer_tmp.write_text(name, encoding="utf-8")
+        os.replace(pointer_tmp, root / CURRENT_FILE)
+        _fsync_dir(root)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    prune_snapshots(directory)
+    manifest["path"] = str(final)
+    logger.info("Wrote vector snapshot %s (%s vectors)", final, count)
+    return manifest
+
+
+def prune_snapshots(directory: Optional[Path] = None, keep: Optional[int] = None) -> int:
+    """Delete all but the newest ``keep`` snapshots (mapped files stay valid until unmapped)."""
+    keep = max(1, keep if keep is not None else settings.VECTOR_INDEX_SNAPSHOT_KEEP)
+    snapshots_dir = snapshot_root(directory) / "snapshots"
+    if not snapshots_dir.exists():
+        return 0
+
+    current = current_snapshot_path(directory)
+    candidates = sorted(
+        (path for path in snapshots_dir.iterdir() if path.is_dir() and not path.name.startswith(".")),
+        key=lambda path: path.name,
+        reverse=True,
+    )
+    removed = 0
+    for path in candidates[keep:]:
+        if current is not None and path == current:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def write_artifact(
+    path: Path,
+    name: str,
+    arrays: Dict[str, np.ndarray],
+    meta: Dict[str, Any],
+) -> None:
+    """
+    Store an auxiliary index (``<name>.<key>.npy`` files plus ``<name>.json``) in a snapshot.
+
+    The JSON sidecar is replaced last, so a reader that finds it also finds complete arrays.
+    """
+    for key, array in arrays.items():
+        target = path / f"{name}.{key}.npy"
+        staging = path / f".{name}.{key}.npy.tmp"
+        with open(staging, "wb") as handle:
+            np.save(handle, np.ascontiguousarray(array))
+        os.replace(staging, target)
+
+    payload = dict(meta, count=read_manifest(path).get("count"), created_at=datetime.utcnow().isoformat())
+    staging = path / f".{name}.json.tmp"
+    staging.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    os.replace(staging, path / f"{name}.json")
+    _fsync_dir(path)
+
+
+def load_artifact(
+    path: Path,
+    name: str,
+    keys: Sequence[str],
+    mmap: Sequence[str] = (),
+) -> Optional[Tuple[Dict[str, Any], Dict[str, np.ndarray]]]:
+    """Open an auxiliary index written by :func:`write_artifact`; arrays named in ``mmap`` are mapped read-only."""
+    meta_path = path / f"{name}.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    manifest = read_manifest(path) or {}
+    if meta.get("count") != manifest.get("count"):
+        logger.warning("Artifact %s in %s does not match its snapshot; ignoring", name, path)
+        return None
+
+    arrays: Dict[str, np.ndarray] = {}
+    for key in keys:
+        array_path = path / f"{name}.{key}.npy"
+        if not array_path.exists():
+            logger.warning("Artifact %s in %s is missing %s; ignoring", name, path, key)
+            return None
+        arrays[key] = np.load(array_path, mmap_mode="r" if key in mmap else None)
+    return meta, arrays
+
+
+def load_snapshot(directory: Optional[Path] = None) -> Optional[LoadedSnapshot]:
+    """Open the current snapshot read-only, or return None if it is missing or incompatible."""
+    path = current_snapshot_path(directory)
+    if path is None:
+        return None
+
+    manifest = read_manifest(path)
+    if not manifest:
+        logger.warning("Snapshot %s has no manifest; ignoring", path)
+        return None
+    if manifest.get("format_version") != FORMAT_VERSION:
+        logger.warning("Snapshot %s has unsupported format %s", path, manifest.get("format_version"))
+        return None
+    if manifest.get("model") != settings.EMBEDDING_MODEL_NAME or manifest.get("dimension") != settings.EMBEDDING_DIMENSION:
+        logger.warning(
+            "Snapshot %s was built for %s/%s, expected %s/%s; ignoring",
+            path,
+            manifest.get("model"),
+            manifest.get("dimension"),
+            settings.EMBEDDING_MODEL_NAME,
+            settings.EMBEDDING_DIMENSION,
+        )
+        return None
+
+    embeddings = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+    if embeddings.shape != (manifest["count"], manifest["dimension"]) or embeddings.dtype != np.float32:
+        logger.warning("Snapshot %s embeddings do not match its manifest; ignoring", path)
+        return None
+
+    ids = _decode_ids(np.load(path / IDS_FILE), manifest.get("id_format", "objectid"))
+    urls = _decode_urls(np.load(path / URL_OFFSETS_FILE), (path / URLS_FILE).read_bytes())
+    if len(ids) != manifest["count"] or len(urls) != manifest["count"]:
+        logger.warning("Snapshot %s id/URL tables do not match its manifest; ignoring", path)
+        return None
+
+    return LoadedSnapshot(
+        path=path,
+        manifest=manifest,
+        embeddings=embeddings,
+        ids=ids,
+        urls=urls,
+        watermark=_decode_watermark(manifest.get("watermark")),
+    )
@@ -40,7 +40,7 @@ export default function CheckPage() {
         {
           method: "POST",
           headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ url }),
+          body: JSON.stringify({ url, defer_verdict: true }),
         },
       );
 
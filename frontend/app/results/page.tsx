@@ -29,9 +29,12 @@ interface ResultsData {
   message: string;
   results: SimilarProject[];
   count: number;
-  ai_verdict?: AIVerdict;
+  ai_verdict?: AIVerdict | null;
+  verdict_id?: string | null;
 }
 
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+
 function ScoreRing({ score }: { score: number }) {
   const pct = score * 100;
   const color = pct >= 70 ? "#ef4444" : pct >= 50 ? "#f59e0b" : "#22c55e";
@@ -71,6 +74,25 @@ export default function ResultsPage() {
     setLoading(false);
   }, []);
 
+  // Results are shown right away; a deferred AI verdict arrives over SSE
+  const pendingVerdictId = results && !results.ai_verdict ? results.verdict_id : null;
+  useEffect(() => {
+    if (!pendingVerdictId) return;
+    const source = new EventSource(`${API_URL}/api/similarity/verdicts/${pendingVerdictId}/stream`);
+    source.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      source.close();
+      setResults((current) => {
+        if (!current) return current;
+        const updated = { ...current, ai_verdict: data.ai_verdict ?? null, verdict_id: null };
+        sessionStorage.setItem("plagiarismResults", JSON.stringify(updated));
+        return updated;
+      });
+    };
+    source.onerror = () => source.close();
+    return () => source.close();
+  }, [pendingVerdictId]);
+
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center bg-[#050816]">
@@ -181,6 +203,12 @@ export default function ResultsPage() {
           </motion.div>
 
           {/* AI Verdict */}
+          {pendingVerdictId && (
+            <div className="flex items-center gap-3 rounded-2xl border border-purple-500/30 bg-purple-500/5 px-6 py-4 mb-10">
+              <Brain size={20} className="text-purple-300 animate-pulse" />
+              <span className="text-gray-400 text-sm">AI analysis in progress...</span>
+            </div>
+          )}
           {results.ai_verdict?.status === "success" && (
             <motion.div
               initial={{ opacity: 0, y: 20 }}
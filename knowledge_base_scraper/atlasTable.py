@@ -56,10 +56,18 @@ project_schema_validator = {
                 "description": "must be an array of strings and is required"
             },
             "embeddingsOfData": {
-                "bsonType": "array",
-                # Assuming embeddings are floating-point numbers
-                "items": {"bsonType": "double"}, 
-                "description": "must be an array of numbers (embeddings) and is required"
+                # Packed float32 vector (BSON binary subtype 9); legacy documents hold an array of doubles
+                "bsonType": ["binData", "array"],
+                "items": {"bsonType": "double"},
+                "description": "must be a binary float32 vector or an array of numbers (embeddings) and is required"
+            },
+            "embeddingModel": {
+                "bsonType": "string",
+                "description": "name of the model that produced embeddingsOfData"
+            },
+            "embeddingDim": {
+                "bsonType": "int",
+                "description": "number of values in embeddingsOfData"
             }
         }
     }
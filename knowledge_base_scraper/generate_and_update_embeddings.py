@@ -1,28 +1,41 @@
+from bson.binary import Binary
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+from typing import Dict
+from datetime import datetime
+import hashlib
 import time
 
+import numpy as np
+
 try:
-    from env_utils import require_env_value
+    from env_utils import get_env_value, require_env_value
 except ImportError:
-    from knowledge_base_scraper.env_utils import require_env_value
+    from knowledge_base_scraper.env_utils import get_env_value, require_env_value
 
 # MongoDB Configuration
 CONNECTION_STRING = require_env_value("MONGODB_URL")
 DATABASE_NAME = "DevFoolU"
 COLLECTION_NAME = "Cluster0"
+MODEL_NAME = get_env_value("EMBEDDING_MODEL_NAME") or 'sentence-transformers/all-MiniLM-L6-v2'
+# Must match the backend's EMBEDDING_MODEL_VERSION, or the backend re-embeds what this script writes
+MODEL_VERSION = get_env_value("EMBEDDING_MODEL_VERSION") or "1"
+
+# Embeddings are stored as a BSON vector (subtype 9): float32 dtype byte, padding byte, packed values
+VECTOR_SUBTYPE = 9
+FLOAT32_HEADER = b"\x27\x00"
 
 # Initialize the embedding model
 print("Loading embedding model...")
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+model = SentenceTransformer(MODEL_NAME)
 print("✅ Model loaded successfully!\n")
 
 def create_combined_text(project: Dict) -> str:
     """
     Combine all relevant fields from a project document into a single text
-    for embedding generation.
+    for embedding generation (same text as the backend, so the stored
+    embeddingTextHash matches).
     """
     parts = []
     
@@ -34,6 +47,10 @@ def create_combined_text(project: Dict) -> str:
     if project.get('descriptionOfProject'):
         parts.append(f"Description: {project['descriptionOfProject']}")
     
+    # Add short tagline if available
+    if project.get('tagLine'):
+        parts.append(f"Tagline: {project['tagLine']}")
+    
     # Add problem solved
     if project.get('problemSolved'):
         parts.append(f"Problem: {project['problemSolved']}")
@@ -43,10 +60,25 @@ def create_combined_text(project: Dict) -> str:
         parts.append(f"Challenges: {project['challengesFaced']}")
     
     # Add technologies
-    if project.get('technologiesUsed') and isinstance(project['technologiesUsed'], list):
-        tech_str = ", ".join(project['technologiesUsed'])
-        if tech_str:
-            parts.append(f"Technologies: {tech_str}")
+    if project.get('technologiesUsed'):
+        if isinstance(project['technologiesUsed'], list):
+            tech_str = ", ".join(project['technologiesUsed'])
+            if tech_str:
+                parts.append(f"Technologies: {tech_str}")
+        elif isinstance(project['technologiesUsed'], str):
+            parts.append(f"Technologies: {project['technologiesUsed']}")
+    
+    # Add tags
+    if project.get('tagsOfProject') and isinstance(project.get('tagsOfProject'), list):
+        tag_str = ", ".join([str(tag).strip() for tag in project['tagsOfProject'] if str(tag).strip()])
+        if tag_str:
+            parts.append(f"Tags: {tag_str}")
+    
+    # Add condensed page narrative
+    if project.get('rawContentOfProject'):
+        raw_text = str(project['rawContentOfProject']).strip()
+        if raw_text:
+            parts.append(f"Narrative: {raw_text[:2500]}")
     
     # Combine all parts with separator
     combined = " | ".join(parts)
@@ -57,10 +89,17 @@ def create_combined_text(project: Dict) -> str:
     
     return combined
 
-def generate_embedding(text: str) -> List[float]:
+def generate_embedding(text: str) -> np.ndarray:
     """Generate embedding vector for given text"""
-    embedding = model.encode(text)
-    return embedding.tolist()
+    return np.asarray(model.encode(text), dtype=np.float32)
+
+def embedding_text_hash(text: str) -> str:
+    """Fingerprint of the combined text (stored as embeddingTextHash, same as the backend)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def encode_embedding(embedding: np.ndarray) -> Binary:
+    """Pack an embedding as little-endian float32 (same format the backend writes)"""
+    return Binary(FLOAT32_HEADER + embedding.astype('<f4').tobytes(), VECTOR_SUBTYPE)
 
 def fetch_and_update_embeddings():
     """
@@ -95,9 +134,10 @@ def fetch_and_update_embeddings():
             print("No projects found. Please insert data first.")
             return
         
-        # Query to find projects without embeddings or with empty embeddings
+        # Query to find projects without embeddings, with empty embeddings, or marked pending by the backend
         query = {
             "$or": [
+                {"embeddingState": "pending"},
                 {"embeddingsOfData": {"$exists": False}},
                 {"embeddingsOfData": []},
                 {"embeddingsOfData": None}
@@ -139,7 +179,16 @@ def fetch_and_update_embeddings():
                 # Update the document in MongoDB
                 result = collection.update_one(
                     {'_id': project_id},
-                    {'$set': {'embeddingsOfData': embedding}}
+                    # Same tags the backend writes; updatedAt lets the API's vector index pick up the change
+                    {'$set': {
+                        'embeddingsOfData': encode_embedding(embedding),
+                        'embeddingModel': MODEL_NAME,
+                        'embeddingModelVersion': MODEL_VERSION,
+                        'embeddingDim': int(embedding.size),
+                        'embeddingTextHash': embedding_text_hash(combined_text),
+                        'embeddingState': 'ready',
+                        'updatedAt': datetime.utcnow(),
+                    }}
                 )
                 
                 if result.modified_count > 0: